@@ -0,0 +1,97 @@
+# app/api/admin.py
+import os
+import secrets
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+
+from app.database import pool_metrics
+from app.services.model_registry import registry
+from app.services.profiling import PROFILING, list_profiles, load_flamegraph, load_profile
+from app.services.weather_store import weather_store
+from app.services.prediction_cache import prediction_cache
+
+# Служебные эндпоинты требуют заголовок X-Admin-Token со значением ADMIN_TOKEN.
+# Без ADMIN_TOKEN они закрыты; ADMIN_OPEN=1 открывает их без токена (локальная разработка)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN") or None
+ADMIN_OPEN = os.getenv("ADMIN_OPEN", "0") == "1"
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if ADMIN_TOKEN is None:
+        if not ADMIN_OPEN:
+            raise HTTPException(status_code=403, detail="Служебные эндпоинты закрыты: задайте ADMIN_TOKEN или ADMIN_OPEN=1")
+        return
+    if x_admin_token is None or not secrets.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Нужен корректный X-Admin-Token")
+
+
+router = APIRouter(prefix="/api/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+
+@router.get("/model")
+def get_model_status():
+    return registry.status()
+
+
+@router.post("/reload-model")
+def reload_model():
+    try:
+        bundle = registry.reload()
+    except Exception as e:
+        # старая версия продолжает обслуживать запросы
+        raise HTTPException(status_code=500, detail=f"Не удалось загрузить модель: {e}")
+    return {"status": "ok", "version": bundle.version}
+
+
+@router.get("/prediction-cache")
+def get_prediction_cache_stats():
+    return prediction_cache.stats()
+
+
+@router.delete("/prediction-cache")
+def clear_prediction_cache():
+    prediction_cache.invalidate()
+    return {"status": "ok"}
+
+
+@router.get("/db-pool")
+def get_db_pool_metrics():
+    return pool_metrics()
+
+
+@router.get("/weather-store")
+def get_weather_store_stats():
+    return weather_store.stats()
+
+
+@router.post("/weather-store/refresh")
+def refresh_weather_store():
+    # погода менялась мимо загрузчиков приложения (SQL вручную, восстановление из дампа)
+    weather_store.invalidate()
+    weather_store.get()
+    return weather_store.stats()
+
+
+# Профили запросов с X-Profile: 1 / ?profile=1 (при PROFILING=1)
+@router.get("/profiles")
+def get_profiles():
+    return {"enabled": PROFILING, "profiles": list_profiles()}
+
+
+@router.get("/profiles/{profile_id}")
+def get_profile(profile_id: str):
+    profile = load_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Профиль не найден")
+    return profile
+
+
+@router.get("/profiles/{profile_id}/flamegraph", response_class=PlainTextResponse)
+def get_profile_flamegraph(profile_id: str):
+    # свёрнутые стеки: flamegraph.pl, speedscope, inferno
+    collapsed = load_flamegraph(profile_id)
+    if collapsed is None:
+        raise HTTPException(status_code=404, detail="Профиль не найден")
+    return PlainTextResponse(collapsed)
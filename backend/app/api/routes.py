@@ -1,20 +1,60 @@
-from fastapi import APIRouter, File, UploadFile, HTTPException, Query, Depends
+import asyncio
+import logging
+
+from fastapi import APIRouter, BackgroundTasks, File, UploadFile, HTTPException, Query, Depends, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from datetime import datetime, timedelta
+from sqlalchemy import func, select
+from datetime import date, datetime, timedelta
+from typing import List, Optional, get_type_hints
 import pandas as pd
-from io import BytesIO
 
-from app.database import engine
+from app.database import get_session, get_async_session, fetch_all
 from app.models.db_models import (
     CurrentStockpile,
-    ActualFire,
     Temperature,
     FireEvent,
-    Weather,
-    Supply
+    WeatherDaily,
+    MetricsCounter
 )
 from app.services.predictor import predict_ignition_risk
+from app.services.metrics import (
+    log_predictions,
+    metrics_stmt,
+    prediction_record,
+    record_actual_fire,
+    summarize_counter
+)
+from app.services.prediction_cache import prediction_cache
+from app.services.weather_store import weather_store
+from app.services.batch_predict import (
+    batch_format,
+    parse_batch,
+    stream_predictions,
+    validate_batch,
+    BATCH_PREDICT_MAX_ROWS
+)
+from app.services.ingest import detect_kind, ingest_chunks, iter_raw_csv
+from app.services.features import (
+    load_pile_features_async, load_daily_weather_async, last_data_day, last_weather_datetime_async, DEFAULT_WEATHER
+)
+from app.services.horizon import forecast_horizon, horizon_days, summarize_horizon, HORIZON_MAX_DAYS
+from app.services.forecast_job import (
+    load_latest_snapshot_async,
+    run_forecast_snapshot_safe,
+    FORECAST_SNAPSHOT_ON_INGEST
+)
+from app.services.risk_calendar import (
+    calendar_day_totals_stmt,
+    calendar_entries_stmt,
+    calendar_etag,
+    group_by_date,
+    latest_snapshot_stmt,
+    CALENDAR_MAX_PAGE_SIZE,
+    CALENDAR_PAGE_SIZE
+)
 
 from pydantic import BaseModel
 
@@ -41,37 +81,61 @@ class PredictionRequest(BaseModel):
 
 router = APIRouter(prefix="/api", tags=["core"])
 
-def get_session():
-    with Session(engine) as session:
-        yield session
+logger = logging.getLogger(__name__)
+
+# Дефолтная погода для /dashboard-summary-test (ноябрьские значения)
+TEST_WEATHER_DEFAULTS = {**DEFAULT_WEATHER, "t": 5.0, "humidity": 70}
 
 @router.post("/predict")
 def predict(request: PredictionRequest, session: Session = Depends(get_session)):
-    # Преобразуйте поля в нужный формат для модели
-    features = {
-        "warehouse": request.Склад,
-        "pile_id": str(request.Штабель),
-        "coal_grade": request.Марка,
-        "current_temp": request.Максимальная_температура,
-        "shift": request.Смена,
-        "t": request.t,
-        "p": request.p,
-        "humidity": request.humidity,
-        "precipitation": request.precipitation,
-        "wind_dir": request.wind_dir,
-        "v_avg": request.v_avg,
-        "v_max": request.v_max,
-        "cloudcover": request.cloudcover,
-        "weather_code": request.weather_code,
-        "coal_grade_supply": request.Наим_ЕТСНГ,
-        "to_warehouse_tn": request.На_склад_тн,
-        "to_ship_tn": request.На_судно_тн,
-        "supply_warehouse": request.Склад_supply,
-        "pile_age_days": request.ДниСНачалаФормирования
-    }
+    # Признаки передаются в модель под теми же (кириллическими) именами, что и в запросе
+    features = request.dict()
+    # ❗️Прогноз выдаётся сегодня: от этой даты считается дата возгорания, с ней он и в журнале
+    issue_date = date.today()
+    features["current_date"] = issue_date.isoformat()
+
+    # Передайте в вашу модель; в ответе — версия модели, которая его посчитала
+    result = predict_ignition_risk(features, session)
+
+    # ❗️Прогноз — в журнал для метрик качества (/api/metrics)
+    log_predictions(session, [
+        prediction_record(features["Склад"], features["Штабель"], features["Марка"], issue_date, result)
+    ])
+    session.commit()
+    return result
+
+
+# ❗️Пакетный прогноз: JSON-массив, NDJSON или CSV (телом запроса или файлом в поле file).
+# Ошибка в строке не роняет пакет — она приходит в ответе на месте этой строки
+@router.post("/predict/batch")
+async def predict_batch(request: Request):
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(400, "Ожидается файл в поле file")
+        fmt = batch_format(filename=upload.filename)
+        body = await upload.read()
+    else:
+        fmt = batch_format(content_type)
+        if fmt is None:
+            raise HTTPException(415, "Поддерживаются application/json, application/x-ndjson и text/csv")
+        body = await request.body()
 
-    # Передайте в вашу модель
-    return predict_ignition_risk(features, session)
+    try:
+        frame = await run_in_threadpool(parse_batch, body, fmt)
+    except (ValueError, pd.errors.ParserError) as e:
+        raise HTTPException(400, str(e))
+    if len(frame) > BATCH_PREDICT_MAX_ROWS:
+        raise HTTPException(413, f"Не больше {BATCH_PREDICT_MAX_ROWS} строк за запрос")
+
+    schema = get_type_hints(PredictionRequest)
+    features, errors, valid = await run_in_threadpool(validate_batch, frame, schema)
+    return StreamingResponse(
+        stream_predictions(features, errors, valid, schema),
+        media_type="application/x-ndjson"
+    )
 
 # ... остальные эндпоинты ...
 
@@ -96,19 +160,76 @@ def submit_stockpile(
     session.add(stockpile)
     session.commit()
     session.refresh(stockpile)
+    # ❗️Новые данные — закэшированные прогнозы больше не актуальны
+    prediction_cache.invalidate()
     return {"id": stockpile.id, "status": "ok"}
 
 
-# 3. Календарь на 21–25 ноября 2025
+# 3. Календарь высокого риска по последнему снимку прогноза
 @router.get("/calendar")
-def get_calendar():
-    return {
-        "period": "2025-11-21 — 2025-11-25",
-        "high_risk_days": [
-            {"date": "2025-11-22", "warehouse": 4, "pile_id": "39"},
-            {"date": "2025-11-24", "warehouse": 3, "pile_id": "12"}
-        ]
-    }
+async def get_calendar(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    start: str = Query(..., description="YYYY-MM-DD"),
+    end: str = Query(..., description="YYYY-MM-DD"),
+    warehouse: Optional[List[int]] = Query(None, description="Фильтр по складам (можно несколько)"),
+    limit: int = Query(CALENDAR_PAGE_SIZE, ge=1, le=CALENDAR_MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0)
+):
+    try:
+        start_dt = datetime.fromisoformat(start).date()
+        end_dt = datetime.fromisoformat(end).date()
+    except ValueError:
+        raise HTTPException(400, "Неверный формат даты: YYYY-MM-DD")
+
+    if start_dt > end_dt:
+        raise HTTPException(422, "start позже end")
+    period = f"{start_dt.isoformat()} — {end_dt.isoformat()}"
+
+    latest = await fetch_all(latest_snapshot_stmt())
+    if not latest:
+        # ❗️Снимка ещё нет — он считается после ответа (если пересчёт уже идёт, повтор пропускается),
+        # а календарь пока пустой
+        background_tasks.add_task(run_forecast_snapshot_safe)
+        return JSONResponse(headers={"Cache-Control": "no-store"}, content={
+            "period": period,
+            "generated_at": None,
+            "window": None,
+            "total": 0,
+            "limit": limit,
+            "offset": offset,
+            "next_offset": None,
+            "high_risk_days": []
+        })
+
+    ((generated_at, first_day, last_day),) = latest
+    # ❗️Снимок покрывает только своё окно — за его пределами календарь был бы пустым или неполным
+    if start_dt < first_day or end_dt > last_day:
+        raise HTTPException(422, f"Прогноз есть только на {first_day.isoformat()} — {last_day.isoformat()}")
+
+    warehouses = sorted(set(warehouse)) if warehouse else None
+    etag = calendar_etag(generated_at, start_dt, end_dt, warehouses, limit, offset)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    rows, totals = await asyncio.gather(
+        fetch_all(calendar_entries_stmt(generated_at, start_dt, end_dt, warehouses, limit, offset)),
+        fetch_all(calendar_day_totals_stmt(generated_at, start_dt, end_dt, warehouses))
+    )
+    day_totals = {day.isoformat(): count for day, count in totals}
+    total = sum(day_totals.values())
+
+    return JSONResponse(headers=headers, content={
+        "period": period,
+        "generated_at": generated_at.isoformat(),
+        "window": {"start": first_day.isoformat(), "end": last_day.isoformat()},
+        "total": total,
+        "limit": limit,
+        "offset": offset,
+        "next_offset": offset + limit if offset + limit < total else None,
+        "high_risk_days": group_by_date(rows, day_totals)
+    })
 
 
 # 4. Загрузка реальных данных о возгораниях (после прогноза)
@@ -124,165 +245,75 @@ def upload_actual_fires(
     except ValueError:
         raise HTTPException(status_code=400, detail="Неверный формат даты: ожидается YYYY-MM-DD")
 
-    fire = ActualFire(
-        warehouse=warehouse,
-        pile_id=pile_id,
-        fire_date=fire_date_parsed
-    )
-    session.add(fire)
+    # ❗️Возгорание записывается один раз; счётчики метрик обновляются сразу —
+    # только по прогнозам этого штабеля в окне ±2 дня
+    outcome = record_actual_fire(session, warehouse, pile_id, fire_date_parsed)
     session.commit()
-    return {"status": "ok"}
+    return {"status": "ok", **outcome}
 
 
-# 5. Метрики качества (заглушка)
+# 5. Метрики качества: готовые счётчики, без пересчёта истории
 @router.get("/metrics")
-def get_metrics():
-    return {
-        "accuracy_2days": 0.0,
-        "total_predictions": 0,
-        "correct_predictions": 0,
-        "note": "После загрузки реальных данных метрики обновятся"
+async def get_metrics():
+    counters = {row.scope: row for row in await fetch_all(metrics_stmt())}
+    overall = counters.get("all", MetricsCounter(scope="all"))
+    result = {
+        **summarize_counter(overall),
+        "by_warehouse": {},
+        "by_coal_grade": {}
     }
+    for scope, row in sorted(counters.items()):
+        kind, _, name = scope.partition(":")
+        if kind == "warehouse":
+            result["by_warehouse"][name] = summarize_counter(row)
+        elif kind == "grade":
+            result["by_coal_grade"][name] = summarize_counter(row)
+    if not overall.fires:
+        result["note"] = "После загрузки реальных данных метрики обновятся"
+    return result
 
 
 # 6. Загрузка CSV-файлов: temperature, fires, weather
 @router.post("/upload-csv")
-async def upload_csv(
+def upload_csv(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     session: Session = Depends(get_session)
 ):
     if not file.filename.endswith(".csv"):
         raise HTTPException(status_code=400, detail="Только CSV файлы")
 
-    content = await file.read()
+    kind = detect_kind(file.filename)
+    if kind is None:
+        raise HTTPException(400, "Неподдерживаемый файл. Ожидается: temperature.csv, fires.csv или weather_data_*.csv")
+
+    # ❗️Файл не читается целиком: UploadFile уже лежит во временном файле,
+    # pandas разбирает его пачками, и каждая пачка сразу пишется в БД.
+    # Эндпоинт синхронный — разбор, запись и commit идут в пуле потоков, а не в event loop
     try:
-        df = pd.read_csv(BytesIO(content), on_bad_lines="skip", dtype=str, header=None)
-    except Exception as e:
+        chunks = iter_raw_csv(file.file)
+        stats = ingest_chunks(session.connection(), kind, chunks)
+    except pd.errors.ParserError as e:
         raise HTTPException(status_code=400, detail=f"Ошибка чтения CSV: {str(e)}")
-
-    inserted = 0
-    filename = file.filename.lower()
-
-    # === Загрузка temperature.csv ===
-    if "temperature" in filename:
-        if len(df.columns) < 7:
-            raise HTTPException(400, "Недостаточно колонок в temperature.csv")
-        df = df.iloc[:, :7]
-        df.columns = ["Склад", "Штабель", "Марка", "Макс.темп", "Пикет", "Дата", "Смена"]
-
-        df["Дата"] = pd.to_datetime(df["Дата"], errors="coerce")
-        df["Макс.темп"] = pd.to_numeric(df["Макс.темп"], errors="coerce")
-        df["Склад"] = pd.to_numeric(df["Склад"], errors="coerce").astype("Int64")
-        df["Смена"] = pd.to_numeric(df["Смена"], errors="coerce")
-        df = df.dropna(subset=["Дата", "Макс.темп", "Склад", "Смена"])
-
-        for _, r in df.iterrows():
-            session.add(Temperature(
-                warehouse=int(r["Склад"]),
-                pile_id=str(r["Штабель"]),
-                coal_grade=r["Марка"],
-                max_temp=float(r["Макс.темп"]),
-                measurement_date=r["Дата"],
-                shift=int(r["Смена"])
-            ))
-            inserted += 1
-
-    # === Загрузка fires.csv ===
-    elif "fire" in filename or "fires" in filename:
-        if df.shape[0] == 0:
-            raise HTTPException(400, "Пустой файл fires.csv")
-        header_row = df.iloc[0].astype(str).str.contains("Дата составления").any()
-        if header_row:
-            df.columns = df.iloc[0]
-            df = df[1:]
-        else:
-            df.columns = [
-                "Дата составления", "Груз", "Вес по акту, тн", "Склад",
-                "Дата начала", "Дата оконч.", "Нач.форм.штабеля", "Штабель"
-            ]
-
-        df["Дата начала"] = pd.to_datetime(df["Дата начала"], errors="coerce")
-        df["Нач.форм.штабеля"] = pd.to_datetime(df["Нач.форм.штабеля"], errors="coerce")
-        df["Склад"] = pd.to_numeric(df["Склад"], errors="coerce").astype("Int64")
-        df = df.dropna(subset=["Дата начала", "Склад", "Штабель"])
-
-        for _, r in df.iterrows():
-            session.add(FireEvent(
-                warehouse=int(r["Склад"]),
-                pile_id=str(r["Штабель"]),
-                coal_grade=r["Груз"],
-                fire_start=r["Дата начала"],
-                pile_formed_at=r["Нач.форм.штабеля"]
-            ))
-            inserted += 1
-
-    # === Загрузка weather_data_*.csv ===
-    elif "weather" in filename:
-        if len(df.columns) < 11:
-            raise HTTPException(400, "Недостаточно колонок в weather CSV")
-        df = df.iloc[:, :11]
-        df.columns = [
-            "datetime", "temp", "pressure", "humidity", "precipitation",
-            "wind_dir", "wind_speed", "v_max", "cloudcover", "visibility", "weather_code"
-        ]
-        df["datetime"] = pd.to_datetime(df["datetime"], errors="coerce")
-        for col in ["temp", "pressure", "humidity", "precipitation", "wind_speed", "cloudcover"]:
-            df[col] = pd.to_numeric(df[col], errors="coerce")
-        df = df.dropna(subset=["datetime", "temp", "humidity"])
-
-        for _, r in df.iterrows():
-            session.add(Weather(
-                datetime=r["datetime"],
-                temp=r["temp"],
-                pressure=r["pressure"],
-                humidity=int(r["humidity"]),
-                precipitation=r["precipitation"],
-                wind_dir=r["wind_dir"] if pd.notna(r["wind_dir"]) else None,
-                wind_speed=r["wind_speed"],
-                cloudcover=r["cloudcover"] if pd.notna(r["cloudcover"]) else None,
-                visibility=r["visibility"] if pd.notna(r["visibility"]) else None,
-                weather_code=r["weather_code"] if pd.notna(r["weather_code"]) else None
-            ))
-            inserted += 1
-
-    elif "supply" in filename or "supplies" in filename:
-        df.columns = ["ВыгрузкаНаСклад", "Наим. ЕТСНГ", "Штабель", "ПогрузкаНаСудно", "На склад, тн", "На судно, тн", "Склад"]
-
-        df["ВыгрузкаНаСклад"] = pd.to_datetime(df["ВыгрузкаНаСклад"], errors="coerce")
-        df["ПогрузкаНаСудно"] = pd.to_datetime(df["ПогрузкаНаСудно"], errors="coerce")
-        df["Штабель"] = pd.to_numeric(df["Штабель"], errors="coerce").astype("Int64")
-        df["Склад"] = pd.to_numeric(df["Склад"], errors="coerce").astype("Int64")
-        df["На склад, тн"] = pd.to_numeric(df["На склад, тн"], errors="coerce")
-        df["На судно, тн"] = pd.to_numeric(df["На судно, тн"], errors="coerce")
-
-        df = df.dropna(subset=["ВыгрузкаНаСклад", "Штабель", "Склад"])
-
-        for _, row in df.iterrows():
-            s = Supply(
-                unload_to_warehouse=row["ВыгрузкаНаСклад"],
-                coal_grade=row["Наим. ЕТСНГ"],
-                pile_id=row["Штабель"],
-                load_to_ship=row["ПогрузкаНаСудно"],
-                to_warehouse_tn=row["На склад, тн"],
-                to_ship_tn=row["На судно, тн"],
-                warehouse=row["Склад"]
-            )
-            session.add(s)
-            inserted += 1
-
-    else:
-        raise HTTPException(400, "Неподдерживаемый файл. Ожидается: temperature.csv, fires.csv или weather_data_*.csv")
+    except ValueError as e:
+        raise HTTPException(400, str(e))
 
     session.commit()
-    return {"filename": file.filename, "inserted_rows": inserted}
+    prediction_cache.invalidate()
+    if kind == "weather":
+        weather_store.invalidate()
+    # ❗️Снимок прогноза для дашборда пересчитывается после ответа клиенту
+    if FORECAST_SNAPSHOT_ON_INGEST:
+        background_tasks.add_task(run_forecast_snapshot_safe)
+    return {"filename": file.filename, **stats}
 
 
 # 7. Получить погоду за период (ежедневная агрегация)
 @router.get("/weather")
-def get_weather(
+async def get_weather(
     start: str = Query(..., description="YYYY-MM-DD"),
     end: str = Query(..., description="YYYY-MM-DD"),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
     try:
         start_dt = datetime.fromisoformat(start)
@@ -290,20 +321,17 @@ def get_weather(
     except ValueError:
         raise HTTPException(400, "Неверный формат даты: YYYY-MM-DD")
 
-    result = session.query(
-        func.date(Weather.datetime).label("date"),
-        func.avg(Weather.temp).label("avg_temp"),
-        func.avg(Weather.humidity).label("avg_humidity"),
-        func.sum(Weather.precipitation).label("total_precip"),
-        func.avg(Weather.wind_speed).label("avg_wind_speed")
-    ).filter(
-        Weather.datetime >= start_dt,
-        Weather.datetime <= end_dt
-    ).group_by(func.date(Weather.datetime)).all()
+    # ❗️Готовые суточные агрегаты вместо group by по почасовым строкам
+    result = (await session.execute(
+        select(WeatherDaily).where(
+            WeatherDaily.day >= start_dt.date(),
+            WeatherDaily.day <= end_dt.date()
+        ).order_by(WeatherDaily.day)
+    )).scalars().all()
 
     return [
         {
-            "date": str(r.date),
+            "date": str(r.day),
             "avg_temp": round(float(r.avg_temp), 1),
             "avg_humidity": int(r.avg_humidity),
             "total_precip": round(float(r.total_precip), 1),
@@ -315,12 +343,11 @@ def get_weather(
 
 # 8. Данные по штабелю + погода за период
 @router.get("/pile-weather")
-def get_pile_weather(
+async def get_pile_weather(
     warehouse: int,
     pileId: str,       # ← именно так, как в фронтенде
     start: str,
-    end: str,
-    session: Session = Depends(get_session)
+    end: str
 ):
     try:
         start_dt = datetime.fromisoformat(start)
@@ -328,30 +355,25 @@ def get_pile_weather(
     except ValueError:
         raise HTTPException(status_code=400, detail="Неверный формат даты: YYYY-MM-DD")
 
-    temps = session.query(Temperature).filter(
-        Temperature.warehouse == warehouse,
-        Temperature.pile_id == pileId,  # ← именно так
-        Temperature.measurement_date >= start_dt,
-        Temperature.measurement_date <= end_dt
-    ).order_by(Temperature.measurement_date).all()  # ← добавь сортировку
-
-    fires = session.query(FireEvent).filter(
-        FireEvent.warehouse == warehouse,
-        FireEvent.pile_id == pileId,  # ← и здесь
-        FireEvent.fire_start >= start_dt,
-        FireEvent.fire_start <= end_dt
-    ).order_by(FireEvent.fire_start).all()  # ← и здесь
-
-    weather = session.query(
-        func.date(Weather.datetime).label("date"),
-        func.avg(Weather.temp).label("avg_temp"),
-        func.avg(Weather.humidity).label("avg_humidity"),
-        func.sum(Weather.precipitation).label("total_precip"),
-        func.avg(Weather.wind_speed).label("avg_wind_speed")
-    ).filter(
-        Weather.datetime >= start_dt,
-        Weather.datetime <= end_dt
-    ).group_by(func.date(Weather.datetime)).order_by(func.date(Weather.datetime)).all()  # ← и здесь
+    # ❗️Три независимых запроса выполняются одновременно, каждый в своей сессии
+    temps, fires, weather = await asyncio.gather(
+        fetch_all(select(Temperature.measurement_date, Temperature.max_temp, Temperature.shift).where(
+            Temperature.warehouse == warehouse,
+            Temperature.pile_id == pileId,  # ← именно так
+            Temperature.measurement_date >= start_dt,
+            Temperature.measurement_date <= end_dt
+        ).order_by(Temperature.measurement_date)),  # ← добавь сортировку
+        fetch_all(select(FireEvent.fire_start).where(
+            FireEvent.warehouse == warehouse,
+            FireEvent.pile_id == pileId,  # ← и здесь
+            FireEvent.fire_start >= start_dt,
+            FireEvent.fire_start <= end_dt
+        ).order_by(FireEvent.fire_start)),  # ← и здесь
+        fetch_all(select(WeatherDaily).where(
+            WeatherDaily.day >= start_dt.date(),
+            WeatherDaily.day <= end_dt.date()
+        ).order_by(WeatherDaily.day))  # ← и здесь
+    )
 
     return {
         "temperatures": [
@@ -364,13 +386,13 @@ def get_pile_weather(
         ],
         "weather": [
             {
-                "date": str(w.date),
+                "date": str(w.day),
                 "avg_temp": float(w.avg_temp),
                 "avg_humidity": int(w.avg_humidity),
                 "total_precip": float(w.total_precip),
                 "avg_wind_speed": float(w.avg_wind_speed)
             }
-            for w in weather
+            for (w,) in weather
         ],
         "fires": [
             {
@@ -381,13 +403,15 @@ def get_pile_weather(
     }
 
 @router.get("/warehouses")
-def get_warehouses(session: Session = Depends(get_session)):
-    result = session.query(Temperature.warehouse).distinct().all()
+async def get_warehouses(session: AsyncSession = Depends(get_async_session)):
+    result = (await session.execute(select(Temperature.warehouse).distinct())).all()
     return {"warehouses": [r[0] for r in result]}
 
 @router.get("/stacks/{warehouse}")
-def get_stacks(warehouse: int, session: Session = Depends(get_session)):
-    result = session.query(Temperature.pile_id).filter(Temperature.warehouse == warehouse).distinct().all()
+async def get_stacks(warehouse: int, session: AsyncSession = Depends(get_async_session)):
+    result = (await session.execute(
+        select(Temperature.pile_id).where(Temperature.warehouse == warehouse).distinct()
+    )).all()
     return {"stacks": [r[0] for r in result]}   
 
 
@@ -408,163 +432,59 @@ def get_pile_age(warehouse: int, pileId: str, session: Session = Depends(get_ses
     
 
 @router.get("/dashboard-summary")
-def get_dashboard_summary(
-    forecast_days: int = Query(5, description="Количество дней для прогноза"),
-    session: Session = Depends(get_session)
+async def get_dashboard_summary(
+    forecast_days: int = Query(5, ge=1, le=HORIZON_MAX_DAYS, description="Количество дней для прогноза")
 ):
-    # ❗️Найти последнюю дату в БД (температура или погода)
-    last_temp_date_result = session.query(
-        func.max(Temperature.measurement_date)
-    ).scalar()
-
-    last_weather_date_result = session.query(
-        func.max(Weather.datetime)
-    ).scalar()
-
-    # Выбираем более позднюю дату
-    last_date = None
-    if last_temp_date_result and last_weather_date_result:
-        last_date = max(last_temp_date_result.date(), last_weather_date_result.date())
-    elif last_temp_date_result:
-        last_date = last_temp_date_result.date()
-    elif last_weather_date_result:
-        last_date = last_weather_date_result.date()
-    else:
+    # ❗️Готовый снимок прогноза (app/services/forecast_job.py), если он покрывает окно
+    snapshot = await load_latest_snapshot_async()
+    snapshot_days = sorted(snapshot["forecast_day"].unique())
+    if len(snapshot_days) >= forecast_days:
+        days = snapshot_days[:forecast_days]
+        grid = snapshot[snapshot["forecast_day"] <= days[-1]]
+        return {
+            "period": f"{days[0].isoformat()} — {days[-1].isoformat()}",
+            "generated_at": snapshot["generated_at"].iloc[0].isoformat(),
+            **summarize_horizon(grid, days)
+        }
+
+    # ❗️Снимка нет (или окно длиннее) — считаем на лету
+    # Найти последнюю дату в БД (температура или погода) — оба запроса одновременно
+    ((last_temp,),), last_weather = await asyncio.gather(
+        fetch_all(select(func.max(Temperature.measurement_date))),
+        last_weather_datetime_async()
+    )
+    last_date = last_data_day(last_temp, last_weather)
+    if last_date is None:
         raise HTTPException(status_code=404, detail="Нет данных температуры или погоды в БД")
 
     # ❗️Дата начала прогноза — следующий день после последней даты
     start_date = last_date + timedelta(days=1)
     end_date = start_date + timedelta(days=forecast_days - 1)
+    days = horizon_days(start_date, end_date)
 
-    # ❗️Получить все уникальные штабели
-    unique_piles = session.query(Temperature.warehouse, Temperature.pile_id).distinct().all()
-
-    incidents = []
-
-    for wp in unique_piles:
-        warehouse = wp[0]
-        pile_id = wp[1]
-
-        # ❗️Получить последнюю температуру
-        last_temp = session.query(Temperature).filter(
-            Temperature.warehouse == warehouse,
-            Temperature.pile_id == pile_id
-        ).order_by(Temperature.measurement_date.desc()).first()
-
-        if not last_temp:
-            continue
-
-        # ❗️Получить дату формирования штабеля
-        fire_record = session.query(FireEvent).filter(
-            FireEvent.warehouse == warehouse,
-            FireEvent.pile_id == pile_id
-        ).first()
-
-        if fire_record and fire_record.pile_formed_at:
-            pile_age_days = (last_date - fire_record.pile_formed_at.date()).days
-        else:
-            pile_age_days = 30  # дефолт
-
-        # ❗️Получить погоду за последний день температуры
-        weather_record = session.query(Weather).filter(
-            func.date(Weather.datetime) == last_temp.measurement_date.date()
-        ).first()
-
-        if weather_record:
-            t = weather_record.temp
-            p = weather_record.pressure
-            humidity = weather_record.humidity
-            precipitation = weather_record.precipitation
-            wind_dir = weather_record.wind_dir
-            v_avg = weather_record.wind_speed
-            v_max = v_avg * 1.5
-            cloudcover = weather_record.cloudcover
-            weather_code = weather_record.weather_code
-        else:
-            # дефолт
-            t = 20.0
-            p = 1013.25
-            humidity = 65
-            precipitation = 0.0
-            wind_dir = 0
-            v_avg = 5.0
-            v_max = 7.5
-            cloudcover = 50
-            weather_code = 0
-
-        # ❗️Подготовить признаки
-        predict_data = {
-            "Склад": warehouse,
-            "Штабель": int(pile_id),
-            "Марка": last_temp.coal_grade,
-            "Максимальная_температура": last_temp.max_temp,
-            "Смена": last_temp.shift,
-            "t": t,
-            "p": p,
-            "humidity": humidity,
-            "precipitation": precipitation,
-            "wind_dir": wind_dir,
-            "v_avg": v_avg,
-            "v_max": v_max,
-            "cloudcover": cloudcover,
-            "weather_code": weather_code,
-            "Наим_ЕТСНГ": last_temp.coal_grade,
-            "На_склад_тн": 0.0,
-            "На_судно_тн": 0.0,
-            "Склад_supply": warehouse,
-            "ДниСНачалаФормирования": pile_age_days
-        }
+    # ❗️Признаки по всем штабелям и погода (если есть) на каждый день окна
+    features, weather = await asyncio.gather(
+        load_pile_features_async(age_reference=last_date),
+        load_daily_weather_async(days)
+    )
 
-        # ❗️Вызвать predict (передаём session)
-        try:
-            prediction = predict_ignition_risk(predict_data, session)
-            predicted_date_str = prediction.get("predicted_ignition_date")
-
-            if predicted_date_str:
-                predicted_date = datetime.fromisoformat(predicted_date_str).date()
-
-                if start_date <= predicted_date <= end_date:
-                    incidents.append({
-                        "date": predicted_date.isoformat(),
-                        "warehouse": warehouse,
-                        "pile_id": pile_id,
-                        "predicted_ignition_date": predicted_date_str,
-                        "message": prediction.get("message", "")
-                    })
-        except Exception as e:
-            # Логировать, если нужно
-            continue
-
-    # ❗️Агрегировать по дням
-    from collections import defaultdict
-    summary_by_day = defaultdict(int)
-    for inc in incidents:
-        summary_by_day[inc["date"]] += 1
-
-    # ❗️Заполнить пропущенные дни
-    date_list = [(start_date + timedelta(days=i)).isoformat() for i in range(forecast_days)]
-    final_summary = []
-    for d in date_list:
-        final_summary.append({
-            "date": d,
-            "count": summary_by_day[d]
-        })
+    # ❗️Прогноз на каждый день окна для каждого штабеля — один вызов модели
+    # (штабель, на котором модель падает, пропускается — см. predict_grid)
+    grid = await run_in_threadpool(forecast_horizon, features, days, weather, last_date)
 
     return {
         "period": f"{start_date.strftime('%Y-%m-%d')} — {end_date.strftime('%Y-%m-%d')}",
-        "summary_by_day": final_summary,
-        "high_risk_incidents": incidents
+        "generated_at": datetime.utcnow().isoformat(),
+        **summarize_horizon(grid, days)
     }
 
 
 @router.get("/dashboard-summary-test")
-def get_dashboard_summary_test(
+async def get_dashboard_summary_test(
     start_date: str = Query(..., description="Дата начала прогноза (YYYY-MM-DD)"),
-    end_date: str = Query(..., description="Дата окончания прогноза (YYYY-MM-DD)"),
-    session: Session = Depends(get_session)
+    end_date: str = Query(..., description="Дата окончания прогноза (YYYY-MM-DD)")
 ):
-    print(f"DEBUG: start_date = {start_date}, end_date = {end_date}")
-    print("DEBUG: Запрос на /dashboard-summary-test получен")
+    logger.debug("/dashboard-summary-test: start_date=%s, end_date=%s", start_date, end_date)
 
     try:
         start_dt = datetime.fromisoformat(start_date).date()
@@ -575,139 +495,32 @@ def get_dashboard_summary_test(
     if start_dt > end_dt:
         raise HTTPException(status_code=400, detail="Дата начала не может быть позже даты окончания")
 
-    unique_piles = session.query(Temperature.warehouse, Temperature.pile_id).distinct().all()
-
-    incidents = []
-
-    for idx, wp in enumerate(unique_piles):
-        warehouse = wp[0]
-        pile_id = wp[1]
-
-        print(f"DEBUG [{idx}]: Обрабатываю штабель {warehouse}, {pile_id}")
-
-        # ❗️Получить **последнюю температуру до start_date**
-        last_temp = session.query(Temperature).filter(
-            Temperature.warehouse == warehouse,
-            Temperature.pile_id == pile_id,
-            Temperature.measurement_date < start_dt  # ❗️Не включая start_date
-        ).order_by(Temperature.measurement_date.desc()).first()
-
-        if not last_temp:
-            print(f"❌ Нет температуры для {warehouse}, {pile_id} до {start_dt}")
-            continue
-        else:
-            print(f"✅ Найдена температура: {last_temp.max_temp}°C на дату {last_temp.measurement_date}")
-
-        # ❗️Получить возраст штабеля
-        fire_record = session.query(FireEvent).filter(
-            FireEvent.warehouse == warehouse,
-            FireEvent.pile_id == pile_id
-        ).first()
-
-        if fire_record and fire_record.pile_formed_at:
-            pile_age_days = (start_dt - fire_record.pile_formed_at.date()).days
-        else:
-            pile_age_days = 30  # дефолт
-
-        # ❗️ПОЛУЧАЕМ ПОГОДУ ЗА ДЕНЬ ДО start_date — или БЛИЖАЙШУЮ, ЕСЛИ НЕТ
-        weather_date = start_dt - timedelta(days=1)
-
-        # ❗️Ищем **ближайшую погоду <= weather_date**
-        weather_record = session.query(Weather).filter(
-            func.date(Weather.datetime) <= weather_date
-        ).order_by(Weather.datetime.desc()).first()
-
-        if weather_record:
-            print(f"✅ Найдена погода за {weather_record.datetime.date()}")
-            t = weather_record.temp
-            p = weather_record.pressure
-            humidity = int(weather_record.humidity)
-            precipitation = weather_record.precipitation
-            wind_dir = weather_record.wind_dir or 0
-            v_avg = weather_record.wind_speed
-            v_max = weather_record.v_max or (v_avg * 1.5)
-            cloudcover = weather_record.cloudcover or 50
-            weather_code = weather_record.weather_code or 0
-        else:
-            print(f"❌ Нет погоды до {weather_date}, используем дефолтные значения")
-            # ❗️Не пропускаем штабель — используем дефолтные значения
-            t = 5.0
-            p = 1013.25
-            humidity = 70
-            precipitation = 0.0
-            wind_dir = 0
-            v_avg = 5.0
-            v_max = 7.5
-            cloudcover = 50
-            weather_code = 0
-
-        # ❗️Подготовить признаки
-        predict_data = {
-            "Склад": warehouse,
-            "Штабель": int(pile_id),
-            "Марка": last_temp.coal_grade,
-            "Максимальная_температура": last_temp.max_temp,
-            "Смена": last_temp.shift,
-            "t": t,
-            "p": p,
-            "humidity": humidity,
-            "precipitation": precipitation,
-            "wind_dir": wind_dir,
-            "v_avg": v_avg,
-            "v_max": v_max,
-            "cloudcover": cloudcover,
-            "weather_code": weather_code,
-            "Наим_ЕТСНГ": last_temp.coal_grade,
-            "На_склад_тн": 0.0,
-            "На_судно_тн": 0.0,
-            "Склад_supply": warehouse,
-            "ДниСНачалаФормирования": pile_age_days
-        }
+    days = horizon_days(start_dt, end_dt)
+    if len(days) > HORIZON_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Окно прогноза не больше {HORIZON_MAX_DAYS} дней")
+
+    # ❗️Последняя температура до start_date (не включая), возраст на start_date
+    # и ближайшая погода не позже дня перед start_date — для дней окна без погоды
+    features, weather = await asyncio.gather(
+        load_pile_features_async(
+            age_reference=start_dt,
+            temperature_before=start_dt,
+            weather_as_of=start_dt - timedelta(days=1),
+            weather_defaults=TEST_WEATHER_DEFAULTS
+        ),
+        load_daily_weather_async(days)
+    )
+    logger.debug("Собраны признаки для %d штабелей", len(features))
 
-        # ❗️Вызвать predict
-        try:
-            print(f"DEBUG: Вызов predict_ignition_risk для склада {warehouse}, штабель {pile_id}")
-            prediction = predict_ignition_risk(predict_data, session)
-            print(f"DEBUG: Прогноз: {prediction}")
-
-            predicted_date_str = prediction.get("predicted_ignition_date")
-
-            if predicted_date_str:
-                predicted_date = datetime.fromisoformat(predicted_date_str).date()
-
-                if start_dt <= predicted_date <= end_dt:  # ❗️Проверка попадания в диапазон
-                    incidents.append({
-                        "date": predicted_date.isoformat(),
-                        "warehouse": warehouse,
-                        "pile_id": pile_id,
-                        "predicted_ignition_date": predicted_date_str,
-                        "message": prediction.get("message", "")
-                    })
-        except Exception as e:
-            print(f"ERROR: Прогноз не удался для {warehouse}, {pile_id}: {e}")
-            import traceback
-            traceback.print_exc()
-            continue
-
-    # ❗️Агрегировать по дням
-    from collections import defaultdict
-    summary_by_day = defaultdict(int)
-    for inc in incidents:
-        summary_by_day[inc["date"]] += 1
-
-    # ❗️Заполнить все дни в диапазоне
-    date_list = [(start_dt + timedelta(days=i)).isoformat() for i in range((end_dt - start_dt).days + 1)]
-    final_summary = []
-    for d in date_list:
-        final_summary.append({
-            "date": d,
-            "count": summary_by_day[d]
-        })
+    # ❗️Прогноз на каждый день окна для каждого штабеля — один вызов модели
+    # (штабель, на котором модель падает, пропускается — см. predict_grid)
+    grid = await run_in_threadpool(forecast_horizon, features, days, weather, start_dt)
 
-    print(f"DEBUG: Возвращаем {len(incidents)} инцидентов и {len(final_summary)} дней")
+    result = summarize_horizon(grid, days)
+    logger.debug("Возвращаем %d инцидентов и %d дней",
+                 len(result["high_risk_incidents"]), len(result["summary_by_day"]))
 
     return {
         "period": f"{start_date} — {end_date}",
-        "summary_by_day": final_summary,
-        "high_risk_incidents": incidents
-    }
\ No newline at end of file
+        **result
+    }
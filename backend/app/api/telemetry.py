@@ -0,0 +1,13 @@
+# app/api/telemetry.py
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.services.telemetry import render_metrics
+
+# /api/metrics уже занят метриками точности модели, поэтому экспорт для Prometheus — /metrics
+router = APIRouter(tags=["telemetry"])
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def get_prometheus_metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
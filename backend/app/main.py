@@ -1,9 +1,25 @@
+import asyncio
+import os
+
 from fastapi import FastAPI
+from app.logging_config import setup_logging
+
+setup_logging()
+
 from app.api.routes import router
+from app.api.admin import ADMIN_OPEN, ADMIN_TOKEN, router as admin_router
+from app.api.telemetry import router as telemetry_router
+from app.database import async_engine, engine
+from app.services.forecast_job import snapshot_scheduler, FORECAST_SNAPSHOT_INTERVAL
+from app.services.model_registry import registry
+from app.services.profiling import PROFILING, ProfilingMiddleware, instrument_engine as instrument_profiling
+from app.services.telemetry import TELEMETRY, TelemetryMiddleware, instrument_engine
 from fastapi.middleware.cors import CORSMiddleware
 
 app = FastAPI(title="Прогноз самовозгорания угля (Хакатон)")
 app.include_router(router)
+app.include_router(admin_router)
+app.include_router(telemetry_router)
 
 app.add_middleware(
     CORSMiddleware,
@@ -11,4 +27,35 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-)
\ No newline at end of file
+)
+
+# TELEMETRY=0 — без замеров запросов и SQL (эндпоинт /metrics остаётся)
+if TELEMETRY:
+    instrument_engine(engine, "sync")
+    instrument_engine(async_engine.sync_engine, "async")
+    app.add_middleware(TelemetryMiddleware)
+
+# PROFILING=1 — запрос с X-Profile: 1 или ?profile=1 профилируется (см. app/services/profiling.py)
+if PROFILING:
+    instrument_profiling(engine)
+    instrument_profiling(async_engine.sync_engine)
+    app.add_middleware(ProfilingMiddleware, admin_token=ADMIN_TOKEN, admin_open=ADMIN_OPEN)
+
+
+@app.on_event("startup")
+def load_model():
+    # MODEL_EAGER_LOAD=0 — модель загрузится при первом прогнозе
+    if os.getenv("MODEL_EAGER_LOAD", "1") == "1":
+        registry.get()
+
+
+@app.on_event("startup")
+async def start_forecast_scheduler():
+    # FORECAST_SNAPSHOT_INTERVAL>0 — снимок прогноза пересчитывается по расписанию
+    if FORECAST_SNAPSHOT_INTERVAL > 0:
+        app.state.forecast_scheduler = asyncio.create_task(snapshot_scheduler())
+
+
+@app.on_event("shutdown")
+async def close_async_engine():
+    await async_engine.dispose()
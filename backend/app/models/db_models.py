@@ -1,11 +1,16 @@
 # app/models/db_models.py
 from datetime import datetime, date
 from sqlmodel import SQLModel, Field
+from sqlalchemy import Column, Computed, Date, Index
 from typing import Optional
 
 
 # --- Таблицы для ввода с фронта и метрик ---
 class CurrentStockpile(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_currentstockpile_pile", "warehouse", "pile_id"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     warehouse: int
     pile_id: str
@@ -16,14 +21,63 @@ class CurrentStockpile(SQLModel, table=True):
 
 
 class ActualFire(SQLModel, table=True):
+    __table_args__ = (
+        # одно возгорание штабеля в день; повторная загрузка не учитывается в метриках дважды
+        Index("uq_actualfire_pile_date", "warehouse", "pile_id", "fire_date", unique=True),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     warehouse: int
     pile_id: str
     fire_date: date
 
 
+class PredictionLog(SQLModel, table=True):
+    """Каждый выданный прогноз — для сверки с фактическими возгораниями."""
+    __table_args__ = (
+        # одна запись на прогноз; она же — поиск прогнозов штабеля в окне ±2 дня от возгорания
+        Index("uq_predictionlog_pile_prediction", "warehouse", "pile_id", "predicted_date", "issue_date", unique=True),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    warehouse: int
+    pile_id: str
+    coal_grade: Optional[str] = None
+    issue_date: date               # дата, от которой считался прогноз
+    predicted_date: date
+    model_version: Optional[str] = None
+    issued_at: datetime = Field(default_factory=datetime.utcnow)
+    matched: bool = False          # уже совпал с фактическим возгоранием
+
+
+class MetricsCounter(SQLModel, table=True):
+    """
+    Накопительные счётчики качества прогнозов: "all", "warehouse:<N>", "grade:<марка>".
+    Обновляются при каждом прогнозе и каждом фактическом возгорании.
+    """
+    scope: str = Field(primary_key=True)
+    predictions: int = 0           # выдано прогнозов
+    predictions_hit: int = 0       # прогнозов, совпавших с возгоранием ±2 дня
+    fires: int = 0                 # фактических возгораний
+    fires_hit: int = 0             # возгораний, предсказанных ±2 дня
+    lead_days_sum: int = 0         # сумма заблаговременности по fires_hit
+    lead_0_1: int = 0              # распределение заблаговременности, дни
+    lead_2_3: int = 0
+    lead_4_7: int = 0
+    lead_8_14: int = 0
+    lead_15_plus: int = 0
+
+
 # --- Исторические данные (для DS и анализа) ---
 class Temperature(SQLModel, table=True):
+    __table_args__ = (
+        # естественный ключ замера; он же покрывает поиск последнего замера по штабелю,
+        # /pile-weather и /stacks/{warehouse}
+        Index("uq_temperature_reading", "warehouse", "pile_id", "measurement_date", "shift", unique=True),
+        # max(measurement_date) для /dashboard-summary
+        Index("ix_temperature_date", "measurement_date"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     warehouse: int
     pile_id: str
@@ -34,6 +88,10 @@ class Temperature(SQLModel, table=True):
 
 
 class FireEvent(SQLModel, table=True):
+    __table_args__ = (
+        Index("uq_fireevent_pile_start", "warehouse", "pile_id", "fire_start", unique=True),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     warehouse: int
     pile_id: str
@@ -44,6 +102,11 @@ class FireEvent(SQLModel, table=True):
 
 # --- Погода ---
 class Weather(SQLModel, table=True):
+    __table_args__ = (
+        Index("uq_weather_datetime", "datetime", unique=True),
+        Index("ix_weather_date", "weather_date"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     datetime: datetime                    # точное время (почасово)
     temp: float                           # температура, °C
@@ -52,12 +115,22 @@ class Weather(SQLModel, table=True):
     precipitation: float                  # осадки, мм
     wind_dir: Optional[int]               # направление ветра, градусы
     wind_speed: float                     # средняя скорость ветра, км/ч
+    v_max: Optional[float]                # максимальная скорость ветра (порывы) за час, км/ч
     cloudcover: Optional[int]             # облачность, %
     visibility: Optional[int]             # видимость, м
     weather_code: Optional[int]           # код погоды
+    # день измерения, вычисляется в БД — фильтры по дню используют индекс вместо func.date()
+    weather_date: Optional[date] = Field(
+        default=None,
+        sa_column=Column(Date, Computed("date(datetime)", persisted=True))
+    )
 
 
 class Supply(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_supply_pile", "warehouse", "pile_id"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     unload_to_warehouse: datetime  # ВыгрузкаНаСклад
     coal_grade: str                # Наим. ЕТСНГ
@@ -65,4 +138,41 @@ class Supply(SQLModel, table=True):
     load_to_ship: datetime         # ПогрузкаНаСудно
     to_warehouse_tn: float         # "На склад, тн"
     to_ship_tn: float              # "На судно, тн"
-    warehouse: int                 # Склад
\ No newline at end of file
+    warehouse: int                 # Склад
+
+class WeatherDaily(SQLModel, table=True):
+    """Суточные агрегаты погоды; пересчитываются при загрузке почасовых данных."""
+    day: date = Field(primary_key=True)
+    avg_temp: float
+    avg_humidity: float
+    total_precip: float
+    avg_wind_speed: float
+    max_wind_speed: float
+    avg_pressure: Optional[float]
+    avg_cloudcover: Optional[float]
+    hours: int                     # сколько почасовых записей вошло в агрегат
+
+
+class ForecastSnapshot(SQLModel, table=True):
+    """
+    Прогноз «штабель × день», посчитанный фоновой задачей (app/services/forecast_job.py).
+    Снимок — все строки с одним generated_at; дашборд читает последний.
+    """
+    __table_args__ = (
+        # последний снимок и его дни — max(generated_at) и выборка по префиксу индекса
+        Index("ix_forecastsnapshot_generated_day", "generated_at", "forecast_day"),
+        # /calendar: диапазон дат возгорания с фильтром по складам
+        Index("ix_forecastsnapshot_predicted", "predicted_date", "warehouse"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    generated_at: datetime
+    forecast_day: date
+    warehouse: int
+    pile_id: str
+    predicted_days_to_fire: float
+    predicted_ignition_date: datetime
+    predicted_date: date
+    risk_level: str
+    message: str
+    model_version: Optional[str] = None
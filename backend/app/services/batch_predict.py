@@ -0,0 +1,190 @@
+# app/services/batch_predict.py
+import io
+import json
+import logging
+import os
+from datetime import date, datetime
+from typing import Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.database import SessionLocal
+from app.services.metrics import log_predictions, prediction_record
+from app.services.predictor import predict_ignition_risk_batch
+
+logger = logging.getLogger(__name__)
+
+# Больше строк в одном запросе не принимается (413)
+BATCH_PREDICT_MAX_ROWS = int(os.getenv("BATCH_PREDICT_MAX_ROWS", "100000"))
+# Строки оцениваются пачками: один вызов model.predict на пачку, ответ уходит по мере готовности
+BATCH_PREDICT_CHUNK_ROWS = int(os.getenv("BATCH_PREDICT_CHUNK_ROWS", "5000"))
+
+# Форматы тела запроса
+BATCH_FORMATS = {
+    "application/json": "json",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+    "text/csv": "csv",
+}
+FILE_FORMATS = {".json": "json", ".ndjson": "ndjson", ".jsonl": "ndjson", ".csv": "csv"}
+
+PARSE_ERROR = "__parse_error__"
+
+
+def batch_format(content_type: str = "", filename: Optional[str] = None) -> Optional[str]:
+    """Формат по расширению загруженного файла, иначе по Content-Type тела запроса."""
+    if filename:
+        return FILE_FORMATS.get(os.path.splitext(filename)[1].lower(), "csv")
+    return BATCH_FORMATS.get(content_type.split(";")[0].strip().lower())
+
+
+def parse_batch(body: bytes, fmt: str) -> pd.DataFrame:
+    """
+    Тело запроса → DataFrame, строка = запись. Записи NDJSON, которые не удалось
+    разобрать, и элементы JSON-массива, не являющиеся объектами, не роняют пакет —
+    у них заполнена колонка PARSE_ERROR. Ошибка формата всего тела — ValueError.
+    """
+    if fmt == "csv":
+        try:
+            frame = pd.read_csv(io.BytesIO(body), dtype=str, skipinitialspace=True)
+        except pd.errors.EmptyDataError:
+            return pd.DataFrame()
+        frame.columns = frame.columns.str.strip()
+        return frame
+
+    if fmt == "json":
+        try:
+            items = json.loads(body or b"[]")
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Невалидный JSON: {e}")
+        if not isinstance(items, list):
+            raise ValueError("Ожидается JSON-массив объектов")
+    else:
+        items = []
+        for line in body.splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                items.append({PARSE_ERROR: f"невалидный JSON: {e.msg}"})
+
+    records = [
+        item if isinstance(item, dict) else {PARSE_ERROR: "запись не является объектом"}
+        for item in items
+    ]
+    return pd.DataFrame.from_records(records)
+
+
+def _is_iso_date(value: str) -> bool:
+    try:
+        datetime.fromisoformat(value)
+        return True
+    except ValueError:
+        return False
+
+
+def validate_batch(frame: pd.DataFrame, schema: dict):
+    """
+    Проверка по колонкам, а не по записям: для каждого поля схемы {имя: int | float | str}
+    считается маска пустых и нераспознанных значений. Возвращает (признаки для модели
+    с приведёнными типами, список ошибок по строкам, маска строк без ошибок).
+    """
+    n = len(frame)
+    problems = []
+    features = pd.DataFrame(index=frame.index)
+
+    for name, kind in schema.items():
+        if name not in frame.columns:
+            problems.append((np.ones(n, dtype=bool), f"{name}: обязательное поле"))
+            continue
+        raw = frame[name]
+        missing = raw.isna().to_numpy()
+        problems.append((missing, f"{name}: обязательное поле"))
+        if kind is str:
+            features[name] = raw.astype(str).where(raw.notna())
+            continue
+        values = pd.to_numeric(raw, errors="coerce")
+        problems.append((~missing & values.isna().to_numpy(), f"{name}: ожидается число"))
+        if kind is int:
+            problems.append(((values.notna() & (values % 1 != 0)).to_numpy(), f"{name}: ожидается целое число"))
+        features[name] = values
+
+    # дата отсчёта прогноза необязательна (по умолчанию — сегодня, как у /predict);
+    # проверяется по уникальным значениям
+    issue_date = date.today().isoformat()
+    if "current_date" in frame.columns:
+        dates = frame["current_date"].where(frame["current_date"].notna(), issue_date).astype(str)
+        valid_dates = {d: _is_iso_date(d) for d in dates.unique()}
+        problems.append((~dates.map(valid_dates).to_numpy(dtype=bool), "current_date: ожидается YYYY-MM-DD"))
+        features["current_date"] = dates
+    else:
+        features["current_date"] = issue_date
+
+    parse_failed = frame[PARSE_ERROR].notna().to_numpy() if PARSE_ERROR in frame.columns else np.zeros(n, dtype=bool)
+    errors = [[] for _ in range(n)]
+    for i in np.flatnonzero(parse_failed):
+        errors[i].append(frame[PARSE_ERROR].iloc[i])
+    for mask, message in problems:
+        for i in np.flatnonzero(mask & ~parse_failed):
+            errors[i].append(message)
+
+    valid = np.array([not e for e in errors], dtype=bool)
+    return features, errors, valid
+
+
+def _line(payload: dict) -> str:
+    return json.dumps(payload, ensure_ascii=False, default=str) + "\n"
+
+
+def stream_predictions(features: pd.DataFrame, errors: List[list], valid: np.ndarray,
+                       schema: dict, chunk_rows: int = BATCH_PREDICT_CHUNK_ROWS) -> Iterator[str]:
+    """
+    NDJSON в порядке входных строк: {"row", "status": "ok", прогноз…} или
+    {"row", "status": "error", "errors": [...]}, последней строкой — {"summary": …}.
+    Прогнозы пишутся в журнал для /api/metrics, как у /predict.
+    """
+    int_columns = [name for name, kind in schema.items() if kind is int]
+    scored = failed = 0
+    model_version = None
+
+    with SessionLocal() as session:
+        for start in range(0, len(features), chunk_rows):
+            stop = min(start + chunk_rows, len(features))
+            chunk_valid = np.flatnonzero(valid[start:stop]) + start
+            predictions = {}
+            if len(chunk_valid):
+                rows = features.iloc[chunk_valid].astype({c: "int64" for c in int_columns})
+                try:
+                    results = predict_ignition_risk_batch(rows)
+                    predictions = dict(zip(chunk_valid.tolist(), results))
+                except Exception:
+                    # сбой модели — ошибка у строк этой пачки, остальные пачки продолжают
+                    logger.exception("Ошибка пакетного прогноза, строки %d–%d", start, stop - 1)
+                    results = []
+                try:
+                    log_predictions(session, [
+                        prediction_record(r["Склад"], r["Штабель"], r["Марка"],
+                                          datetime.fromisoformat(r["current_date"]).date(), result)
+                        for r, result in zip(rows.to_dict("records"), results)
+                    ])
+                    session.commit()
+                except Exception:
+                    # журнал для метрик не должен отнимать у клиента уже посчитанные прогнозы
+                    logger.exception("Не удалось записать пакетные прогнозы в журнал")
+                    session.rollback()
+
+            for i in range(start, stop):
+                result = predictions.get(i)
+                if result is not None:
+                    scored += 1
+                    model_version = result["model_version"]
+                    yield _line({"row": i, "status": "ok", **result})
+                else:
+                    failed += 1
+                    yield _line({"row": i, "status": "error", "errors": errors[i] or ["ошибка модели"]})
+
+    yield _line({"summary": {"rows": len(features), "scored": scored, "errors": failed,
+                             "model_version": model_version}})
@@ -1,58 +1,83 @@
 # app/services/data_loader.py
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import pandas as pd
-from sqlalchemy.orm import Session
-from app.models.db_models import Temperature, FireEvent
+
 from app.database import engine
+from app.services.ingest import count_header_rows, ingest_frame
+from app.services.parquet_cache import DATA_DIR, PARQUET_CACHE, ensure_cached, read_for_ingest, sources
+from app.services.weather_loader import load_weather_files
+
+# Наборы данных, которые умеет загружать load_db.py, в порядке загрузки по умолчанию
+LOADABLE_DATASETS = ["temperature", "fires", "weather", "supplies"]
+
+
+def read_dataset_raw(kind: str, data_dir: str = DATA_DIR) -> pd.DataFrame:
+    """Все исходные файлы набора одним кадром (у погоды — все weather_data_*.csv)."""
+    frames = []
+    for path in sources(kind, data_dir):
+        raw = read_for_ingest(path)
+        # у сырого CSV (PARQUET_CACHE=0) в каждом файле своя строка заголовка
+        frames.append(raw.iloc[count_header_rows(raw):])
+    if not frames:
+        raise FileNotFoundError(f"Нет файлов набора {kind} в {data_dir}")
+    return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+
+def load_dataset(kind: str, rejects_dir: str = None, data_dir: str = DATA_DIR) -> dict:
+    """
+    Один набор: чтение всех файлов, векторная очистка и проверка, одна bulk-запись
+    в отдельной транзакции (погода — по транзакции на год, см. load_weather_files).
+    Отбракованные строки — в <rejects_dir>/<kind>_rejects.csv.
+    """
+    started = time.perf_counter()
+    if kind == "weather":
+        # погода — пачка годовых файлов: разбор в пуле процессов, транзакция на год
+        stats = load_weather_files(sources(kind, data_dir), rejects_dir=rejects_dir, progress=False)
+        stats["total_seconds"] = stats["seconds"]
+        if rejects_dir and stats["rejected_rows"]:
+            stats["rejects_file"] = rejects_dir
+        return stats
+
+    raw = read_dataset_raw(kind, data_dir)
+
+    rejects_path = None
+    if rejects_dir:
+        os.makedirs(rejects_dir, exist_ok=True)
+        rejects_path = os.path.join(rejects_dir, f"{kind}_rejects.csv")
+        if os.path.exists(rejects_path):
+            os.remove(rejects_path)
+
+    with engine.begin() as conn:
+        stats = ingest_frame(conn, kind, raw, skip_header=False, rejects_path=rejects_path)
+    stats["total_seconds"] = round(time.perf_counter() - started, 3)
+    if rejects_path and stats["rejected_rows"]:
+        stats["rejects_file"] = rejects_path
+    return stats
+
+
+def load_datasets(kinds=None, workers: int = None, rejects_dir: str = None,
+                  data_dir: str = DATA_DIR) -> dict:
+    """
+    Загружает наборы параллельно: у каждого своё соединение из пула и своя транзакция,
+    пока один набор чистится в pandas, другой уже пишется в БД.
+    """
+    kinds = list(kinds or LOADABLE_DATASETS)
+    if PARQUET_CACHE:
+        # кэш обновляется один раз до пула — потоки только читают готовые файлы
+        ensure_cached(kinds, data_dir)
+    with ThreadPoolExecutor(max_workers=workers or len(kinds)) as pool:
+        futures = {kind: pool.submit(load_dataset, kind, rejects_dir, data_dir) for kind in kinds}
+        return {kind: future.result() for kind, future in futures.items()}
+
 
 def load_csv_to_db():
-    # === Загрузка temperature.csv ===
-    temp_df = pd.read_csv("app/data/temperature.csv", on_bad_lines="skip", dtype=str, header=None)
-    temp_df = temp_df[temp_df.apply(lambda x: len(x) == 7, axis=1)]
-    temp_df.columns = ["Склад", "Штабель", "Марка", "Максимальная температура", "Пикет", "Дата акта", "Смена"]
-
-    # Преобразование даты
-    temp_df["Дата акта"] = pd.to_datetime(temp_df["Дата акта"], format="%Y-%m-%d", errors="coerce")
-    temp_df["Максимальная температура"] = pd.to_numeric(temp_df["Максимальная температура"], errors="coerce")
-    temp_df["Склад"] = pd.to_numeric(temp_df["Склад"], errors="coerce").astype("Int64")
-    temp_df["Смена"] = pd.to_numeric(temp_df["Смена"], errors="coerce")
-
-    # УДАЛЯЕМ строки, где хотя бы одно из ключевых полей — NaN
-    temp_df = temp_df.dropna(subset=["Дата акта", "Максимальная температура", "Склад", "Смена"])
-
-    # === Загрузка fires.csv ===
-    fires_df = pd.read_csv("app/data/fires.csv", on_bad_lines="skip")
-    fires_df.columns = [
-        "Дата составления", "Груз", "Вес", "Склад",
-        "Дата начала", "Дата оконч.", "Нач.форм.штабеля", "Штабель"
-    ]
-    fires_df["Дата начала"] = pd.to_datetime(fires_df["Дата начала"], format="%Y-%m-%d %H:%M:%S", errors="coerce")
-    fires_df["Нач.форм.штабеля"] = pd.to_datetime(fires_df["Нач.форм.штабеля"], format="%Y-%m-%d %H:%M:%S", errors="coerce")
-    fires_df["Склад"] = pd.to_numeric(fires_df["Склад"], errors="coerce").astype("Int64")
-    fires_df = fires_df.dropna(subset=["Дата начала", "Склад", "Штабель"])
-
-    # === Сохранение в БД ===
-    with Session(engine) as session:
-        for _, row in temp_df.iterrows():
-            temp = Temperature(
-                warehouse=int(row["Склад"]),
-                pile_id=str(row["Штабель"]),
-                coal_grade=row["Марка"],
-                max_temp=float(row["Максимальная температура"]),
-                measurement_date=row["Дата акта"],
-                shift=int(row["Смена"])  # ← Теперь гарантированно не NaN
-            )
-            session.add(temp)
-        session.commit()
-
-        for _, row in fires_df.iterrows():
-            fire = FireEvent(
-                warehouse=int(row["Склад"]),
-                pile_id=str(row["Штабель"]),
-                coal_grade=row["Груз"],
-                fire_start=row["Дата начала"],
-                pile_formed_at=row["Нач.форм.штабеля"]
-            )
-            session.add(fire)
-        session.commit()
-
-    print("✅ Данные загружены в PostgreSQL")
\ No newline at end of file
+    # === temperature.csv и fires.csv: очистка, проверка и bulk-запись (COPY на PostgreSQL) ===
+    results = load_datasets(["temperature", "fires"])
+
+    for name, stats in results.items():
+        print(f"  {name}: добавлено {stats['inserted_rows']}, обновлено {stats['updated_rows']}, "
+              f"отбраковано {stats['rejected_rows']}, {stats['rows_per_sec']} строк/с")
+    print("✅ Данные загружены в PostgreSQL")
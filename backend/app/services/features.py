@@ -0,0 +1,298 @@
+# app/services/features.py
+import asyncio
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+
+import pandas as pd
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.database import fetch_all
+from app.models.db_models import Temperature, FireEvent, Weather
+from app.services.weather_store import WEATHER_STORE, WeatherStore, weather_store
+
+# Значения погоды, если в БД ничего не нашлось
+DEFAULT_WEATHER = {
+    "t": 20.0,
+    "p": 1013.25,
+    "humidity": 65,
+    "precipitation": 0.0,
+    "wind_dir": 0,
+    "v_avg": 5.0,
+    "cloudcover": 50,
+    "weather_code": 0,
+}
+
+DEFAULT_PILE_AGE_DAYS = 30
+
+PILE_KEYS = ["warehouse", "pile_id"]
+
+WEATHER_COLUMNS = {
+    "temp": "t",
+    "pressure": "p",
+    "humidity": "humidity",
+    "precipitation": "precipitation",
+    "wind_dir": "wind_dir",
+    "wind_speed": "v_avg",
+    "v_max": "v_max",
+    "cloudcover": "cloudcover",
+    "weather_code": "weather_code",
+}
+
+
+def fill_v_max(frame: pd.DataFrame) -> pd.Series:
+    """
+    Порывы ветра (v_max) из погоды; у строк, загруженных до появления колонки, и без погоды
+    берётся средняя скорость — порыв не меньше неё, а множителя, на котором училась модель, нет.
+    """
+    return pd.to_numeric(frame["v_max"], errors="coerce").fillna(pd.to_numeric(frame["v_avg"], errors="coerce"))
+
+
+def latest_temperature_stmt(before: Optional[date] = None):
+    """Последний замер по каждому штабелю (window function вместо запроса на штабель)."""
+    rn = func.row_number().over(
+        partition_by=(Temperature.warehouse, Temperature.pile_id),
+        order_by=(Temperature.measurement_date.desc(), Temperature.id.desc())
+    ).label("rn")
+    inner = select(
+        Temperature.warehouse,
+        Temperature.pile_id,
+        Temperature.coal_grade,
+        Temperature.max_temp,
+        Temperature.measurement_date,
+        Temperature.shift,
+        rn
+    )
+    if before is not None:
+        inner = inner.where(Temperature.measurement_date < _start_of_day(before))
+    inner = inner.subquery()
+    return select(
+        inner.c.warehouse,
+        inner.c.pile_id,
+        inner.c.coal_grade,
+        inner.c.max_temp,
+        inner.c.measurement_date,
+        inner.c.shift
+    ).where(inner.c.rn == 1)
+
+
+def pile_formation_stmt():
+    """Дата формирования по каждому штабелю — первая запись FireEvent."""
+    rn = func.row_number().over(
+        partition_by=(FireEvent.warehouse, FireEvent.pile_id),
+        order_by=FireEvent.id
+    ).label("rn")
+    inner = select(FireEvent.warehouse, FireEvent.pile_id, FireEvent.pile_formed_at, rn).subquery()
+    return select(inner.c.warehouse, inner.c.pile_id, inner.c.pile_formed_at).where(inner.c.rn == 1)
+
+
+def weather_as_of_stmt(as_of: date):
+    """Ближайшая погода не позже дня as_of — одна строка на все штабели."""
+    return select(*[getattr(Weather, c) for c in WEATHER_COLUMNS]).where(
+        Weather.datetime < _start_of_day(as_of) + timedelta(days=1)
+    ).order_by(Weather.datetime.desc()).limit(1)
+
+
+def weather_first_of_day_stmt(days):
+    """Первая почасовая запись погоды за каждый из дней days."""
+    days = list(days)
+    rn = func.row_number().over(partition_by=Weather.weather_date, order_by=Weather.datetime).label("rn")
+    inner = select(
+        Weather.weather_date.label("day"), *[getattr(Weather, c) for c in WEATHER_COLUMNS], rn
+    ).where(Weather.weather_date.in_(days))
+    if days:
+        # границы по datetime — ключу секционирования weather (отсечение секций на PostgreSQL)
+        inner = inner.where(
+            Weather.datetime >= _start_of_day(min(days)),
+            Weather.datetime < _start_of_day(max(days)) + timedelta(days=1)
+        )
+    inner = inner.subquery()
+    return select(inner.c.day, *[inner.c[c] for c in WEATHER_COLUMNS]).where(inner.c.rn == 1)
+
+
+async def current_weather_store() -> Optional[WeatherStore]:
+    """Массив погоды (WEATHER_STORE=0 — None); пересборка читает weather, поэтому в пуле потоков."""
+    if not WEATHER_STORE:
+        return None
+    store = weather_store.peek()
+    return store if store is not None else await run_in_threadpool(weather_store.get)
+
+
+def last_weather_datetime(session: Session) -> Optional[datetime]:
+    if WEATHER_STORE:
+        return weather_store.get().last_datetime
+    return session.execute(select(func.max(Weather.datetime))).scalar()
+
+
+async def last_weather_datetime_async() -> Optional[datetime]:
+    store = await current_weather_store()
+    if store is not None:
+        return store.last_datetime
+    ((value,),) = await fetch_all(select(func.max(Weather.datetime)))
+    return value
+
+
+def _frame(result) -> pd.DataFrame:
+    return pd.DataFrame(result.fetchall(), columns=list(result.keys()))
+
+
+async def _fetch_frame(stmt) -> pd.DataFrame:
+    return pd.DataFrame(await fetch_all(stmt), columns=list(stmt.selected_columns.keys()))
+
+
+def _as_date(value) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.fromisoformat(str(value)).date()
+
+
+def _start_of_day(value) -> datetime:
+    # asyncpg не приводит date к timestamp сам — сравниваем колонки datetime с datetime
+    return datetime.combine(_as_date(value), time.min)
+
+
+def _temperature_days(temps: pd.DataFrame) -> list:
+    return sorted({_as_date(d) for d in temps["measurement_date"]})
+
+
+def last_data_day(*values) -> Optional[date]:
+    """Более поздняя из дат последнего замера и последней погоды; None, если данных нет."""
+    days = [_as_date(v) for v in values if v is not None]
+    return max(days) if days else None
+
+
+def assemble_features(
+    temps: pd.DataFrame,
+    formations: pd.DataFrame,
+    weather: pd.DataFrame,
+    age_reference: date,
+    weather_defaults: dict = DEFAULT_WEATHER
+) -> pd.DataFrame:
+    """
+    Склеивает результаты трёх запросов в таблицу признаков для predict_ignition_risk_batch.
+
+    weather — либо одна строка (общая погода для всех штабелей), либо строки с колонкой
+    "day", которые присоединяются по дню последнего замера.
+    """
+    if temps.empty:
+        return pd.DataFrame(columns=PILE_KEYS)
+
+    frame = temps.copy()
+    frame["pile_id"] = frame["pile_id"].astype(str)
+    frame["temp_day"] = frame["measurement_date"].map(_as_date)
+
+    if not formations.empty:
+        formations = formations.assign(pile_id=formations["pile_id"].astype(str))
+        frame = frame.merge(formations, on=PILE_KEYS, how="left")
+    else:
+        frame["pile_formed_at"] = None
+
+    formed = pd.to_datetime(frame["pile_formed_at"], errors="coerce")
+    age = (pd.Timestamp(age_reference) - formed.dt.normalize()).dt.days
+    frame["ДниСНачалаФормирования"] = age.fillna(DEFAULT_PILE_AGE_DAYS).astype(int)
+
+    weather = weather.rename(columns=WEATHER_COLUMNS)
+    if "day" in weather.columns:
+        weather = weather.assign(temp_day=weather["day"].map(_as_date)).drop(columns="day")
+        frame = frame.merge(weather, on="temp_day", how="left")
+    else:
+        for col in WEATHER_COLUMNS.values():
+            frame[col] = weather[col].iloc[0] if not weather.empty else None
+
+    for col, default in weather_defaults.items():
+        frame[col] = pd.to_numeric(frame[col], errors="coerce").fillna(default)
+    frame["v_max"] = fill_v_max(frame)
+
+    frame["Склад"] = frame["warehouse"]
+    frame["Штабель"] = frame["pile_id"]
+    frame["Марка"] = frame["coal_grade"]
+    frame["Максимальная_температура"] = frame["max_temp"]
+    frame["Смена"] = frame["shift"]
+    frame["Наим_ЕТСНГ"] = frame["coal_grade"]
+    frame["На_склад_тн"] = 0.0
+    frame["На_судно_тн"] = 0.0
+    frame["Склад_supply"] = frame["warehouse"]
+
+    return frame.reset_index(drop=True)
+
+
+def load_pile_features(
+    session: Session,
+    age_reference: date,
+    temperature_before: Optional[date] = None,
+    weather_as_of: Optional[date] = None,
+    weather_defaults: dict = DEFAULT_WEATHER
+) -> pd.DataFrame:
+    """
+    Признаки по всем штабелям за константное число запросов (3 вместо 3N+1).
+
+    Если weather_as_of задан, берётся одна общая погода на эту дату, иначе —
+    погода за день последнего замера каждого штабеля.
+    """
+    temps = _frame(session.execute(latest_temperature_stmt(temperature_before)))
+    if temps.empty:
+        return pd.DataFrame(columns=PILE_KEYS)
+
+    formations = _frame(session.execute(pile_formation_stmt()))
+
+    store = weather_store.get() if WEATHER_STORE else None
+    days = _temperature_days(temps)
+    if store is not None:
+        weather = store.as_of(weather_as_of) if weather_as_of is not None else store.first_of_day(days)
+    elif weather_as_of is not None:
+        weather = _frame(session.execute(weather_as_of_stmt(weather_as_of)))
+    else:
+        weather = _frame(session.execute(weather_first_of_day_stmt(days)))
+
+    return assemble_features(temps, formations, weather, age_reference, weather_defaults)
+
+
+def load_daily_weather(session: Session, days) -> pd.DataFrame:
+    """Первая запись погоды за каждый из дней окна прогноза (колонки в именах БД + "day")."""
+    if WEATHER_STORE:
+        return weather_store.get().first_of_day(days)
+    return _frame(session.execute(weather_first_of_day_stmt(days)))
+
+
+async def load_pile_features_async(
+    age_reference: date,
+    temperature_before: Optional[date] = None,
+    weather_as_of: Optional[date] = None,
+    weather_defaults: dict = DEFAULT_WEATHER
+) -> pd.DataFrame:
+    """
+    То же, что load_pile_features, но через async-движок: независимые запросы
+    выполняются одновременно (asyncio.gather). Погода по дням замеров зависит
+    от результата первого запроса и идёт следом.
+    """
+    store = await current_weather_store()
+    queries = [latest_temperature_stmt(temperature_before), pile_formation_stmt()]
+    if weather_as_of is not None and store is None:
+        queries.append(weather_as_of_stmt(weather_as_of))
+    frames = await asyncio.gather(*(_fetch_frame(q) for q in queries))
+
+    temps, formations = frames[0], frames[1]
+    if temps.empty:
+        return pd.DataFrame(columns=PILE_KEYS)
+
+    if weather_as_of is not None:
+        weather = store.as_of(weather_as_of) if store is not None else frames[2]
+    else:
+        days = _temperature_days(temps)
+        if store is not None:
+            weather = store.first_of_day(days)
+        else:
+            weather = await _fetch_frame(weather_first_of_day_stmt(days))
+
+    return assemble_features(temps, formations, weather, age_reference, weather_defaults)
+
+
+async def load_daily_weather_async(days) -> pd.DataFrame:
+    """Первая запись погоды за каждый из дней окна прогноза (колонки в именах БД + "day")."""
+    store = await current_weather_store()
+    if store is not None:
+        return store.first_of_day(days)
+    return await _fetch_frame(weather_first_of_day_stmt(days))
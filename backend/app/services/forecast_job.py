@@ -0,0 +1,193 @@
+# app/services/forecast_job.py
+import asyncio
+import fcntl
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Iterator, Optional
+
+import pandas as pd
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, func, insert, select, text
+from sqlalchemy.engine import URL
+
+from app.database import SessionLocal, fetch_all
+from app.models.db_models import ForecastSnapshot, Temperature
+from app.services.features import last_data_day, last_weather_datetime, load_daily_weather, load_pile_features
+from app.services.horizon import forecast_horizon, horizon_days
+from app.services.metrics import log_predictions, prediction_record
+
+logger = logging.getLogger(__name__)
+
+# На сколько дней вперёд считается снимок (верхняя граница forecast_days у дашборда)
+FORECAST_SNAPSHOT_DAYS = int(os.getenv("FORECAST_SNAPSHOT_DAYS", "30"))
+# Сколько последних снимков хранить
+FORECAST_SNAPSHOT_KEEP = int(os.getenv("FORECAST_SNAPSHOT_KEEP", "3"))
+# Пересчёт по расписанию, секунды (0 — только после загрузки данных и из run_forecast.py)
+FORECAST_SNAPSHOT_INTERVAL = float(os.getenv("FORECAST_SNAPSHOT_INTERVAL", "0"))
+# Пересчитывать снимок после /upload-csv
+FORECAST_SNAPSHOT_ON_INGEST = os.getenv("FORECAST_SNAPSHOT_ON_INGEST", "1") == "1"
+
+SNAPSHOT_COLUMNS = [
+    "warehouse",
+    "pile_id",
+    "forecast_day",
+    "predicted_days_to_fire",
+    "predicted_ignition_date",
+    "predicted_date",
+    "risk_level",
+    "message",
+    "model_version",
+]
+
+# Снимок пишет один процесс за раз: воркеры uvicorn, пересчёт после загрузки и run_forecast.py.
+# Внутри процесса — _job_lock, между процессами — _snapshot_lock
+_job_lock = threading.Lock()
+SNAPSHOT_LOCK_NAME = "forecast_snapshot"
+
+
+def _lock_path(url: URL) -> str:
+    # рядом с файлом SQLite: у разных баз — разные блокировки
+    if url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:"):
+        return f"{url.database}.forecast.lock"
+    return os.path.join(tempfile.gettempdir(), "coal_forecast_snapshot.lock")
+
+
+@contextmanager
+def _snapshot_lock(session) -> Iterator[bool]:
+    """
+    Межпроцессная блокировка пересчёта без ожидания: True — получена,
+    False — снимок сейчас пишет другой процесс.
+    """
+    bind = session.get_bind()
+    if bind.dialect.name == "postgresql":
+        # держится до конца транзакции снимка (commit или откат при закрытии сессии)
+        yield session.execute(
+            text("SELECT pg_try_advisory_xact_lock(hashtext(:name))"), {"name": SNAPSHOT_LOCK_NAME}
+        ).scalar()
+        return
+    with open(_lock_path(bind.url), "a") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def snapshot_records(grid: pd.DataFrame, generated_at: datetime) -> list:
+    frame = grid[SNAPSHOT_COLUMNS].copy()
+    frame["warehouse"] = frame["warehouse"].astype(int)
+    frame["pile_id"] = frame["pile_id"].astype(str)
+    frame["predicted_ignition_date"] = pd.to_datetime(frame["predicted_ignition_date"]).map(lambda ts: ts.to_pydatetime())
+    frame["generated_at"] = generated_at
+    return frame.to_dict("records")
+
+
+def run_forecast_snapshot(days: int = FORECAST_SNAPSHOT_DAYS) -> Optional[dict]:
+    """
+    Считает прогноз на days дней вперёд от последних данных для всех штабелей
+    и сохраняет его новым снимком. Если пересчёт уже идёт (в этом или другом
+    процессе), возвращает None;
+    если прогнозировать нечего (нет замеров или модель не дала ни одной строки),
+    снимок не пишется — дашборд остаётся на предыдущем.
+    """
+    if not _job_lock.acquire(blocking=False):
+        logger.info("Пересчёт прогноза уже идёт, повторный запуск пропущен")
+        return None
+
+    started = time.perf_counter()
+    try:
+        with SessionLocal() as session, _snapshot_lock(session) as acquired:
+            if not acquired:
+                logger.info("Снимок прогноза пишет другой процесс, повторный запуск пропущен")
+                return None
+
+            last_date = last_data_day(
+                session.execute(select(func.max(Temperature.measurement_date))).scalar(),
+                last_weather_datetime(session)
+            )
+            if last_date is None:
+                logger.info("Нет данных для прогноза, снимок не создан")
+                return {"rows": 0}
+
+            start = last_date + timedelta(days=1)
+            window = horizon_days(start, start + timedelta(days=days - 1))
+            features = load_pile_features(session, age_reference=last_date)
+            if features.empty:
+                # например, загружена только погода
+                logger.info("Нет замеров температуры по штабелям, снимок не создан")
+                return {"rows": 0}
+            weather = load_daily_weather(session, window)
+            grid = forecast_horizon(features, window, weather, last_date)
+            if grid.empty:
+                logger.warning("Прогноз не построен ни для одного штабеля, снимок не создан")
+                return {"rows": 0}
+
+            generated_at = datetime.utcnow()
+            table = ForecastSnapshot.__table__
+            records = snapshot_records(grid, generated_at)
+            session.execute(insert(table), records)
+
+            # в журнал прогнозов — прогноз от последних фактических данных (первый день окна),
+            # по одному на штабель и прогнозную дату: пересчёт снимка не раздувает счётчик
+            issued = grid[grid["forecast_day"] == window[0]]
+            logged = log_predictions(session, [
+                prediction_record(r.warehouse, r.pile_id, r.coal_grade, r.forecast_day, r._asdict())
+                for r in issued.itertuples(index=False)
+            ], once_per_date=True)
+
+            kept = session.execute(
+                select(table.c.generated_at).distinct()
+                .order_by(table.c.generated_at.desc()).limit(FORECAST_SNAPSHOT_KEEP)
+            ).scalars().all()
+            session.execute(delete(table).where(table.c.generated_at.not_in(kept)))
+            session.commit()
+    finally:
+        _job_lock.release()
+
+    stats = {
+        "generated_at": generated_at.isoformat(),
+        "period": f"{window[0].isoformat()} — {window[-1].isoformat()}",
+        "piles": int(len(features)),
+        "rows": len(records),
+        "logged_predictions": logged,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+    logger.info("Снимок прогноза сохранён: %s", stats)
+    return stats
+
+
+def run_forecast_snapshot_safe():
+    """Для фоновых задач: ошибка пересчёта не должна ронять приложение."""
+    try:
+        run_forecast_snapshot()
+    except Exception:
+        logger.exception("Пересчёт снимка прогноза не удался")
+
+
+async def load_latest_snapshot_async() -> pd.DataFrame:
+    """Последний снимок одним запросом по индексу (generated_at, forecast_day)."""
+    table = ForecastSnapshot.__table__
+    latest = select(func.max(table.c.generated_at)).scalar_subquery()
+    stmt = select(table.c.generated_at, *[table.c[c] for c in SNAPSHOT_COLUMNS]).where(
+        table.c.generated_at == latest
+    )
+    frame = pd.DataFrame(await fetch_all(stmt), columns=["generated_at", *SNAPSHOT_COLUMNS])
+    # те же колонки, что у forecast_horizon, — для summarize_horizon
+    frame["predicted_ignition_date"] = frame["predicted_ignition_date"].map(lambda d: d.isoformat())
+    return frame
+
+
+async def snapshot_scheduler(interval: float = FORECAST_SNAPSHOT_INTERVAL):
+    """Пересчёт снимка раз в interval секунд внутри процесса приложения."""
+    while True:
+        await run_in_threadpool(run_forecast_snapshot_safe)
+        await asyncio.sleep(interval)
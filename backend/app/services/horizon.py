@@ -0,0 +1,139 @@
+# app/services/horizon.py
+import logging
+from datetime import date, timedelta
+from typing import List
+
+import pandas as pd
+
+from app.services.features import PILE_KEYS, WEATHER_COLUMNS, fill_v_max
+from app.services.predictor import predict_ignition_risk_batch
+
+logger = logging.getLogger(__name__)
+
+# Окно прогноза больше этого отклоняется: строк получается штабели × дни
+HORIZON_MAX_DAYS = 90
+
+WEATHER_FEATURES = list(WEATHER_COLUMNS.values())
+
+PREDICTION_COLUMNS = ["predicted_ignition_date", "predicted_days_to_fire", "risk_level", "message", "model_version"]
+
+
+def horizon_days(start: date, end: date) -> List[date]:
+    return [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+
+def expand_horizon(
+    features: pd.DataFrame,
+    days: List[date],
+    weather: pd.DataFrame,
+    age_reference: date
+) -> pd.DataFrame:
+    """
+    Строки «штабель × день» для всего окна прогноза.
+
+    Для каждого дня: дата отсчёта прогноза (current_date) — сам день, возраст штабеля
+    увеличен на число дней от age_reference, погода — первая запись за этот день
+    (колонки weather_first_of_day_stmt). Если погоды за день нет, остаётся последняя
+    известная погода штабеля. Температура — последний известный замер.
+    """
+    grid = features.merge(pd.DataFrame({"forecast_day": days}), how="cross")
+    offset = (pd.to_datetime(grid["forecast_day"]) - pd.Timestamp(age_reference)).dt.days
+    grid["ДниСНачалаФормирования"] = grid["ДниСНачалаФормирования"] + offset
+
+    if not weather.empty:
+        daily = weather.rename(columns=WEATHER_COLUMNS)
+        daily = daily.assign(
+            forecast_day=pd.to_datetime(daily["day"]).dt.date, v_max=fill_v_max(daily)
+        ).drop(columns="day")
+        grid = grid.merge(daily, on="forecast_day", how="left", suffixes=("", "_day"))
+        for col in WEATHER_FEATURES:
+            grid[col] = pd.to_numeric(grid.pop(f"{col}_day"), errors="coerce").fillna(grid[col])
+
+    grid["current_date"] = grid["forecast_day"].map(date.isoformat)
+    return grid
+
+
+def predict_grid(grid: pd.DataFrame) -> pd.DataFrame:
+    """Прогнозы строк grid (индекс тот же); строк штабелей, на которых прогноз упал, в результате нет."""
+    try:
+        return pd.DataFrame(predict_ignition_risk_batch(grid), index=grid.index)
+    except Exception:
+        logger.exception("Прогноз одним батчем не удался, считаем по штабелям")
+
+    parts = []
+    for (warehouse, pile_id), rows in grid.groupby(PILE_KEYS, sort=False):
+        try:
+            parts.append(pd.DataFrame(predict_ignition_risk_batch(rows), index=rows.index))
+        except Exception:
+            logger.exception("Ошибка прогноза для склада %s, штабель %s — штабель пропущен", warehouse, pile_id)
+    return pd.concat(parts) if parts else pd.DataFrame(index=grid.index[:0], columns=PREDICTION_COLUMNS)
+
+
+def forecast_horizon(
+    features: pd.DataFrame,
+    days: List[date],
+    weather: pd.DataFrame,
+    age_reference: date
+) -> pd.DataFrame:
+    """
+    Прогноз для всех строк «штабель × день» одним вызовом model.predict.
+    Если батч не прошёл, штабели считаются по отдельности и пропускаются только упавшие.
+    """
+    if features.empty:
+        return pd.DataFrame(columns=[*PILE_KEYS, "forecast_day"])
+
+    grid = expand_horizon(features, days, weather, age_reference)
+    predictions = predict_grid(grid)
+    grid = grid.loc[predictions.index]
+
+    grid["predicted_ignition_date"] = predictions["predicted_ignition_date"]
+    grid["predicted_date"] = pd.to_datetime(predictions["predicted_ignition_date"]).dt.date
+    grid["predicted_days_to_fire"] = predictions["predicted_days_to_fire"]
+    grid["risk_level"] = predictions["risk_level"]
+    grid["message"] = predictions["message"]
+    grid["model_version"] = predictions["model_version"]
+    return grid
+
+
+def summarize_horizon(grid: pd.DataFrame, days: List[date]) -> dict:
+    """
+    Инцидент штабеля — самая ранняя прогнозная дата возгорания внутри окна по всем
+    дням прогноза; summary_by_day считает инциденты по датам, risk_grid — уровень
+    риска каждого штабеля на каждый день окна.
+    """
+    start, end = days[0], days[-1]
+    incidents = []
+    risk_grid = {"dates": [d.isoformat() for d in days], "piles": []}
+
+    if not grid.empty:
+        in_window = grid[(grid["predicted_date"] >= start) & (grid["predicted_date"] <= end)]
+        if not in_window.empty:
+            first = in_window.loc[in_window.groupby(PILE_KEYS)["predicted_date"].idxmin()]
+            incidents = [
+                {
+                    "date": row.predicted_date.isoformat(),
+                    "warehouse": int(row.warehouse),
+                    "pile_id": row.pile_id,
+                    "predicted_ignition_date": row.predicted_ignition_date,
+                    "message": row.message
+                }
+                for row in first.sort_values(["predicted_date", *PILE_KEYS]).itertuples(index=False)
+            ]
+
+        ordered = grid.sort_values([*PILE_KEYS, "forecast_day"])
+        for (warehouse, pile_id), pile in ordered.groupby(PILE_KEYS, sort=False):
+            risk_grid["piles"].append({
+                "warehouse": int(warehouse),
+                "pile_id": pile_id,
+                "risk_levels": pile["risk_level"].tolist(),
+                "days_to_fire": pile["predicted_days_to_fire"].round(2).tolist()
+            })
+
+    counts = pd.Series([inc["date"] for inc in incidents], dtype=object).value_counts()
+    summary_by_day = [{"date": d, "count": int(counts.get(d, 0))} for d in risk_grid["dates"]]
+
+    return {
+        "summary_by_day": summary_by_day,
+        "high_risk_incidents": incidents,
+        "risk_grid": risk_grid
+    }
@@ -0,0 +1,456 @@
+# app/services/ingest.py
+import csv
+import os
+import time
+from io import StringIO
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import and_, exists, func, insert, literal_column, or_, select, text
+from sqlalchemy import column as sql_column, table as sql_table
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection
+
+from app.models.db_models import Temperature, FireEvent, Weather, Supply
+from app.services.partitions import ensure_partitions_for
+from app.services.profiling import profile_query
+from app.services.telemetry import TELEMETRY, record_ingest, record_query
+from app.services.weather_rollup import refresh_weather_daily
+
+# Размер пачки для multi-row INSERT, если COPY недоступен (не PostgreSQL)
+INSERT_CHUNK_SIZE = 500
+
+# Сколько строк CSV разбирается и пишется за раз при потоковой загрузке
+UPLOAD_CHUNK_ROWS = int(os.getenv("UPLOAD_CHUNK_ROWS", "50000"))
+
+FIRE_COLUMNS = [
+    "Дата составления", "Груз", "Вес по акту, тн", "Склад",
+    "Дата начала", "Дата оконч.", "Нач.форм.штабеля", "Штабель"
+]
+
+
+def detect_kind(filename: str):
+    """Тип файла по имени, как в /upload-csv: temperature, fires, weather, supplies."""
+    name = filename.lower()
+    if "temperature" in name:
+        return "temperature"
+    if "fire" in name:
+        return "fires"
+    if "weather" in name:
+        return "weather"
+    if "supply" in name or "supplies" in name:
+        return "supplies"
+    return None
+
+
+# --- Очистка: сырые строки CSV (dtype=str, header=None) → колонки таблицы ---
+# Строки не выбрасываются: нераспознанные значения становятся NaN, а отбраковка
+# делается масками validation_masks, чтобы посчитать причины по каждому правилу.
+
+def _as_str(values: pd.Series) -> pd.Series:
+    """Строковая колонка с сохранением пропусков (astype(str) превратил бы NaN в "nan")."""
+    return values.astype(str).where(values.notna())
+
+
+def clean_temperature(df: pd.DataFrame) -> pd.DataFrame:
+    if len(df.columns) < 7:
+        raise ValueError("Недостаточно колонок в temperature.csv")
+    df = df.iloc[:, :7].copy()
+    df.columns = ["Склад", "Штабель", "Марка", "Макс.темп", "Пикет", "Дата", "Смена"]
+
+    df["Дата"] = pd.to_datetime(df["Дата"], format="ISO8601", errors="coerce")
+    df["Макс.темп"] = pd.to_numeric(df["Макс.темп"], errors="coerce")
+    df["Склад"] = pd.to_numeric(df["Склад"], errors="coerce").astype("Int64")
+    df["Смена"] = pd.to_numeric(df["Смена"], errors="coerce")
+
+    return pd.DataFrame({
+        "warehouse": df["Склад"].astype("Int64"),
+        "pile_id": _as_str(df["Штабель"]),
+        "coal_grade": df["Марка"],
+        "max_temp": df["Макс.темп"].astype(float),
+        "measurement_date": df["Дата"],
+        "shift": df["Смена"].round().astype("Int64"),
+    })
+
+
+def clean_fires(df: pd.DataFrame) -> pd.DataFrame:
+    if df.shape[0] == 0:
+        raise ValueError("Пустой файл fires.csv")
+    df = df.copy()
+    header_row = df.iloc[0].astype(str).str.contains("Дата составления").any()
+    if header_row:
+        df = df[1:]
+    df = df.iloc[:, :8]
+    df.columns = FIRE_COLUMNS
+
+    df["Дата начала"] = pd.to_datetime(df["Дата начала"], format="ISO8601", errors="coerce")
+    df["Нач.форм.штабеля"] = pd.to_datetime(df["Нач.форм.штабеля"], format="ISO8601", errors="coerce")
+    df["Склад"] = pd.to_numeric(df["Склад"], errors="coerce").astype("Int64")
+
+    return pd.DataFrame({
+        "warehouse": df["Склад"],
+        "pile_id": _as_str(df["Штабель"]),
+        "coal_grade": df["Груз"],
+        "fire_start": df["Дата начала"],
+        "pile_formed_at": df["Нач.форм.штабеля"],
+    })
+
+
+def clean_weather(df: pd.DataFrame) -> pd.DataFrame:
+    if len(df.columns) < 11:
+        raise ValueError("Недостаточно колонок в weather CSV")
+    df = df.iloc[:, :11].copy()
+    df.columns = [
+        "datetime", "temp", "pressure", "humidity", "precipitation",
+        "wind_dir", "wind_speed", "v_max", "cloudcover", "visibility", "weather_code"
+    ]
+    df["datetime"] = pd.to_datetime(df["datetime"], format="ISO8601", errors="coerce")
+    for col in ["temp", "pressure", "humidity", "precipitation", "wind_dir",
+                "wind_speed", "v_max", "cloudcover", "visibility", "weather_code"]:
+        df[col] = pd.to_numeric(df[col], errors="coerce")
+
+    return pd.DataFrame({
+        "datetime": df["datetime"],
+        "temp": df["temp"],
+        "pressure": df["pressure"],
+        "humidity": df["humidity"].round().astype("Int64"),
+        "precipitation": df["precipitation"],
+        "wind_dir": df["wind_dir"].round().astype("Int64"),
+        "wind_speed": df["wind_speed"],
+        "v_max": df["v_max"],
+        "cloudcover": df["cloudcover"].round().astype("Int64"),
+        "visibility": df["visibility"].round().astype("Int64"),
+        "weather_code": df["weather_code"].round().astype("Int64"),
+    })
+
+
+def clean_supplies(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.iloc[:, :7].copy()
+    df.columns = ["ВыгрузкаНаСклад", "Наим. ЕТСНГ", "Штабель", "ПогрузкаНаСудно", "На склад, тн", "На судно, тн", "Склад"]
+
+    df["ВыгрузкаНаСклад"] = pd.to_datetime(df["ВыгрузкаНаСклад"], format="ISO8601", errors="coerce")
+    df["ПогрузкаНаСудно"] = pd.to_datetime(df["ПогрузкаНаСудно"], format="ISO8601", errors="coerce")
+    df["Штабель"] = pd.to_numeric(df["Штабель"], errors="coerce").astype("Int64")
+    df["Склад"] = pd.to_numeric(df["Склад"], errors="coerce").astype("Int64")
+    df["На склад, тн"] = pd.to_numeric(df["На склад, тн"], errors="coerce")
+    df["На судно, тн"] = pd.to_numeric(df["На судно, тн"], errors="coerce")
+
+    return pd.DataFrame({
+        "unload_to_warehouse": df["ВыгрузкаНаСклад"],
+        "coal_grade": df["Наим. ЕТСНГ"],
+        "pile_id": df["Штабель"],
+        "load_to_ship": df["ПогрузкаНаСудно"],
+        "to_warehouse_tn": df["На склад, тн"],
+        "to_ship_tn": df["На судно, тн"],
+        "warehouse": df["Склад"],
+    })
+
+
+DATASETS = {
+    "temperature": (Temperature, clean_temperature),
+    "fires": (FireEvent, clean_fires),
+    "weather": (Weather, clean_weather),
+    "supplies": (Supply, clean_supplies),
+}
+
+
+# --- Проверка: маски по колонкам вместо построчных проверок ---
+
+# Допустимые диапазоны сверх NOT NULL; пустое значение в nullable-колонке не ошибка
+RANGE_RULES = {
+    "weather": {
+        "humidity": (0, 100),
+        "cloudcover": (0, 100),
+        "wind_dir": (0, 360),
+        "precipitation": (0, None),
+    },
+    "supplies": {
+        "to_warehouse_tn": (0, None),
+        "to_ship_tn": (0, None),
+    },
+}
+
+
+def validation_masks(kind: str, cleaned: pd.DataFrame) -> dict:
+    """
+    Правило → булева маска строк, которые его нарушают. missing_<колонка> — пустое
+    или нераспознанное значение в NOT NULL колонке, out_of_range_<колонка> — вне RANGE_RULES.
+    """
+    model, _ = DATASETS[kind]
+    masks = {}
+    for column in model.__table__.columns:
+        if not column.nullable and column.name in cleaned.columns:
+            masks[f"missing_{column.name}"] = cleaned[column.name].isna().to_numpy()
+    for name, (low, high) in RANGE_RULES.get(kind, {}).items():
+        values = cleaned[name].astype(float)
+        bad = np.zeros(len(cleaned), dtype=bool)
+        if low is not None:
+            bad |= (values < low).to_numpy()
+        if high is not None:
+            bad |= (values > high).to_numpy()
+        masks[f"out_of_range_{name}"] = bad
+    return masks
+
+
+def write_rejects(raw: pd.DataFrame, masks: dict, rejected: np.ndarray, path: str):
+    """Дописывает отбракованные сырые строки в CSV с колонкой reject_reasons."""
+    reasons = np.full(len(raw), "", dtype=object)
+    for rule, mask in masks.items():
+        reasons[mask] = reasons[mask] + rule + ";"
+    rows = raw[rejected].assign(reject_reasons=pd.Series(reasons[rejected], index=raw.index[rejected]).str.rstrip(";"))
+    rows.to_csv(path, mode="a", header=not os.path.exists(path), index=False)
+
+
+def add_stats(totals: dict, stats: dict) -> dict:
+    """Суммирует статистику загрузки нескольких пачек/файлов."""
+    for field in ("inserted_rows", "updated_rows", "skipped_rows", "rejected_rows"):
+        totals[field] = totals.get(field, 0) + stats.get(field, 0)
+    rejects = totals.setdefault("rejects", {})
+    for rule, count in stats.get("rejects", {}).items():
+        rejects[rule] = rejects.get(rule, 0) + count
+    return totals
+
+
+# --- Запись ---
+
+# При конфликте по ключу замер не перезаписывается меньшим значением: в CSV несколько
+# пикетов на штабель за смену, а в таблице храним максимум по смене
+KEEP_MAX_COLUMNS = {"temperature": "max_temp"}
+
+
+def natural_key(table):
+    """Колонки уникального индекса таблицы (естественный ключ) или None."""
+    for index in table.indexes:
+        if index.unique:
+            return [c.name for c in index.columns]
+    return None
+
+
+def dedupe_batch(table, df: pd.DataFrame) -> pd.DataFrame:
+    """Одна строка на ключ внутри пачки — иначе ON CONFLICT DO UPDATE падает."""
+    key = natural_key(table)
+    if key is None or df.empty:
+        return df
+    keep_max = KEEP_MAX_COLUMNS.get(table.name)
+    if keep_max:
+        df = df.sort_values(keep_max, ascending=False, kind="stable")
+        return df.drop_duplicates(subset=key, keep="first")
+    return df.drop_duplicates(subset=key, keep="last")
+
+
+def _on_conflict(stmt, table, key, columns):
+    """DO UPDATE только если строка действительно изменилась, иначе запись пропускается."""
+    update_cols = [c for c in columns if c not in key]
+    if not update_cols:
+        return stmt.on_conflict_do_nothing(index_elements=key)
+    keep_max = KEEP_MAX_COLUMNS.get(table.name)
+    if keep_max:
+        where = stmt.excluded[keep_max] > table.c[keep_max]
+    else:
+        where = or_(*[table.c[c].is_distinct_from(stmt.excluded[c]) for c in update_cols])
+    return stmt.on_conflict_do_update(
+        index_elements=key,
+        set_={c: stmt.excluded[c] for c in update_cols},
+        where=where
+    )
+
+
+def _copy_into(conn: Connection, table_name: str, df: pd.DataFrame):
+    """COPY FROM STDIN через psycopg2 — в той же транзакции, что и conn."""
+    buffer = StringIO()
+    df.to_csv(buffer, index=False, header=False, na_rep="", date_format="%Y-%m-%d %H:%M:%S",
+              quoting=csv.QUOTE_MINIMAL)
+    buffer.seek(0)
+    columns = ", ".join(f'"{c}"' for c in df.columns)
+    statement = f'COPY "{table_name}" ({columns}) FROM STDIN WITH (FORMAT csv, NULL \'\')'
+    cursor = conn.connection.dbapi_connection.cursor()
+    started = time.perf_counter()
+    try:
+        cursor.copy_expert(statement, buffer)
+    finally:
+        cursor.close()
+        elapsed = time.perf_counter() - started
+        if TELEMETRY:
+            record_query(elapsed)
+        profile_query(statement, elapsed, len(df))
+
+
+def _upsert_postgres(conn: Connection, table, key, df: pd.DataFrame):
+    """COPY во временную таблицу, затем INSERT ... SELECT ... ON CONFLICT одним запросом."""
+    columns = list(df.columns)
+    column_list = ", ".join(f'"{c}"' for c in columns)
+    stage_name = f"stage_{table.name}"
+    conn.execute(text(
+        f'CREATE TEMP TABLE IF NOT EXISTS "{stage_name}" ON COMMIT DROP AS '
+        f'SELECT {column_list} FROM "{table.name}" WITH NO DATA'
+    ))
+    conn.execute(text(f'TRUNCATE "{stage_name}"'))
+    _copy_into(conn, stage_name, df)
+
+    stage = sql_table(stage_name, *[sql_column(c) for c in columns])
+    # новые ключи считаются до записи: RETURNING xmax у секционированных таблиц недоступен
+    known = exists().where(and_(*[table.c[c] == stage.c[c] for c in key]))
+    inserted = conn.execute(select(func.count()).select_from(stage).where(~known)).scalar()
+
+    stmt = pg_insert(table).from_select(columns, select(*stage.c))
+    stmt = _on_conflict(stmt, table, key, columns).returning(literal_column("1"))
+    written = len(conn.execute(stmt).all())
+    return inserted, written - inserted
+
+
+def _records(df: pd.DataFrame):
+    """Строки DataFrame как dict с питоновскими типами (NaN/NA → None)."""
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+
+def _upsert_chunks(conn: Connection, table, key, df: pd.DataFrame, chunk_size: int = INSERT_CHUNK_SIZE):
+    """
+    Пачки multi-row INSERT для SQLite: сначала ON CONFLICT DO NOTHING (rowcount — новые строки),
+    затем, если в пачке были уже известные ключи, ON CONFLICT DO UPDATE (rowcount — изменённые;
+    только что вставленные строки совпадают сами с собой и не обновляются).
+    """
+    columns = list(df.columns)
+    inserted = updated = 0
+    for start in range(0, len(df), chunk_size):
+        chunk = _records(df.iloc[start:start + chunk_size])
+        added = conn.execute(sqlite_insert(table).values(chunk).on_conflict_do_nothing(index_elements=key)).rowcount
+        inserted += added
+        if added < len(chunk):
+            updated += conn.execute(_on_conflict(sqlite_insert(table).values(chunk), table, key, columns)).rowcount
+    return inserted, updated
+
+
+def _insert_chunks(conn: Connection, table, df: pd.DataFrame, chunk_size: int = INSERT_CHUNK_SIZE):
+    for start in range(0, len(df), chunk_size):
+        chunk = _records(df.iloc[start:start + chunk_size])
+        conn.execute(insert(table).values(chunk))
+
+
+def bulk_upsert(conn: Connection, model, df: pd.DataFrame) -> dict:
+    """
+    Идемпотентная запись очищенного DataFrame: по естественному ключу (уникальный индекс)
+    новые строки вставляются, изменённые обновляются, совпадающие пропускаются.
+    PostgreSQL — COPY + ON CONFLICT, SQLite — пачки INSERT ... ON CONFLICT.
+    Таблицы без ключа (supply) просто дописываются; таблицу с ключом на другой СУБД
+    записать идемпотентно нечем — NotImplementedError, а не молчаливые дубли.
+    """
+    table = model.__table__
+    key = natural_key(table)
+    started = time.perf_counter()
+    batch = dedupe_batch(table, df)
+    dialect = conn.dialect.name
+
+    if batch.empty:
+        inserted, updated = 0, 0
+    elif key is None and dialect == "postgresql":
+        _copy_into(conn, table.name, batch)
+        inserted, updated = len(batch), 0
+    elif key is None:
+        _insert_chunks(conn, table, batch)
+        inserted, updated = len(batch), 0
+    elif dialect == "postgresql":
+        inserted, updated = _upsert_postgres(conn, table, key, batch)
+    elif dialect == "sqlite":
+        inserted, updated = _upsert_chunks(conn, table, key, batch)
+    else:
+        raise NotImplementedError(f"Запись в {table.name} по ключу {key} для {dialect} не поддерживается")
+
+    seconds = time.perf_counter() - started
+    return {
+        "inserted_rows": inserted,
+        "updated_rows": updated,
+        "skipped_rows": len(df) - inserted - updated,
+        "seconds": round(seconds, 3),
+        "rows_per_sec": round(len(df) / seconds, 1) if seconds > 0 else None,
+    }
+
+
+def count_header_rows(raw: pd.DataFrame) -> int:
+    """1, если первая строка — заголовок CSV (в первой ячейке нет ни одной цифры)."""
+    if raw.empty:
+        return 0
+    return int(not any(ch.isdigit() for ch in str(raw.iat[0, 0])))
+
+
+def validate_frame(kind: str, raw: pd.DataFrame, skip_header: bool = True,
+                   rejects_path: Optional[str] = None):
+    """
+    Очистка и проверка без обращения к БД (можно вызывать в отдельном процессе).
+    Возвращает (строки, прошедшие проверку; {"rejected_rows", "rejects"}).
+    rejects_path — куда дописать отбракованные строки с причинами.
+    """
+    _, clean = DATASETS[kind]
+    if skip_header:
+        raw = raw.iloc[count_header_rows(raw):]
+    cleaned = clean(raw)
+
+    # строки с пустыми значениями в NOT NULL колонках сорвали бы весь COPY — отбраковываем их
+    masks = validation_masks(kind, cleaned)
+    rejected = np.logical_or.reduce(list(masks.values())) if masks else np.zeros(len(cleaned), dtype=bool)
+    report = {
+        "rejected_rows": int(rejected.sum()),
+        "rejects": {rule: int(mask.sum()) for rule, mask in masks.items() if mask.any()},
+    }
+    if rejects_path and report["rejected_rows"]:
+        write_rejects(raw, masks, rejected, rejects_path)
+    return cleaned[~rejected], report
+
+
+def write_frame(conn: Connection, kind: str, valid: pd.DataFrame, report: Optional[dict] = None) -> dict:
+    """Одна bulk-запись проверенных строк; у погоды — пересчёт суточных агрегатов за эти дни."""
+    model, _ = DATASETS[kind]
+    # секции weather/temperature на PostgreSQL создаются до записи — строки не оседают в default
+    ensure_partitions_for(conn, model.__table__, valid)
+    stats = bulk_upsert(conn, model, valid)
+    report = report or {"rejected_rows": 0, "rejects": {}}
+    stats["rejected_rows"] = report["rejected_rows"]
+    stats["rejects"] = report["rejects"]
+    stats["skipped_rows"] += stats["rejected_rows"]
+    record_ingest(kind, stats["inserted_rows"] + stats["updated_rows"], stats["rejected_rows"], stats["seconds"])
+
+    if kind == "weather" and len(valid):
+        # суточные агрегаты пересчитываются только за затронутые дни
+        days = valid["datetime"].dt.date
+        refresh_weather_daily(conn, days.min(), days.max())
+    return stats
+
+
+def ingest_frame(conn: Connection, kind: str, raw: pd.DataFrame, skip_header: bool = True,
+                 rejects_path: Optional[str] = None) -> dict:
+    """
+    Очистка сырых строк CSV, отбраковка по validation_masks и одна bulk-запись.
+    skip_header — первая строка может быть заголовком (в пачках после первой — нет).
+    """
+    valid, report = validate_frame(kind, raw, skip_header, rejects_path)
+    return write_frame(conn, kind, valid, report)
+
+
+def ingest_chunks(conn: Connection, kind: str, chunks, rejects_path: Optional[str] = None) -> dict:
+    """
+    Потоковая загрузка: каждая пачка сырых строк очищается и пишется сразу,
+    так что в памяти одновременно держится только одна пачка.
+    """
+    totals = {"inserted_rows": 0, "updated_rows": 0, "skipped_rows": 0, "rejected_rows": 0,
+              "rejects": {}, "seconds": 0.0, "chunks": 0}
+    started = time.perf_counter()
+    for i, raw in enumerate(chunks):
+        # заголовок может быть только в первой пачке
+        add_stats(totals, ingest_frame(conn, kind, raw, skip_header=(i == 0), rejects_path=rejects_path))
+        totals["chunks"] += 1
+    seconds = time.perf_counter() - started
+    totals["seconds"] = round(seconds, 3)
+    written = totals["inserted_rows"] + totals["updated_rows"] + totals["skipped_rows"]
+    totals["rows_per_sec"] = round(written / seconds, 1) if seconds > 0 else None
+    return totals
+
+
+def read_raw_csv(source, **kwargs) -> pd.DataFrame:
+    """Сырые строки без заголовка — строка заголовка отсеется при очистке."""
+    return pd.read_csv(source, on_bad_lines="skip", dtype=str, header=None, **kwargs)
+
+
+def iter_raw_csv(source, chunksize: int = UPLOAD_CHUNK_ROWS):
+    """То же, что read_raw_csv, но пачками по chunksize строк."""
+    return read_raw_csv(source, chunksize=chunksize)
@@ -0,0 +1,213 @@
+# app/services/metrics.py
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+from typing import List, Optional
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.models.db_models import ActualFire, MetricsCounter, PredictionLog
+
+# Прогноз считается верным, если возгорание случилось в пределах ±HIT_WINDOW_DAYS
+HIT_WINDOW_DAYS = 2
+
+# Корзины заблаговременности (дни от выдачи прогноза до возгорания) → колонка счётчика
+LEAD_BUCKETS = [
+    (1, "lead_0_1"),
+    (3, "lead_2_3"),
+    (7, "lead_4_7"),
+    (14, "lead_8_14"),
+    (None, "lead_15_plus"),
+]
+
+COUNTER_FIELDS = [
+    "predictions",
+    "predictions_hit",
+    "fires",
+    "fires_hit",
+    "lead_days_sum",
+    *[column for _, column in LEAD_BUCKETS],
+]
+
+log_table = PredictionLog.__table__
+counter_table = MetricsCounter.__table__
+fire_table = ActualFire.__table__
+
+
+def scopes_for(warehouse: int, coal_grade: Optional[str]) -> List[str]:
+    scopes = ["all", f"warehouse:{warehouse}"]
+    if coal_grade:
+        scopes.append(f"grade:{coal_grade}")
+    return scopes
+
+
+def lead_bucket(lead_days: int) -> str:
+    for upper, column in LEAD_BUCKETS:
+        if upper is None or lead_days <= upper:
+            return column
+
+
+def _upsert(session: Session, table):
+    """INSERT с ON CONFLICT для диалекта сессии."""
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        return pg_insert(table)
+    if dialect == "sqlite":
+        return sqlite_insert(table)
+    raise NotImplementedError(f"ON CONFLICT для {dialect} не поддерживается")
+
+
+def bump_counters(session: Session, increments: dict):
+    """
+    increments: {scope: Counter(поле → прибавка)}. Один INSERT ... ON CONFLICT (scope)
+    DO UPDATE SET field = field + excluded.field на все scope — без чтения и пересчёта
+    истории и без гонки «проверили, что строки нет, — вставили» между процессами.
+    """
+    increments = {scope: inc for scope, inc in increments.items() if inc}
+    if not increments:
+        return
+    fields = sorted({field for inc in increments.values() for field in inc})
+    stmt = _upsert(session, counter_table).values([
+        {"scope": scope, **{field: inc.get(field, 0) for field in COUNTER_FIELDS}}
+        for scope, inc in increments.items()
+    ])
+    session.execute(stmt.on_conflict_do_update(
+        index_elements=[counter_table.c.scope],
+        set_={field: counter_table.c[field] + stmt.excluded[field] for field in fields}
+    ))
+
+
+def prediction_record(warehouse, pile_id, coal_grade, issue_date: date, prediction: dict) -> dict:
+    """Строка PredictionLog из результата predict_ignition_risk*/forecast_horizon."""
+    return {
+        "warehouse": int(warehouse),
+        "pile_id": str(pile_id),
+        "coal_grade": None if coal_grade is None else str(coal_grade),
+        "issue_date": issue_date,
+        "predicted_date": date.fromisoformat(str(prediction["predicted_ignition_date"])[:10]),
+        "model_version": prediction.get("model_version"),
+    }
+
+
+def log_predictions(session: Session, records: List[dict], once_per_date: bool = False) -> int:
+    """
+    Сохраняет выданные прогнозы (warehouse, pile_id, coal_grade, issue_date,
+    predicted_date, model_version) и увеличивает счётчик predictions.
+    Повтор того же прогноза (штабель, дата выдачи, прогнозная дата) не пишется;
+    с once_per_date не пишется и прогноз штабеля на уже записанную прогнозную дату
+    с другой датой выдачи (снимки дашборда пересчитываются после каждой загрузки).
+    Коммит — за вызывающим.
+    """
+    if not records:
+        return 0
+
+    def key(r) -> tuple:
+        pile_date = (r["warehouse"], r["pile_id"], r["predicted_date"])
+        return pile_date if once_per_date else (*pile_date, r["issue_date"])
+
+    seen = set()
+    unique = []
+    for record in records:
+        if key(record) not in seen:
+            seen.add(key(record))
+            unique.append(record)
+
+    by = "predicted_date" if once_per_date else "issue_date"
+    existing = {key(row) for row in session.execute(
+        select(log_table.c.warehouse, log_table.c.pile_id, log_table.c.predicted_date, log_table.c.issue_date)
+        .where(log_table.c[by].in_(list({r[by] for r in unique})))
+    ).mappings()}
+    fresh = [r for r in unique if key(r) not in existing]
+    if not fresh:
+        return 0
+
+    session.execute(insert(log_table), fresh)
+
+    increments = defaultdict(Counter)
+    for record in fresh:
+        for scope in scopes_for(record["warehouse"], record.get("coal_grade")):
+            increments[scope]["predictions"] += 1
+    bump_counters(session, increments)
+    return len(fresh)
+
+
+def record_actual_fire(session: Session, warehouse: int, pile_id: str, fire_date: date) -> dict:
+    """
+    Записывает возгорание, сверяет его с прогнозами этого штабеля в окне ±HIT_WINDOW_DAYS
+    (поиск по индексу uq_predictionlog_pile_prediction) и обновляет счётчики.
+    Учитываются только прогнозы, выданные не позже дня возгорания. Повтор того же
+    возгорания (склад, штабель, дата) не записывается и счётчики не меняет.
+    """
+    added = session.execute(
+        _upsert(session, fire_table).values(warehouse=warehouse, pile_id=pile_id, fire_date=fire_date)
+        .on_conflict_do_nothing(index_elements=["warehouse", "pile_id", "fire_date"])
+    ).rowcount
+    if not added:
+        return {"duplicate": True, "hit": None, "matched_predictions": 0, "lead_days": None}
+
+    window = log_table.select().where(
+        log_table.c.warehouse == warehouse,
+        log_table.c.pile_id == pile_id,
+        log_table.c.predicted_date >= fire_date - timedelta(days=HIT_WINDOW_DAYS),
+        log_table.c.predicted_date <= fire_date + timedelta(days=HIT_WINDOW_DAYS),
+        log_table.c.issue_date <= fire_date
+    )
+    candidates = session.execute(window).mappings().all()
+
+    # марка штабеля — из его последнего прогноза (у ActualFire марки нет)
+    coal_grade = session.execute(
+        select(log_table.c.coal_grade).where(
+            log_table.c.warehouse == warehouse, log_table.c.pile_id == pile_id
+        ).order_by(log_table.c.issue_date.desc()).limit(1)
+    ).scalar()
+
+    increments = defaultdict(Counter)
+    for scope in scopes_for(warehouse, coal_grade):
+        increments[scope]["fires"] += 1
+
+    newly_matched = [c for c in candidates if not c["matched"]]
+    for c in newly_matched:
+        for scope in scopes_for(warehouse, c["coal_grade"]):
+            increments[scope]["predictions_hit"] += 1
+    if newly_matched:
+        session.execute(
+            update(log_table).where(log_table.c.id.in_([c["id"] for c in newly_matched])).values(matched=True)
+        )
+
+    lead_days = None
+    if candidates:
+        lead_days = (fire_date - min(c["issue_date"] for c in candidates)).days
+        for scope in scopes_for(warehouse, coal_grade):
+            increments[scope]["fires_hit"] += 1
+            increments[scope]["lead_days_sum"] += lead_days
+            increments[scope][lead_bucket(lead_days)] += 1
+
+    bump_counters(session, increments)
+    return {"duplicate": False, "hit": bool(candidates), "matched_predictions": len(newly_matched),
+            "lead_days": lead_days}
+
+
+def _ratio(numerator: int, denominator: int) -> float:
+    return round(numerator / denominator, 3) if denominator else 0.0
+
+
+def summarize_counter(row) -> dict:
+    return {
+        "total_predictions": row.predictions,
+        "correct_predictions": row.predictions_hit,
+        "total_fires": row.fires,
+        "predicted_fires": row.fires_hit,
+        "accuracy_2days": _ratio(row.fires_hit, row.fires),
+        "precision": _ratio(row.predictions_hit, row.predictions),
+        "recall": _ratio(row.fires_hit, row.fires),
+        "lead_time": {
+            "mean_days": round(row.lead_days_sum / row.fires_hit, 1) if row.fires_hit else None,
+            "histogram": {column[len("lead_"):]: getattr(row, column) for _, column in LEAD_BUCKETS},
+        },
+    }
+
+
+def metrics_stmt():
+    return select(counter_table)
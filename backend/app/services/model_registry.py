@@ -0,0 +1,133 @@
+# app/services/model_registry.py
+import hashlib
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+import joblib
+
+logger = logging.getLogger(__name__)
+
+MODEL_PATH = os.getenv("MODEL_PATH", "app/models/model.pkl")
+ENCODER_DIR = os.getenv("ENCODER_DIR", "app/models")
+
+# Проверять mtime файлов модели и перезагружать при изменении (MODEL_WATCH=1)
+MODEL_WATCH = os.getenv("MODEL_WATCH", "0") == "1"
+MODEL_WATCH_INTERVAL = float(os.getenv("MODEL_WATCH_INTERVAL", "5"))
+
+# Какой энкодер отвечает за какой строковый признак
+ENCODER_FILES = {
+    "Штабель": "label_encoder_stack.pkl",
+    "Марка": "label_encoder_marka.pkl",
+    "Наим_ЕТСНГ": "label_encoder_naim.pkl",
+}
+
+
+class ModelBundle:
+    """Модель и энкодеры одной версии. После создания не меняется."""
+
+    def __init__(self, model, encoders: dict, version: str, paths: list, mtimes: dict):
+        self.model = model
+        self.encoders = encoders
+        # словари «значение → код», чтобы не вызывать LabelEncoder.transform на каждую строку
+        self.codes = {
+            name: {str(c): i for i, c in enumerate(encoder.classes_)}
+            for name, encoder in encoders.items()
+        }
+        self.version = version
+        self.paths = paths
+        self.mtimes = mtimes
+        self.loaded_at = datetime.utcnow()
+
+
+def _file_hash(paths) -> str:
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()[:12]
+
+
+class ModelRegistry:
+    """
+    Ленивая загрузка модели с горячей перезагрузкой.
+
+    Новая версия полностью загружается рядом со старой и подменяется одной записью
+    ссылки — запросы, уже получившие bundle, дорабатывают на старой версии.
+    """
+
+    def __init__(self, model_path: str = MODEL_PATH, encoder_dir: str = ENCODER_DIR):
+        self.model_path = model_path
+        self.encoder_paths = {name: os.path.join(encoder_dir, f) for name, f in ENCODER_FILES.items()}
+        self._bundle = None
+        self._lock = threading.Lock()
+        self._last_check = 0.0
+
+    @property
+    def paths(self):
+        return [self.model_path, *self.encoder_paths.values()]
+
+    def _load(self) -> ModelBundle:
+        paths = self.paths
+        mtimes = {p: os.path.getmtime(p) for p in paths}
+        model = joblib.load(self.model_path)
+        encoders = {name: joblib.load(path) for name, path in self.encoder_paths.items()}
+        return ModelBundle(model, encoders, _file_hash(paths), paths, mtimes)
+
+    def get(self) -> ModelBundle:
+        bundle = self._bundle
+        if bundle is None:
+            with self._lock:
+                if self._bundle is None:
+                    self._bundle = self._load()
+                bundle = self._bundle
+        elif MODEL_WATCH:
+            bundle = self._reload_if_changed(bundle)
+        return bundle
+
+    def reload(self) -> ModelBundle:
+        with self._lock:
+            return self._swap()
+
+    def _swap(self) -> ModelBundle:
+        """Загрузка и подмена версии; вызывается под self._lock."""
+        bundle = self._load()
+        self._bundle = bundle
+        logger.info("Модель загружена, версия %s", bundle.version)
+        return bundle
+
+    def _reload_if_changed(self, bundle: ModelBundle) -> ModelBundle:
+        if time.monotonic() - self._last_check < MODEL_WATCH_INTERVAL:
+            return bundle
+        with self._lock:
+            now = time.monotonic()
+            # пока ждали блокировку, файлы мог уже проверить другой поток
+            if now - self._last_check < MODEL_WATCH_INTERVAL:
+                return self._bundle
+            self._last_check = now
+            current = self._bundle
+            try:
+                if any(os.path.getmtime(p) != m for p, m in current.mtimes.items()):
+                    return self._swap()
+            except Exception:
+                # файл могут как раз перезаписывать — остаёмся на текущей версии
+                logger.exception("Не удалось перезагрузить модель")
+            return current
+
+    def status(self) -> dict:
+        bundle = self._bundle
+        if bundle is None:
+            return {"loaded": False, "paths": self.paths}
+        return {
+            "loaded": True,
+            "version": bundle.version,
+            "loaded_at": bundle.loaded_at.isoformat(),
+            "paths": bundle.paths,
+            "watch": MODEL_WATCH,
+        }
+
+
+registry = ModelRegistry()
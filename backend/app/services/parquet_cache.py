@@ -0,0 +1,264 @@
+# app/services/parquet_cache.py
+import fcntl
+import fnmatch
+import glob
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import List, Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.getenv("DATA_DIR", "app/data")
+PARQUET_CACHE_DIR = os.getenv("PARQUET_CACHE_DIR", os.path.join(DATA_DIR, ".parquet"))
+# PARQUET_CACHE=0 — загрузчики читают CSV напрямую
+PARQUET_CACHE = os.getenv("PARQUET_CACHE", "1") == "1"
+
+MANIFEST_FILE = "manifest.json"
+MANIFEST_LOCK_FILE = ".manifest.lock"
+
+# Типы колонок исходных CSV: даты и числа разбираются один раз при конвертации,
+# остальные колонки остаются строками (номера штабелей, марки, пикеты)
+SCHEMAS = {
+    "temperature": {
+        "pattern": "temperature.csv",
+        "dates": ["Дата акта"],
+        "numeric": ["Склад", "Максимальная температура", "Смена"],
+    },
+    "fires": {
+        "pattern": "fires.csv",
+        "dates": ["Дата составления", "Дата начала", "Дата оконч.", "Нач.форм.штабеля"],
+        "numeric": ["Вес по акту, тн", "Склад"],
+    },
+    "supplies": {
+        "pattern": "supplies.csv",
+        "dates": ["ВыгрузкаНаСклад", "ПогрузкаНаСудно"],
+        "numeric": ["На склад, тн", "На судно, тн", "Склад"],
+    },
+    "labeled": {
+        "pattern": "labeled_dataset.csv",
+        "dates": ["Дата измерения"],
+        "numeric": ["Склад", "Максимальная температура", "Возраст штабеля (дни)"],
+        "bools": ["ignition_in_2d"],
+    },
+    "weather": {
+        "pattern": "weather_data_*.csv",
+        "dates": ["date"],
+        "numeric": ["t", "p", "humidity", "precipitation", "wind_dir", "v_avg", "v_max",
+                    "cloudcover", "visibility", "weather_code"],
+        # weather/year=YYYY/<исходный файл>.parquet — фильтр по году отсекает целые каталоги
+        "partition_by_year": "date",
+    },
+}
+
+
+def _file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@contextmanager
+def manifest_lock(cache_dir: str = PARQUET_CACHE_DIR):
+    """
+    Чтение, конвертация и запись манифеста по одному — и для потоков load_datasets,
+    и для процессов (пул погоды, load_db.py рядом с приложением).
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(os.path.join(cache_dir, MANIFEST_LOCK_FILE), "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def load_manifest(cache_dir: str = PARQUET_CACHE_DIR) -> dict:
+    path = os.path.join(cache_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except json.JSONDecodeError:
+        # испорчен (например, прерванной записью старой версии) — кэш пересоберётся
+        logger.warning("Манифест %s повреждён, кэш Parquet будет пересобран", path)
+        return {}
+
+
+def save_manifest(manifest: dict, cache_dir: str = PARQUET_CACHE_DIR):
+    """Запись через уникальный временный файл и os.replace — читатель видит старый или новый манифест целиком."""
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=cache_dir, prefix=MANIFEST_FILE + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, os.path.join(cache_dir, MANIFEST_FILE))
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+def typed_frame(path: str, schema: dict) -> pd.DataFrame:
+    """CSV → DataFrame с типизированными колонками (то же, что делают загрузчики при каждом чтении)."""
+    df = pd.read_csv(path, dtype=str, on_bad_lines="skip")
+    df.columns = df.columns.str.strip()
+    for col in schema.get("dates", []):
+        df[col] = pd.to_datetime(df[col], format="ISO8601", errors="coerce")
+    for col in schema.get("numeric", []):
+        df[col] = pd.to_numeric(df[col], errors="coerce")
+    for col in schema.get("bools", []):
+        df[col] = df[col].str.strip().str.lower().map({"true": True, "false": False}).astype("boolean")
+    return df
+
+
+def _is_fresh(entry: Optional[dict], path: str) -> bool:
+    if not entry:
+        return False
+    stat = os.stat(path)
+    if entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+        return True
+    # mtime сменился (копирование, touch) — пересобираем, только если изменилось содержимое
+    if entry["size"] == stat.st_size and entry["sha256"] == _file_hash(path):
+        entry["mtime"] = stat.st_mtime
+        return True
+    return False
+
+
+def _convert(kind: str, path: str, cache_dir: str) -> dict:
+    schema = SCHEMAS[kind]
+    source = os.path.basename(path)
+    stem = os.path.splitext(source)[0]
+    df = typed_frame(path, schema)
+
+    outputs = []
+    date_col = schema.get("partition_by_year")
+    if date_col:
+        years = df[date_col].dt.year
+        for year, part in df.groupby(years.fillna(0).astype(int)):
+            out = os.path.join(cache_dir, kind, f"year={year}", f"{stem}.parquet")
+            os.makedirs(os.path.dirname(out), exist_ok=True)
+            part.to_parquet(out, index=False)
+            outputs.append(out)
+    else:
+        out = os.path.join(cache_dir, f"{stem}.parquet")
+        os.makedirs(cache_dir, exist_ok=True)
+        df.to_parquet(out, index=False)
+        outputs.append(out)
+
+    stat = os.stat(path)
+    return {
+        "kind": kind,
+        "sha256": _file_hash(path),
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "rows": len(df),
+        "outputs": [os.path.relpath(o, cache_dir) for o in outputs],
+    }
+
+
+def _remove_outputs(entry: Optional[dict], cache_dir: str):
+    for rel in (entry or {}).get("outputs", []):
+        path = os.path.join(cache_dir, rel)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def sources(kind: str, data_dir: str = DATA_DIR) -> List[str]:
+    return sorted(glob.glob(os.path.join(data_dir, SCHEMAS[kind]["pattern"])))
+
+
+def ensure_cached(kinds=None, data_dir: str = DATA_DIR, cache_dir: str = PARQUET_CACHE_DIR,
+                  force: bool = False) -> dict:
+    """
+    Конвертирует в Parquet исходные CSV, которых нет в манифесте или у которых
+    изменилось содержимое (sha256). Возвращает {"converted": [...], "fresh": [...]}.
+    Весь проход — под manifest_lock: параллельный вызов дождётся и увидит готовый кэш.
+    """
+    result = {"converted": [], "fresh": []}
+    with manifest_lock(cache_dir):
+        manifest = load_manifest(cache_dir)
+        changed = False
+        for kind in kinds or SCHEMAS:
+            for path in sources(kind, data_dir):
+                source = os.path.basename(path)
+                entry = manifest.get(source)
+                mtime = entry and entry["mtime"]
+                if not force and _is_fresh(entry, path):
+                    result["fresh"].append(source)
+                    changed = changed or entry["mtime"] != mtime
+                    continue
+                _remove_outputs(entry, cache_dir)
+                manifest[source] = _convert(kind, path, cache_dir)
+                result["converted"].append(source)
+                changed = True
+        if changed:
+            save_manifest(manifest, cache_dir)
+    return result
+
+
+def read_source(path: str, columns: Optional[List[str]] = None,
+                cache_dir: str = PARQUET_CACHE_DIR) -> pd.DataFrame:
+    """
+    Типизированное содержимое одного исходного CSV из кэша (пересобирается при изменении).
+    Если записи в манифесте или её файлов нет (кэш очистили между проверкой и чтением),
+    читается сам CSV — результат тот же, только медленнее.
+    """
+    source = os.path.basename(path)
+    kind = next(k for k, s in SCHEMAS.items() if fnmatch.fnmatch(source, s["pattern"]))
+    ensure_cached([kind], os.path.dirname(path), cache_dir)
+    entry = load_manifest(cache_dir).get(source)
+    if entry is not None:
+        try:
+            parts = [pd.read_parquet(os.path.join(cache_dir, rel), columns=columns) for rel in entry["outputs"]]
+            return pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0]
+        except FileNotFoundError:
+            pass
+    logger.warning("%s нет в кэше Parquet, читаем CSV", source)
+    df = typed_frame(path, SCHEMAS[kind])
+    return df[columns] if columns is not None else df
+
+
+def read_dataset(kind: str, columns: Optional[List[str]] = None, filters=None,
+                 data_dir: str = DATA_DIR, cache_dir: str = PARQUET_CACHE_DIR) -> pd.DataFrame:
+    """
+    Весь набор из кэша с проекцией колонок и фильтрами pyarrow (predicate pushdown):
+    read_dataset("weather", columns=["date", "t"], filters=[("year", ">=", 2019)]).
+    У погоды колонка year — ключ партиции.
+    """
+    ensure_cached([kind], data_dir, cache_dir)
+    if SCHEMAS[kind].get("partition_by_year"):
+        path = os.path.join(cache_dir, kind)
+        return pd.read_parquet(path, columns=columns, filters=filters, partitioning="hive")
+    parts = [pd.read_parquet(os.path.join(cache_dir, os.path.splitext(os.path.basename(p))[0] + ".parquet"),
+                             columns=columns, filters=filters)
+             for p in sources(kind, data_dir)]
+    return pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0]
+
+
+def read_for_ingest(path: str) -> pd.DataFrame:
+    """Для загрузчиков в БД: кадр из кэша, а при PARQUET_CACHE=0 — сырой CSV, как раньше."""
+    if not PARQUET_CACHE:
+        from app.services.ingest import read_raw_csv
+        return read_raw_csv(path)
+    return read_source(path)
+
+
+def clear_cache(cache_dir: str = PARQUET_CACHE_DIR):
+    shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+def build_cache(force: bool = False) -> dict:
+    started = time.perf_counter()
+    result = ensure_cached(force=force)
+    result["seconds"] = round(time.perf_counter() - started, 2)
+    return result
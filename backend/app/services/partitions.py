@@ -0,0 +1,251 @@
+# app/services/partitions.py
+import logging
+import os
+from datetime import date, datetime
+from typing import List, Optional
+
+from sqlalchemy import MetaData, PrimaryKeyConstraint, Table, text
+from sqlalchemy.engine import Connection, Engine
+
+from app.models.db_models import Temperature, Weather
+
+logger = logging.getLogger(__name__)
+
+# Секционирование почасовой погоды и замеров температуры по времени (только PostgreSQL).
+# DB_PARTITIONING=0 — init_db.py создаёт обычные таблицы, как раньше
+DB_PARTITIONING = os.getenv("DB_PARTITIONING", "1") == "1"
+# Шаг секций: year или month
+PARTITION_INTERVAL = os.getenv("PARTITION_INTERVAL", "year")
+
+# таблица → колонка, по диапазону которой режутся секции
+PARTITION_KEYS = {
+    Weather.__table__.name: "datetime",
+    Temperature.__table__.name: "measurement_date",
+}
+
+
+def partitioned_table(table: Table, metadata: MetaData) -> Table:
+    """
+    Копия таблицы модели для PARTITION BY RANGE: первичный ключ и уникальные индексы
+    секционированной таблицы обязаны включать ключ секционирования, поэтому PK — (id, ключ).
+    Сама модель не меняется — на SQLite остаётся обычный автоинкрементный id.
+    """
+    key = PARTITION_KEYS[table.name]
+    copy = table.to_metadata(metadata)
+    copy.c[key].primary_key = True
+    copy.append_constraint(PrimaryKeyConstraint(copy.c.id, copy.c[key]))
+    copy.c.id.autoincrement = True
+    copy.dialect_options["postgresql"]["partition_by"] = f"RANGE ({key})"
+    return copy
+
+
+def period_start(value) -> date:
+    value = value.date() if isinstance(value, datetime) else value
+    return value.replace(month=1, day=1) if PARTITION_INTERVAL == "year" else value.replace(day=1)
+
+
+def next_period(start: date) -> date:
+    if PARTITION_INTERVAL == "year":
+        return start.replace(year=start.year + 1)
+    return start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+
+
+def partition_name(table_name: str, start: date) -> str:
+    if PARTITION_INTERVAL == "year":
+        return f"{table_name}_y{start.year}"
+    return f"{table_name}_m{start.year}_{start.month:02d}"
+
+
+def default_partition_name(table_name: str) -> str:
+    return f"{table_name}_default"
+
+
+def is_partitioned(conn: Connection, table_name: str) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    relkind = conn.execute(
+        text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:name)"), {"name": table_name}
+    ).scalar()
+    return relkind == "p"
+
+
+def list_partitions(conn: Connection, table_name: str) -> List[dict]:
+    """Секции таблицы с границами и числом строк (по статистике планировщика)."""
+    rows = conn.execute(text(
+        "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), c.reltuples::bigint "
+        "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:name) ORDER BY c.relname"
+    ), {"name": table_name}).all()
+    return [{"name": name, "bounds": bounds, "rows": max(int(rows), 0)} for name, bounds, rows in rows]
+
+
+def _copy_columns(table: Table, existing: Optional[set] = None) -> str:
+    # вычисляемые колонки (weather_date) вставлять нельзя — БД считает их сама
+    names = [c.name for c in table.columns if c.computed is None and (existing is None or c.name in existing)]
+    return ", ".join(f'"{n}"' for n in names)
+
+
+def _create_partition(conn: Connection, table: Table, start: date):
+    """Секция [start, next_period). Строки этого периода, уже попавшие в default-секцию, переносятся в неё."""
+    key = PARTITION_KEYS[table.name]
+    name = partition_name(table.name, start)
+    default = default_partition_name(table.name)
+    bounds = {"start": start, "end": next_period(start)}
+    in_range = f'"{key}" >= :start AND "{key}" < :end'
+
+    has_default = conn.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": default}).scalar()
+    stray = has_default and conn.execute(
+        text(f"SELECT EXISTS (SELECT 1 FROM {default} WHERE {in_range})"), bounds
+    ).scalar()
+    if stray:
+        # новая секция не создастся, пока её строки лежат в default
+        conn.execute(text(f"ALTER TABLE {table.name} DETACH PARTITION {default}"))
+    conn.execute(text(
+        f"CREATE TABLE {name} PARTITION OF {table.name} "
+        f"FOR VALUES FROM ('{bounds['start']}') TO ('{bounds['end']}')"
+    ))
+    if stray:
+        columns = _copy_columns(table)
+        conn.execute(text(f"INSERT INTO {name} ({columns}) SELECT {columns} FROM {default} WHERE {in_range}"), bounds)
+        conn.execute(text(f"DELETE FROM {default} WHERE {in_range}"), bounds)
+        conn.execute(text(f"ALTER TABLE {table.name} ATTACH PARTITION {default} DEFAULT"))
+
+
+def ensure_partitions(conn: Connection, table: Table, first, last) -> List[str]:
+    """
+    Создаёт недостающие секции на периоды [first, last] до записи пачки — строки сразу
+    попадают в свою секцию, а не в default. Возвращает имена созданных секций.
+    """
+    if first is None or last is None or not _missing_periods(conn, table, first, last):
+        return []
+    # параллельные загрузки не должны создавать одну и ту же секцию одновременно
+    conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:name))"), {"name": table.name})
+
+    created = []
+    for start in _missing_periods(conn, table, first, last):
+        _create_partition(conn, table, start)
+        created.append(partition_name(table.name, start))
+    return created
+
+
+def _missing_periods(conn: Connection, table: Table, first, last) -> List[date]:
+    """Начала периодов [first, last], для которых секции ещё нет (без блокировок — только каталог)."""
+    if not is_partitioned(conn, table.name):
+        return []
+    missing = []
+    start, end = period_start(first), period_start(last)
+    while start <= end:
+        name = partition_name(table.name, start)
+        if not conn.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name}).scalar():
+            missing.append(start)
+        start = next_period(start)
+    return missing
+
+
+def _holds_lock(conn: Connection, table_name: str) -> bool:
+    """Транзакция conn уже читала или писала таблицу (держит на ней блокировку)."""
+    return conn.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_locks WHERE pid = pg_backend_pid() AND relation = to_regclass(:name))"
+    ), {"name": table_name}).scalar()
+
+
+def ensure_partitions_for(conn: Connection, table: Table, frame) -> List[str]:
+    """
+    Секции под даты пачки перед bulk-записью (ingest.write_frame).
+
+    DDL (DETACH/CREATE/ATTACH берут ACCESS EXCLUSIVE) выполняется отдельной короткой
+    транзакцией на своём соединении и сразу коммитится — блокировки не держатся до конца
+    загрузки. Если транзакция загрузки уже работала с таблицей (следующая пачка /upload-csv),
+    отдельное соединение ждало бы её саму, поэтому секция создаётся в ней же, как раньше.
+    """
+    key = PARTITION_KEYS.get(table.name)
+    if key is None or frame.empty or conn.dialect.name != "postgresql":
+        return []
+    first, last = frame[key].min(), frame[key].max()
+    if not _missing_periods(conn, table, first, last):
+        return []
+    if _holds_lock(conn, table.name):
+        logger.info("Секции %s создаются в транзакции загрузки: таблица в ней уже заблокирована", table.name)
+        return ensure_partitions(conn, table, first, last)
+    with conn.engine.begin() as ddl:
+        return ensure_partitions(ddl, table, first, last)
+
+
+def create_partitioned_tables(engine: Engine) -> List[str]:
+    """Создаёт отсутствующие weather/temperature сразу секционированными (с default-секцией)."""
+    if engine.dialect.name != "postgresql" or not DB_PARTITIONING:
+        return []
+    created = []
+    metadata = MetaData()
+    with engine.begin() as conn:
+        for table in (Weather.__table__, Temperature.__table__):
+            if conn.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": table.name}).scalar():
+                continue
+            partitioned_table(table, metadata).create(conn)
+            conn.execute(text(f"CREATE TABLE {default_partition_name(table.name)} PARTITION OF {table.name} DEFAULT"))
+            created.append(table.name)
+    return created
+
+
+def _rename_with_suffix(conn: Connection, table_name: str, suffix: str):
+    """Старая таблица уходит в сторону вместе с индексами и sequence — их имена нужны новой."""
+    sequence = conn.execute(text("SELECT pg_get_serial_sequence(:t, 'id')"), {"t": table_name}).scalar()
+    for (index,) in conn.execute(text("SELECT indexname FROM pg_indexes WHERE tablename = :t"), {"t": table_name}):
+        conn.execute(text(f'ALTER INDEX "{index}" RENAME TO "{index}{suffix}"'))
+    if sequence:
+        conn.execute(text(f"ALTER SEQUENCE {sequence} RENAME TO {sequence.split('.')[-1]}{suffix}"))
+    conn.execute(text(f"ALTER TABLE {table_name} RENAME TO {table_name}{suffix}"))
+
+
+def partition_existing_tables(engine: Engine, skip: set = frozenset()) -> dict:
+    """
+    Переводит обычные weather/temperature (созданные до секционирования) на секции:
+    новая таблица, секции на весь диапазон данных, перенос строк с их id. Одна транзакция на таблицу.
+    skip — таблицы, которые остаются как есть (дубли не перенесутся в таблицу с уникальным индексом).
+    """
+    if engine.dialect.name != "postgresql" or not DB_PARTITIONING:
+        return {}
+    moved = {}
+    for table in (Weather.__table__, Temperature.__table__):
+        if table.name in skip:
+            continue
+        key = PARTITION_KEYS[table.name]
+        with engine.begin() as conn:
+            exists = conn.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": table.name}).scalar()
+            if not exists or is_partitioned(conn, table.name):
+                continue
+            old = f"{table.name}_unpartitioned"
+            existing = {c for (c,) in conn.execute(text(
+                "SELECT column_name FROM information_schema.columns WHERE table_name = :t"), {"t": table.name})}
+            _rename_with_suffix(conn, table.name, "_unpartitioned")
+
+            new = partitioned_table(table, MetaData())
+            new.create(conn)
+            conn.execute(text(f"CREATE TABLE {default_partition_name(table.name)} PARTITION OF {table.name} DEFAULT"))
+            first, last = conn.execute(text(f'SELECT min("{key}"), max("{key}") FROM {old}')).one()
+            ensure_partitions(conn, new, first, last)
+
+            columns = _copy_columns(new, existing)
+            moved[table.name] = conn.execute(text(
+                f"INSERT INTO {table.name} ({columns}) SELECT {columns} FROM {old}"
+            )).rowcount
+            conn.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                f"COALESCE((SELECT max(id) FROM {table.name}), 0) + 1, false)"
+            ))
+            conn.execute(text(f"DROP TABLE {old}"))
+            conn.execute(text(f"ANALYZE {table.name}"))
+    return moved
+
+
+def detach_partition(conn: Connection, table_name: str, period, drop: bool = False) -> str:
+    """
+    Отсоединяет секцию периода, в который попадает period: строки уходят из запросов
+    к таблице, но остаются в самостоятельной таблице-архиве с тем же именем
+    (её можно выгрузить pg_dump -t или удалить, drop=True).
+    """
+    name = partition_name(table_name, period_start(period))
+    conn.execute(text(f"ALTER TABLE {table_name} DETACH PARTITION {name}"))
+    if drop:
+        conn.execute(text(f"DROP TABLE {name}"))
+    return name
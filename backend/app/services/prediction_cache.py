@@ -0,0 +1,88 @@
+# app/services/prediction_cache.py
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# PREDICTION_CACHE_SIZE=0 отключает кэш
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "10000"))
+PREDICTION_CACHE_TTL = float(os.getenv("PREDICTION_CACHE_TTL", "3600"))
+
+
+def feature_key(row: np.ndarray, model_version: str, current_date: str) -> str:
+    """Ключ кэша: закодированный вектор признаков + версия модели + дата отсчёта."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(np.ascontiguousarray(row, dtype=float).tobytes())
+    digest.update(model_version.encode())
+    digest.update(current_date.encode())
+    return digest.hexdigest()
+
+
+class PredictionCache:
+    """LRU с TTL для результатов model.predict (дни до возгорания)."""
+
+    def __init__(self, max_size: int = PREDICTION_CACHE_SIZE, ttl: float = PREDICTION_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def get_many(self, keys):
+        """Значения по ключам (None — промах) одним захватом блокировки."""
+        now = time.monotonic()
+        values = []
+        with self._lock:
+            for key in keys:
+                item = self._items.get(key)
+                if item is not None and item[0] > now:
+                    self._items.move_to_end(key)
+                    values.append(item[1])
+                    self.hits += 1
+                else:
+                    if item is not None:
+                        del self._items[key]
+                    values.append(None)
+                    self.misses += 1
+        return values
+
+    def put_many(self, pairs):
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            for key, value in pairs:
+                self._items[key] = (expires_at, value)
+                self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def invalidate(self):
+        """Сброс после загрузки новых данных."""
+        with self._lock:
+            self._items.clear()
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "size": len(self._items),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "invalidations": self.invalidations,
+            }
+
+
+prediction_cache = PredictionCache()
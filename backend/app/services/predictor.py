@@ -1,93 +1,154 @@
-import joblib
-import os
+import logging
+import time
+import numpy as np
+import pandas as pd
 from datetime import datetime, timedelta
+from typing import List, Optional, Union
 from sqlalchemy.orm import Session
 
-MODEL_PATH = os.getenv("MODEL_PATH", "app/models/model.pkl")
+from app.services.model_registry import registry, ModelBundle
+from app.services.prediction_cache import prediction_cache, feature_key
+from app.services.profiling import profile_span
+from app.services.telemetry import observe_inference
 
-# Загрузка модели и энкодеров при старте
-model = joblib.load(MODEL_PATH)
-le_stack = joblib.load("app/models/label_encoder_stack.pkl")
-le_marka = joblib.load("app/models/label_encoder_marka.pkl")
-le_naim = joblib.load("app/models/label_encoder_naim.pkl")
+logger = logging.getLogger(__name__)
 
-def predict_ignition_risk(features: dict, session: Session):
-    print("=== DEBUG: Input features ===")
-    print(features)
-    print("=============================")
+# Код для категорий, которых LabelEncoder не видел при обучении
+UNKNOWN_CODE = -1
 
-    # Кодирование строковых признаков
-    try:
-        encoded_stack = le_stack.transform([str(features["Штабель"])])[0]
-        print(f"DEBUG: encoded_stack = {encoded_stack}")
-    except ValueError as e:
-        print(f"ERROR: Штабель '{features['Штабель']}' неизвестен в LabelEncoder: {e}")
-        encoded_stack = -1  # или вызвать ошибку
+# Числовые признаки в том же порядке, что и при обучении
+NUMERIC_FEATURES = [
+    "Склад",
+    "Максимальная_температура",
+    "Смена",
+    "t",
+    "p",
+    "humidity",
+    "precipitation",
+    "wind_dir",
+    "v_avg",
+    "v_max",
+    "cloudcover",
+    "weather_code",
+    "На_склад_тн",
+    "На_судно_тн",
+    "Склад_supply",
+    "ДниСНачалаФормирования",
+]
 
-    try:
-        encoded_marka = le_marka.transform([features["Марка"]])[0]
-        print(f"DEBUG: encoded_marka = {encoded_marka}")
-    except ValueError as e:
-        print(f"ERROR: Марка '{features['Марка']}' неизвестна в LabelEncoder: {e}")
-        encoded_marka = -1
+# Строковые признаки; закодированные колонки идут после числовых
+CATEGORICAL_FEATURES = ["Штабель", "Марка", "Наим_ЕТСНГ"]
 
-    try:
-        encoded_naim = le_naim.transform([features["Наим_ЕТСНГ"]])[0]
-        print(f"DEBUG: encoded_naim = {encoded_naim}")
-    except ValueError as e:
-        print(f"ERROR: Наим_ЕТСНГ '{features['Наим_ЕТСНГ']}' неизвестно в LabelEncoder: {e}")
-        encoded_naim = -1
-
-    # Подготовка вектора признаков (в том же порядке, что и при обучении)
-    X = [
-        features["Склад"],
-        features["Максимальная_температура"],
-        features["Смена"],
-        features["t"],
-        features["p"],
-        features["humidity"],
-        features["precipitation"],
-        features["wind_dir"],
-        features["v_avg"],
-        features["v_max"],
-        features["cloudcover"],
-        features["weather_code"],
-        features["На_склад_тн"],
-        features["На_судно_тн"],
-        features["Склад_supply"],
-        features["ДниСНачалаФормирования"],
-        encoded_stack,
-        encoded_marka,
-        encoded_naim
-    ]
+FEATURE_COLUMNS = NUMERIC_FEATURES + CATEGORICAL_FEATURES
 
-    print(f"DEBUG: Вектор X для модели: {X}")
+DEFAULT_CURRENT_DATE = "2025-11-21"
+
+
+def encode_categorical(values: pd.Series, codes: dict) -> np.ndarray:
+    """Кодирует колонку через словарь, неизвестные значения получают UNKNOWN_CODE."""
+    return values.astype(str).map(codes).fillna(UNKNOWN_CODE).to_numpy(dtype=float)
 
-    # Предсказание
-    try:
-        pred_days = model.predict([X])[0]
-        print(f"DEBUG: Модель вернула: {pred_days} дней")
-    except Exception as e:
-        print(f"ERROR: Ошибка при вызове model.predict: {e}")
-        raise e
-
-    # Определение даты прогноза
-    current_date_str = features.get("current_date", "2025-11-21")
-    current_date = datetime.fromisoformat(current_date_str)
-    predicted_date = current_date + timedelta(days=int(pred_days))
 
-    # Оценка риска
-    risk_level = "Низкий"
+def build_feature_matrix(frame: pd.DataFrame, bundle: ModelBundle) -> np.ndarray:
+    """Собирает матрицу признаков (n_piles × 19) для одного вызова model.predict."""
+    missing = [c for c in FEATURE_COLUMNS if c not in frame.columns]
+    if missing:
+        raise ValueError(f"Не хватает признаков: {missing}")
+
+    numeric = frame[NUMERIC_FEATURES].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+    encoded = np.column_stack([
+        encode_categorical(frame[name], bundle.codes[name]) for name in CATEGORICAL_FEATURES
+    ])
+    return np.hstack([numeric, encoded])
+
+
+def risk_level_for(pred_days: float) -> str:
     if pred_days <= 2:
-        risk_level = "Высокий"
-    elif pred_days <= 5:
-        risk_level = "Средний"
+        return "Высокий"
+    if pred_days <= 5:
+        return "Средний"
+    return "Низкий"
 
-    print(f"DEBUG: Прогнозируемая дата: {predicted_date.isoformat()}, уровень риска: {risk_level}")
 
+def format_prediction(pred_days: float, current_date: datetime, model_version: Optional[str] = None) -> dict:
+    predicted_date = current_date + timedelta(days=int(pred_days))
     return {
         "predicted_ignition_date": predicted_date.isoformat(),
         "predicted_days_to_fire": float(pred_days),
-        "risk_level": risk_level,
-        "message": f"Прогнозируемое время до самовозгорания: {pred_days:.2f} дней (~{int(pred_days)} дней)"
-    }
\ No newline at end of file
+        "risk_level": risk_level_for(pred_days),
+        "message": f"Прогнозируемое время до самовозгорания: {pred_days:.2f} дней (~{int(pred_days)} дней)",
+        "model_version": model_version
+    }
+
+
+def predict_days(bundle: ModelBundle, X: np.ndarray, current_dates: List[str]) -> np.ndarray:
+    """model.predict только для строк, которых нет в кэше, — по-прежнему одним вызовом."""
+    if not prediction_cache.enabled:
+        return bundle.model.predict(X)
+
+    keys = [feature_key(row, bundle.version, d) for row, d in zip(X, current_dates)]
+    cached = prediction_cache.get_many(keys)
+    pred_days = np.array([np.nan if v is None else v for v in cached], dtype=float)
+    missing = [i for i, v in enumerate(cached) if v is None]
+    if missing:
+        fresh = bundle.model.predict(X[missing])
+        pred_days[missing] = fresh
+        prediction_cache.put_many((keys[i], float(v)) for i, v in zip(missing, fresh))
+    return pred_days
+
+
+def predict_ignition_risk_batch(
+    features: Union[pd.DataFrame, np.ndarray],
+    current_date: str = DEFAULT_CURRENT_DATE
+) -> List[dict]:
+    """
+    Прогноз сразу для всех штабелей одним вызовом model.predict.
+
+    features — DataFrame с колонками FEATURE_COLUMNS (строка = штабель) либо
+    NumPy-массив в том же порядке колонок. Если в DataFrame есть колонка
+    "current_date", дата отсчёта берётся построчно.
+    """
+    if isinstance(features, np.ndarray):
+        features = pd.DataFrame(features, columns=FEATURE_COLUMNS)
+
+    if len(features) == 0:
+        return []
+
+    # одна версия модели на весь батч, даже если параллельно идёт перезагрузка
+    bundle = registry.get()
+    X = build_feature_matrix(features, bundle)
+
+    if "current_date" in features.columns:
+        current_dates = [str(d) for d in features["current_date"]]
+    else:
+        current_dates = [current_date] * len(features)
+
+    started = time.perf_counter()
+    with profile_span("predict_ignition_risk_batch"):
+        pred_days = predict_days(bundle, X, current_dates)
+    observe_inference(time.perf_counter() - started, len(features))
+
+    return [
+        format_prediction(days, datetime.fromisoformat(d), bundle.version)
+        for days, d in zip(pred_days, current_dates)
+    ]
+
+
+def predict_ignition_risk(features: dict, session: Session):
+    logger.debug("Входные признаки: %s", features)
+
+    frame = pd.DataFrame([features])
+    if "current_date" not in frame.columns:
+        frame["current_date"] = DEFAULT_CURRENT_DATE
+
+    try:
+        with profile_span("predict_ignition_risk"):
+            result = predict_ignition_risk_batch(frame)[0]
+    except Exception:
+        logger.exception("Ошибка при вызове model.predict")
+        raise
+
+    logger.debug("Прогнозируемая дата: %s, уровень риска: %s",
+                 result["predicted_ignition_date"], result["risk_level"])
+
+    return result
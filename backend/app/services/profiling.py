@@ -0,0 +1,359 @@
+# app/services/profiling.py
+"""
+Профилирование одного запроса по требованию.
+
+PROFILING=1 включает механизм; профилируется только запрос с заголовком
+X-Profile: 1 или параметром ?profile=1 и верным X-Admin-Token; без ADMIN_TOKEN
+профилирование закрыто, как и служебные эндпоинты, если не задан ADMIN_OPEN=1.
+При PROFILING=0 middleware и SQL-хуки не устанавливаются, а profile_span
+возвращает пустой контекст.
+
+Профиль — выборка стеков по wall-clock раз в PROFILE_INTERVAL_MS в потоках,
+где работал запрос (поток event loop, поток get_session, потоки SQL-запросов
+и прогноза), плюс журнал SQL с временем и суммарные интервалы profile_span.
+Результат лежит в PROFILE_DIR: <id>.collapsed (формат flamegraph.pl / speedscope)
+и <id>.json; id возвращается в заголовке X-Profile-Id.
+"""
+import json
+import logging
+import os
+import re
+import secrets
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import nullcontext
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Optional
+from urllib.parse import parse_qs
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+PROFILING = os.getenv("PROFILING", "0") == "1"
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "coal_profiles"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+# Выборка стеков прекращается через PROFILE_MAX_SECONDS — длинная загрузка не раздует профиль
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "120"))
+# Сколько последних профилей хранить в PROFILE_DIR
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))
+# Длинные SQL (multi-row INSERT) в журнале обрезаются
+SQL_LOG_MAX_CHARS = 2000
+
+PROFILE_ID_RE = re.compile(r"^[0-9]{8}-[0-9]{6}-[0-9a-f]{6}$")
+
+_NOOP = nullcontext()
+
+
+class RequestProfile:
+    def __init__(self, method: str, path: str):
+        now = datetime.now()
+        self.id = f"{now:%Y%m%d-%H%M%S}-{secrets.token_hex(3)}"
+        self.method = method
+        self.path = path
+        self.route = None
+        self.status = None
+        self.started_at = now.isoformat(timespec="seconds")
+        self.samples = Counter()
+        self.queries = []
+        self.spans = {}
+        self._open_spans = set()
+        self._threads = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample_loop, name=f"profiler-{self.id}", daemon=True)
+        self._started = None
+        self.duration = None
+
+    # --- потоки запроса ---
+
+    def add_current_thread(self):
+        ident = threading.get_ident()
+        if ident not in self._threads:
+            with self._lock:
+                self._threads[ident] = threading.current_thread().name
+
+    def _sample_loop(self):
+        interval = PROFILE_INTERVAL_MS / 1000
+        deadline = time.perf_counter() + PROFILE_MAX_SECONDS
+        while not self._stop.wait(interval) and time.perf_counter() < deadline:
+            frames = sys._current_frames()
+            with self._lock:
+                threads = list(self._threads.items())
+            for ident, name in threads:
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(name)
+                self.samples[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._started = time.perf_counter()
+        self.add_current_thread()
+        self._sampler.start()
+
+    def stop(self):
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._sampler.join()
+        now = time.perf_counter()
+        self.duration = now - self._started
+        # сессия get_session закрывается уже после ответа — её интервал обрезается концом ответа
+        with self._lock:
+            for span in self._open_spans:
+                self._add_span(span.name, now - span.started)
+            self._open_spans.clear()
+
+    # --- SQL и интервалы ---
+
+    def add_query(self, statement: str, seconds: float, rows: Optional[int] = None):
+        if self._stop.is_set():
+            return
+        self.add_current_thread()
+        entry = {
+            "sql": statement[:SQL_LOG_MAX_CHARS],
+            "ms": round(seconds * 1000, 3),
+            "rows": rows,
+            "thread": threading.current_thread().name,
+            "at_ms": round((time.perf_counter() - self._started) * 1000, 1),
+        }
+        with self._lock:
+            self.queries.append(entry)
+
+    def _add_span(self, name: str, seconds: float):
+        span = self.spans.setdefault(name, {"count": 0, "total_ms": 0.0})
+        span["count"] += 1
+        span["total_ms"] += seconds * 1000
+
+    def open_span(self, span: "_Span"):
+        if self._stop.is_set():
+            return
+        self.add_current_thread()
+        with self._lock:
+            self._open_spans.add(span)
+
+    def close_span(self, span: "_Span", seconds: float):
+        with self._lock:
+            if span in self._open_spans:
+                self._open_spans.discard(span)
+                self._add_span(span.name, seconds)
+
+    def span(self, name: str):
+        return _Span(self, name)
+
+    # --- результат ---
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": self.status,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration * 1000, 1),
+            "interval_ms": PROFILE_INTERVAL_MS,
+            "samples": sum(self.samples.values()),
+            "query_count": len(self.queries),
+            "query_ms": round(sum(q["ms"] for q in self.queries), 1),
+        }
+
+    def to_dict(self) -> dict:
+        spans = {name: {"count": s["count"], "total_ms": round(s["total_ms"], 1)} for name, s in self.spans.items()}
+        return {**self.summary(), "spans": spans, "queries": self.queries}
+
+    def save(self):
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        with open(os.path.join(PROFILE_DIR, f"{self.id}.collapsed"), "w", encoding="utf-8") as f:
+            f.write(self.collapsed())
+        with open(os.path.join(PROFILE_DIR, f"{self.id}.json"), "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        _prune_profiles()
+
+
+class _Span:
+    __slots__ = ("profile", "name", "started")
+
+    def __init__(self, profile: RequestProfile, name: str):
+        self.profile = profile
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        self.profile.open_span(self)
+
+    def __exit__(self, *exc):
+        self.profile.close_span(self, time.perf_counter() - self.started)
+
+
+_active: ContextVar[Optional[RequestProfile]] = ContextVar("request_profile", default=None)
+
+
+def current_profile() -> Optional[RequestProfile]:
+    return _active.get() if PROFILING else None
+
+
+def profile_span(name: str):
+    """Интервал кода в профиле текущего запроса; без профилирования — пустой контекст."""
+    if not PROFILING:
+        return _NOOP
+    profile = _active.get()
+    return _NOOP if profile is None else profile.span(name)
+
+
+def profile_query(statement: str, seconds: float, rows: Optional[int] = None):
+    """SQL мимо событий SQLAlchemy (COPY через сырой курсор psycopg2)."""
+    profile = current_profile()
+    if profile is not None:
+        profile.add_query(statement, seconds, rows)
+
+
+def instrument_engine(sync_engine):
+    """Журнал SQL профилируемого запроса; для async-движка передаётся async_engine.sync_engine."""
+
+    # начало — на контексте выполнения: упавший запрос не сбивает время следующих на этом соединении
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if context is not None and _active.get() is not None:
+            context._profile_started = time.perf_counter()
+
+    def _finish(context, statement: str, rows: Optional[int]):
+        profile = _active.get()
+        started = getattr(context, "_profile_started", None)
+        if profile is not None and started is not None:
+            context._profile_started = None
+            profile.add_query(statement, time.perf_counter() - started, rows)
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        _finish(context, statement, cursor.rowcount if cursor.rowcount >= 0 else None)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _failed(exception_context):
+        _finish(exception_context.execution_context, exception_context.statement, None)
+
+
+# --- Хранилище профилей ---
+
+def _prune_profiles():
+    ids = sorted({name.rpartition(".")[0] for name in os.listdir(PROFILE_DIR)} - {""})
+    ids = [profile_id for profile_id in ids if PROFILE_ID_RE.match(profile_id)]
+    for old in ids[:-PROFILE_KEEP] if PROFILE_KEEP > 0 else []:
+        for ext in ("collapsed", "json"):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, f"{old}.{ext}"))
+            except FileNotFoundError:
+                pass
+
+
+def _profile_path(profile_id: str, ext: str) -> Optional[str]:
+    if not PROFILE_ID_RE.match(profile_id):
+        return None
+    path = os.path.join(PROFILE_DIR, f"{profile_id}.{ext}")
+    return path if os.path.exists(path) else None
+
+
+def list_profiles() -> list:
+    """Сводки сохранённых профилей, новые первыми (без журнала SQL)."""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    result = []
+    for name in sorted(os.listdir(PROFILE_DIR), reverse=True):
+        profile_id, _, ext = name.rpartition(".")
+        if ext != "json" or not PROFILE_ID_RE.match(profile_id):
+            continue
+        with open(os.path.join(PROFILE_DIR, name), encoding="utf-8") as f:
+            data = json.load(f)
+        result.append({k: v for k, v in data.items() if k not in ("queries", "spans")})
+    return result
+
+
+def load_profile(profile_id: str) -> Optional[dict]:
+    path = _profile_path(profile_id, "json")
+    if path is None:
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_flamegraph(profile_id: str) -> Optional[str]:
+    path = _profile_path(profile_id, "collapsed")
+    if path is None:
+        return None
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+# --- HTTP ---
+
+def _profile_requested(scope) -> bool:
+    headers = dict(scope["headers"])
+    if headers.get(b"x-profile", b"").lower() in (b"1", b"true"):
+        return True
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    return query.get("profile", [""])[-1].lower() in ("1", "true")
+
+
+class ProfilingMiddleware:
+    """
+    Профилирует запрос, если его попросили (X-Profile: 1 или ?profile=1).
+    Запрос без верного X-Admin-Token обслуживается как обычно; без admin_token
+    профилируется только при admin_open (то же правило, что у require_admin).
+    """
+
+    def __init__(self, app, admin_token: Optional[str] = None, admin_open: bool = False):
+        self.app = app
+        self.admin_token = admin_token
+        self.admin_open = admin_open
+
+    def _allowed(self, scope) -> bool:
+        if scope["type"] != "http" or not _profile_requested(scope):
+            return False
+        if self.admin_token is None:
+            return self.admin_open
+        token = dict(scope["headers"]).get(b"x-admin-token", b"").decode("latin-1")
+        return secrets.compare_digest(token, self.admin_token)
+
+    async def __call__(self, scope, receive, send):
+        if not self._allowed(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope["method"], scope["path"])
+        token = _active.set(profile)
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                message["headers"] = [*message.get("headers", []), (b"x-profile-id", profile.id.encode())]
+            await send(message)
+            # фоновые задачи (BackgroundTasks) выполняются после ответа и в профиль не входят
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                profile.stop()
+
+        profile.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            _active.reset(token)
+            profile.stop()
+            profile.route = getattr(scope.get("route"), "path", None)
+            try:
+                profile.save()
+                logger.info("Профиль %s %s: %s (%.0f мс, SQL: %d)", profile.method, profile.path,
+                            profile.id, profile.duration * 1000, len(profile.queries))
+            except OSError:
+                logger.exception("Не удалось сохранить профиль %s", profile.id)
@@ -0,0 +1,90 @@
+# app/services/risk_calendar.py
+import hashlib
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import List, Optional
+
+from sqlalchemy import func, select
+
+from app.models.db_models import ForecastSnapshot
+
+# В календарь попадают прогнозы с этим уровнем риска (≤ 2 дней до возгорания)
+CALENDAR_RISK_LEVEL = "Высокий"
+CALENDAR_PAGE_SIZE = 100
+CALENDAR_MAX_PAGE_SIZE = 1000
+
+snapshot = ForecastSnapshot.__table__
+
+
+def latest_snapshot_stmt():
+    """
+    Последний снимок и его окно — одна строка или ни одной. Окно — по predicted_date,
+    как и фильтр календаря: дата возгорания бывает позже последнего дня прогноза.
+    """
+    latest = select(func.max(snapshot.c.generated_at)).scalar_subquery()
+    return select(
+        snapshot.c.generated_at, func.min(snapshot.c.predicted_date), func.max(snapshot.c.predicted_date)
+    ).where(snapshot.c.generated_at == latest).group_by(snapshot.c.generated_at)
+
+
+def _calendar_filter(generated_at: datetime, start: date, end: date, warehouses: Optional[List[int]]):
+    # predicted_date и warehouse — по индексу ix_forecastsnapshot_predicted
+    conditions = [
+        snapshot.c.predicted_date >= start,
+        snapshot.c.predicted_date <= end,
+        snapshot.c.generated_at == generated_at,
+        snapshot.c.risk_level == CALENDAR_RISK_LEVEL,
+    ]
+    if warehouses:
+        conditions.append(snapshot.c.warehouse.in_(warehouses))
+    return conditions
+
+
+def calendar_entries_stmt(generated_at, start, end, warehouses, limit: int, offset: int):
+    """Штабели с высоким риском по датам возгорания: одна строка на дату и штабель."""
+    return select(
+        snapshot.c.predicted_date,
+        snapshot.c.warehouse,
+        snapshot.c.pile_id,
+        func.min(snapshot.c.predicted_days_to_fire).label("predicted_days_to_fire"),
+        func.min(snapshot.c.forecast_day).label("first_forecast_day"),
+    ).where(
+        *_calendar_filter(generated_at, start, end, warehouses)
+    ).group_by(
+        snapshot.c.predicted_date, snapshot.c.warehouse, snapshot.c.pile_id
+    ).order_by(
+        snapshot.c.predicted_date, snapshot.c.warehouse, snapshot.c.pile_id
+    ).limit(limit).offset(offset)
+
+
+def calendar_day_totals_stmt(generated_at, start, end, warehouses):
+    """Число штабелей на каждую дату по всему фильтру, а не по странице; их сумма — total."""
+    entries = select(snapshot.c.predicted_date, snapshot.c.warehouse, snapshot.c.pile_id).where(
+        *_calendar_filter(generated_at, start, end, warehouses)
+    ).distinct().subquery()
+    return select(entries.c.predicted_date, func.count()).group_by(entries.c.predicted_date)
+
+
+def calendar_etag(generated_at: datetime, *params) -> str:
+    """Слабый ETag: ответ меняется только с новым снимком или другими параметрами."""
+    digest = hashlib.blake2b(digest_size=12)
+    digest.update(generated_at.isoformat().encode())
+    for param in params:
+        digest.update(repr(param).encode())
+    return f'W/"{digest.hexdigest()}"'
+
+
+def group_by_date(rows, day_totals: dict) -> list:
+    """
+    Строки страницы по датам. count — все штабели на дату (day_totals), piles — только
+    попавшие на страницу: дата на границе страниц продолжается на следующей.
+    """
+    days = OrderedDict()
+    for row in rows:
+        days.setdefault(row.predicted_date.isoformat(), []).append({
+            "warehouse": row.warehouse,
+            "pile_id": row.pile_id,
+            "predicted_days_to_fire": round(float(row.predicted_days_to_fire), 2),
+            "first_forecast_day": row.first_forecast_day.isoformat()
+        })
+    return [{"date": d, "count": day_totals[d], "piles": piles} for d, piles in days.items()]
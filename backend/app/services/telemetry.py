@@ -0,0 +1,281 @@
+# app/services/telemetry.py
+import bisect
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+
+# TELEMETRY=0 — без middleware и SQL-хуков, /metrics отдаёт только то, что уже накоплено
+TELEMETRY = os.getenv("TELEMETRY", "1") == "1"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+BATCH_SIZE_BUCKETS = (1, 10, 50, 100, 500, 1000, 5000, 10000, 50000, 100000)
+
+# Маршрут для запросов, не совпавших ни с одним эндпоинтом (сырой путь раздул бы число серий)
+UNMATCHED_ROUTE = "unmatched"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(names, values, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Монотонный счётчик с метками; в /metrics — <name> по каждому набору меток."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, *label_values):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_labels(self.labels, k)} {_number(v)}" for k, v in sorted(items)]
+
+
+class Histogram:
+    """Гистограмма в формате Prometheus: накопительные _bucket{le}, _sum и _count."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets, labels=()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.labels = tuple(labels)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(k, (list(b), s, c)) for k, (b, s, c) in self._series.items()]
+        lines = []
+        for key, (counts, total, count) in sorted(items):
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                le = _labels(self.labels, key, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            le = _labels(self.labels, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {count}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {count}")
+        return lines
+
+
+HTTP_DURATION = Histogram(
+    "http_request_duration_seconds", "Время обработки запроса", LATENCY_BUCKETS, ("method", "route", "status")
+)
+HTTP_DB_QUERIES = Histogram(
+    "http_request_db_queries", "SQL-запросов за один HTTP-запрос", QUERY_COUNT_BUCKETS, ("method", "route")
+)
+HTTP_DB_SECONDS = Histogram(
+    "http_request_db_seconds", "Суммарное время SQL за один HTTP-запрос", LATENCY_BUCKETS, ("method", "route")
+)
+DB_QUERIES = Counter("db_queries_total", "Выполнено SQL-запросов", ("engine",))
+DB_QUERY_SECONDS = Histogram("db_query_duration_seconds", "Время одного SQL-запроса", LATENCY_BUCKETS, ("engine",))
+MODEL_INFERENCE_SECONDS = Histogram(
+    "model_inference_seconds", "Время прогноза модели на один батч", LATENCY_BUCKETS
+)
+MODEL_BATCH_SIZE = Histogram("model_batch_size", "Строк в одном вызове прогноза", BATCH_SIZE_BUCKETS)
+MODEL_PREDICTIONS = Counter("model_predictions_total", "Спрогнозировано строк")
+INGEST_ROWS = Counter("ingest_rows_total", "Строк записано загрузкой CSV", ("kind",))
+INGEST_REJECTED = Counter("ingest_rejected_rows_total", "Строк отбраковано при загрузке CSV", ("kind",))
+INGEST_SECONDS = Counter("ingest_seconds_total", "Время bulk-записи при загрузке CSV", ("kind",))
+INGEST_ROWS_PER_SEC = Histogram(
+    "ingest_rows_per_second", "Скорость bulk-записи одной пачки, строк/с",
+    (100, 1000, 5000, 10000, 25000, 50000, 100000, 250000), ("kind",)
+)
+
+METRICS = [
+    HTTP_DURATION, HTTP_DB_QUERIES, HTTP_DB_SECONDS,
+    DB_QUERIES, DB_QUERY_SECONDS,
+    MODEL_INFERENCE_SECONDS, MODEL_BATCH_SIZE, MODEL_PREDICTIONS,
+    INGEST_ROWS, INGEST_REJECTED, INGEST_SECONDS, INGEST_ROWS_PER_SEC,
+]
+
+
+# --- Статистика текущего запроса ---
+
+class RequestStats:
+    """SQL текущего HTTP-запроса. Объект общий для потоков и задач запроса (contextvars копируют ссылку)."""
+
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current_request_stats() -> Optional[RequestStats]:
+    return _request_stats.get()
+
+
+# --- SQL: хуки на движки ---
+
+def record_query(seconds: float, engine_name: str = "sync"):
+    """Один SQL-запрос; вызывается и напрямую для COPY через сырой курсор psycopg2 (мимо событий SQLAlchemy)."""
+    DB_QUERIES.inc(1, engine_name)
+    DB_QUERY_SECONDS.observe(seconds, engine_name)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += seconds
+
+
+def instrument_engine(sync_engine, name: str):
+    """Считает запросы и их время; для async-движка передаётся async_engine.sync_engine."""
+
+    # Начало — на контексте выполнения, а не на соединении: у каждого запроса свой контекст,
+    # и упавший запрос не оставляет отметку, с которой сложился бы следующий
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._telemetry_started = time.perf_counter()
+
+    def _finish(context):
+        started = getattr(context, "_telemetry_started", None)
+        if started is not None:
+            context._telemetry_started = None
+            record_query(time.perf_counter() - started, name)
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        _finish(context)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _failed(exception_context):
+        # упавший запрос тоже занимал БД
+        _finish(exception_context.execution_context)
+
+
+# --- Модель и загрузка ---
+
+def observe_inference(seconds: float, rows: int):
+    if TELEMETRY:
+        MODEL_INFERENCE_SECONDS.observe(seconds)
+        MODEL_BATCH_SIZE.observe(rows)
+        MODEL_PREDICTIONS.inc(rows)
+
+
+def record_ingest(kind: str, rows: int, rejected: int, seconds: float):
+    if TELEMETRY:
+        INGEST_ROWS.inc(rows, kind)
+        INGEST_REJECTED.inc(rejected, kind)
+        INGEST_SECONDS.inc(seconds, kind)
+        if rows and seconds > 0:
+            INGEST_ROWS_PER_SEC.observe(rows / seconds, kind)
+
+
+# --- HTTP ---
+
+class TelemetryMiddleware:
+    """
+    ASGI-middleware: длительность, число SQL-запросов и время БД на каждый запрос.
+    Маршрут — шаблон пути (/api/stacks/{warehouse}), а не конкретный URL.
+    Замер заканчивается отправкой последней части тела — потоковые ответы учитываются целиком.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        started = time.perf_counter()
+        state = {"status": 500, "done": False}
+
+        def finish():
+            # фоновые задачи (BackgroundTasks) выполняются после ответа и в замер не входят
+            state["done"] = True
+            route = getattr(scope.get("route"), "path", UNMATCHED_ROUTE)
+            method = scope["method"]
+            HTTP_DURATION.observe(time.perf_counter() - started, method, route, state["status"])
+            HTTP_DB_QUERIES.observe(stats.queries, method, route)
+            HTTP_DB_SECONDS.observe(stats.db_seconds, method, route)
+
+        async def send_with_telemetry(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                finish()
+
+        try:
+            await self.app(scope, receive, send_with_telemetry)
+        finally:
+            _request_stats.reset(token)
+            if not state["done"]:
+                finish()
+
+
+# --- Экспорт ---
+
+def _pool_samples() -> list:
+    from app.database import pool_metrics
+
+    pools = pool_metrics()
+    gauges = [
+        ("db_pool_checked_out", "gauge", "Соединений выдано из пула", lambda m: m["checked_out"]),
+        ("db_pool_size", "gauge", "Размер пула", lambda m: m["size"]),
+        ("db_pool_checkouts_total", "counter", "Выдач соединения из пула", lambda m: m["checkouts"]),
+        ("db_pool_timeouts_total", "counter", "Таймаутов ожидания соединения", lambda m: m["timeouts"]),
+        ("db_pool_wait_seconds_total", "counter", "Суммарное ожидание соединения",
+         lambda m: m["wait_total_ms"] / 1000),
+    ]
+    lines = []
+    for name, kind, help, value in gauges:
+        lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+        lines += [f'{name}{{pool="{pool}"}} {_number(value(pools[pool]))}' for pool in ("sync", "async")]
+    return lines
+
+
+def render_metrics() -> str:
+    """Все метрики в текстовом формате Prometheus 0.0.4."""
+    lines = []
+    for metric in METRICS:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines += metric.samples()
+    lines += _pool_samples()
+    return "\n".join(lines) + "\n"
@@ -1,44 +1,118 @@
 # app/services/weather_loader.py
+import glob
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Optional
 
 import pandas as pd
-from sqlalchemy.orm import Session
-from app.models.db_models import Weather
+
 from app.database import engine
+from app.services.ingest import add_stats, ingest_frame, validate_frame, write_frame
+from app.services.parquet_cache import PARQUET_CACHE, SCHEMAS, ensure_cached, read_for_ingest
+from app.services.weather_store import weather_store
+
+# Сколько файлов разбирается одновременно (0 — по числу CPU)
+WEATHER_WORKERS = int(os.getenv("WEATHER_WORKERS", "0"))
+
 
 def load_weather_csv(file_path: str):
-    # Читаем CSV (без заголовка)
-    df = pd.read_csv(file_path, header=None, on_bad_lines="skip", dtype=str)
-    
-    # Ожидаем 11 колонок (как в weather_data_2015.csv)
-    if len(df.columns) < 11:
-        raise ValueError(f"Недостаточно колонок в {file_path}")
-    
-    df = df.iloc[:, :11]
-    df.columns = ["datetime", "temp", "pressure", "humidity", "precipitation",
-                  "wind_dir", "wind_speed", "v_max", "cloudcover", "visibility", "weather_code"]
-
-    # Очистка
-    df["datetime"] = pd.to_datetime(df["datetime"], errors="coerce")
-    numeric_cols = ["temp", "pressure", "humidity", "precipitation", "wind_speed", "cloudcover"]
-    for col in numeric_cols:
-        df[col] = pd.to_numeric(df[col], errors="coerce")
-    df = df.dropna(subset=["datetime", "temp"])
-
-    # Сохранение в БД
-    with Session(engine) as session:
-        for _, row in df.iterrows():
-            w = Weather(
-                datetime=row["datetime"],
-                temp=row["temp"],
-                pressure=row["pressure"],
-                humidity=int(row["humidity"]),
-                precipitation=row["precipitation"],
-                wind_dir=row["wind_dir"] if pd.notna(row["wind_dir"]) else None,
-                wind_speed=row["wind_speed"],
-                cloudcover=row["cloudcover"] if pd.notna(row["cloudcover"]) else None,
-                visibility=row["visibility"] if pd.notna(row["visibility"]) else None,
-                weather_code=row["weather_code"] if pd.notna(row["weather_code"]) else None
-            )
-            session.add(w)
-        session.commit()
-    print(f"✅ Загружено {len(df)} записей из {file_path}")
\ No newline at end of file
+    # Ожидаем 11 колонок (как в weather_data_2015.csv); CSV разбирается один раз —
+    # дальше читается типизированная Parquet-копия, пока исходный файл не изменится
+    df = read_for_ingest(file_path)
+
+    # Очистка и bulk-запись (COPY на PostgreSQL)
+    with engine.begin() as conn:
+        stats = ingest_frame(conn, "weather", df)
+    weather_store.invalidate()
+
+    print(f"✅ Загружено {stats['inserted_rows']} записей из {file_path} "
+          f"(обновлено {stats['updated_rows']}, пропущено {stats['skipped_rows']}, "
+          f"{stats['rows_per_sec']} строк/с)")
+
+
+def weather_files(*sources: str) -> List[str]:
+    """Каталоги (берутся weather_data_*.csv), glob-шаблоны и отдельные файлы → список файлов."""
+    files = []
+    for source in sources:
+        if os.path.isdir(source):
+            files += glob.glob(os.path.join(source, SCHEMAS["weather"]["pattern"]))
+        else:
+            files += glob.glob(source)
+    return sorted(set(files))
+
+
+def parse_weather_file(path: str, rejects_dir: Optional[str] = None):
+    """Чтение, очистка и проверка одного файла — выполняется в процессе пула, без БД."""
+    started = time.perf_counter()
+    raw = read_for_ingest(path)
+
+    rejects_path = None
+    if rejects_dir:
+        rejects_path = os.path.join(rejects_dir, os.path.splitext(os.path.basename(path))[0] + "_rejects.csv")
+        if os.path.exists(rejects_path):
+            os.remove(rejects_path)
+
+    valid, report = validate_frame("weather", raw, rejects_path=rejects_path)
+    report["rows"] = len(valid) + report["rejected_rows"]
+    report["seconds"] = time.perf_counter() - started
+    return valid, report
+
+
+def load_weather_files(files: List[str], workers: int = WEATHER_WORKERS,
+                       rejects_dir: Optional[str] = None, progress: bool = True) -> dict:
+    """
+    Загрузка многолетней погоды: файлы разбираются параллельно в пуле процессов,
+    затем склеиваются, повторяющиеся часы на стыках файлов схлопываются (побеждает
+    более поздний файл), и каждый год пишется отдельной транзакцией.
+    """
+    started = time.perf_counter()
+    if not files:
+        raise FileNotFoundError("Не найдено ни одного файла погоды")
+    if rejects_dir:
+        os.makedirs(rejects_dir, exist_ok=True)
+    if PARQUET_CACHE:
+        # кэш обновляется заранее, чтобы процессы пула не переписывали манифест одновременно
+        for data_dir in sorted({os.path.dirname(f) for f in files}):
+            ensure_cached(["weather"], data_dir)
+
+    workers = min(workers or os.cpu_count() or 1, len(files))
+    frames = {}
+    totals = {"inserted_rows": 0, "updated_rows": 0, "skipped_rows": 0, "rejected_rows": 0, "rejects": {}}
+    # spawn: пул может создаваться из рабочего потока load_datasets, fork там небезопасен
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = {pool.submit(parse_weather_file, path, rejects_dir): path for path in files}
+        for future in as_completed(futures):
+            path = futures[future]
+            valid, report = future.result()
+            frames[path] = valid
+            add_stats(totals, report)
+            if progress:
+                rate = report["rows"] / report["seconds"] if report["seconds"] > 0 else 0
+                print(f"  {os.path.basename(path)}: {report['rows']} строк, "
+                      f"отбраковано {report['rejected_rows']}, {report['seconds']:.2f} с ({rate:.0f} строк/с)")
+
+    merged = pd.concat([frames[path] for path in files], ignore_index=True)
+    before = len(merged)
+    merged = merged.drop_duplicates(subset=["datetime"], keep="last")
+    totals["duplicate_rows"] = before - len(merged)
+    totals["skipped_rows"] += totals["duplicate_rows"]
+
+    years = merged["datetime"].dt.year
+    for year, part in merged.groupby(years):
+        with engine.begin() as conn:
+            stats = write_frame(conn, "weather", part)
+        # массив погоды пересобирается только из закоммиченных данных
+        weather_store.invalidate()
+        add_stats(totals, stats)
+        if progress:
+            print(f"  {year}: добавлено {stats['inserted_rows']}, обновлено {stats['updated_rows']}, "
+                  f"{stats['rows_per_sec']} строк/с")
+
+    seconds = time.perf_counter() - started
+    totals["files"] = len(files)
+    totals["years"] = int(years.nunique())
+    totals["seconds"] = round(seconds, 3)
+    totals["rows_per_sec"] = round((before + totals["rejected_rows"]) / seconds, 1) if seconds > 0 else None
+    return totals
@@ -0,0 +1,50 @@
+# app/services/weather_rollup.py
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.engine import Connection
+
+from app.models.db_models import Weather, WeatherDaily
+
+
+def daily_aggregate_stmt():
+    """Агрегат почасовой погоды по дням — тот же, что раньше считался в каждом запросе."""
+    return select(
+        Weather.weather_date,
+        func.avg(Weather.temp),
+        func.avg(Weather.humidity),
+        func.sum(Weather.precipitation),
+        func.avg(Weather.wind_speed),
+        func.max(Weather.wind_speed),
+        func.avg(Weather.pressure),
+        func.avg(Weather.cloudcover),
+        func.count(),
+    ).group_by(Weather.weather_date)
+
+
+ROLLUP_COLUMNS = [
+    "day", "avg_temp", "avg_humidity", "total_precip", "avg_wind_speed",
+    "max_wind_speed", "avg_pressure", "avg_cloudcover", "hours",
+]
+
+
+def refresh_weather_daily(conn: Connection, first_day: Optional[date] = None, last_day: Optional[date] = None) -> int:
+    """
+    Пересчитывает WeatherDaily только за дни [first_day, last_day] (без границ — целиком).
+    Выполняется в транзакции conn, вместе с загрузкой почасовых данных.
+    """
+    rollup = WeatherDaily.__table__
+    source = daily_aggregate_stmt()
+    stale = delete(rollup)
+    # условия и по datetime — ключу секционирования weather, чтобы PostgreSQL читал только нужные секции
+    if first_day is not None:
+        source = source.where(Weather.weather_date >= first_day, Weather.datetime >= datetime.combine(first_day, time.min))
+        stale = stale.where(rollup.c.day >= first_day)
+    if last_day is not None:
+        source = source.where(Weather.weather_date <= last_day, Weather.datetime < datetime.combine(last_day + timedelta(days=1), time.min))
+        stale = stale.where(rollup.c.day <= last_day)
+
+    conn.execute(stale)
+    result = conn.execute(insert(rollup).from_select(ROLLUP_COLUMNS, source))
+    return result.rowcount
@@ -0,0 +1,325 @@
+# app/services/weather_store.py
+"""
+Почасовая погода в памяти процесса: непрерывный NumPy-массив, элемент i — час epoch + i.
+
+Кроме колонок погоды у каждого часа есть prev/next — индексы ближайшего часа с данными
+не раньше и не позже него, поэтому «последняя погода не позже дня D» и «первая запись
+за день D» — это индексация массива, а не SQL-запрос.
+
+WEATHER_STORE_DIR (по умолчанию <tmp>/coal_weather_store) — массив лежит в .npy-файле
+и открывается через mmap, так что воркеры uvicorn делят одну копию; собирает его
+первый процесс, которому он понадобился. WEATHER_STORE_DIR="" — только память процесса
+(загрузки из CLI такой процесс не увидит до рестарта). WEATHER_STORE=0 — погода из SQL.
+
+После записи погоды в БД (и только после commit) вызывается weather_store.invalidate(),
+следующий запрос пересобирает массив из таблицы weather.
+"""
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, select
+
+from app.database import DATABASE_URL, engine
+from app.models.db_models import Weather
+
+logger = logging.getLogger(__name__)
+
+WEATHER_STORE = os.getenv("WEATHER_STORE", "1") == "1"
+WEATHER_STORE_DIR = os.getenv("WEATHER_STORE_DIR", os.path.join(tempfile.gettempdir(), "coal_weather_store"))
+
+# Колонки Weather, которые нужны признакам (те же, что ключи features.WEATHER_COLUMNS)
+HOURLY_COLUMNS = [
+    "temp", "pressure", "humidity", "precipitation", "wind_dir", "wind_speed", "v_max", "cloudcover", "weather_code"
+]
+
+# float64 — значения те же, что отдаёт БД; NaN — NULL в колонке или час без записи
+STORE_DTYPE = np.dtype([(c, "f8") for c in HOURLY_COLUMNS] + [("prev", "i4"), ("next", "i4")])
+
+
+class WeatherStore:
+    """Неизменяемый снимок почасовой погоды."""
+
+    def __init__(self, hours: np.ndarray, epoch: Optional[np.datetime64], rows: int, last_datetime: Optional[datetime]):
+        self.hours = hours
+        self.epoch = epoch
+        self.rows = rows
+        self.last_datetime = last_datetime
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame) -> "WeatherStore":
+        """frame — строки weather (datetime + HOURLY_COLUMNS), отсортированные по datetime."""
+        if frame.empty:
+            return cls(np.zeros(0, dtype=STORE_DTYPE), None, 0, None)
+
+        stamps = pd.to_datetime(frame["datetime"]).to_numpy().astype("datetime64[h]")
+        epoch = stamps[0]
+        offsets = (stamps - epoch).astype(np.int64)
+
+        # данные почасовые (uq_weather_datetime); если в часе несколько записей — остаётся последняя
+        hours = np.zeros(offsets[-1] + 1, dtype=STORE_DTYPE)
+        for col in HOURLY_COLUMNS:
+            hours[col] = np.nan
+            hours[col][offsets] = frame[col].astype(float).to_numpy()
+
+        present = np.unique(offsets)
+        grid = np.arange(len(hours))
+        before = np.searchsorted(present, grid, side="right") - 1
+        hours["prev"] = np.where(before >= 0, present[np.maximum(before, 0)], -1)
+        after = np.searchsorted(present, grid, side="left")
+        hours["next"] = np.where(after < len(present), present[np.minimum(after, len(present) - 1)], -1)
+
+        last = pd.Timestamp(frame["datetime"].iloc[-1]).to_pydatetime()
+        return cls(hours, epoch, len(frame), last)
+
+    def _hour(self, day) -> np.ndarray:
+        """Смещение начала дня (дней) от epoch в часах."""
+        return (np.asarray(day, dtype="datetime64[D]").astype("datetime64[h]") - self.epoch).astype(np.int64)
+
+    def _frame(self, rows: np.ndarray) -> pd.DataFrame:
+        return pd.DataFrame({col: self.hours[col][rows] for col in HOURLY_COLUMNS})
+
+    def as_of(self, day) -> pd.DataFrame:
+        """Последний час не позже конца дня day — одна строка (как weather_as_of_stmt) или пусто."""
+        if not len(self.hours):
+            return self._frame(np.zeros(0, dtype=np.int64))
+        end = int(self._hour(day)) + 23
+        index = self.hours["prev"][min(end, len(self.hours) - 1)] if end >= 0 else -1
+        return self._frame(np.array([index] if index >= 0 else [], dtype=np.int64))
+
+    def first_of_day(self, days) -> pd.DataFrame:
+        """Первый час с данными за каждый из дней days (как weather_first_of_day_stmt): "day" + колонки."""
+        days = np.array(list(days), dtype="datetime64[D]")
+        if not len(self.hours) or not len(days):
+            return pd.DataFrame(columns=["day", *HOURLY_COLUMNS])
+        start = self._hour(days)
+        first = self.hours["next"][np.clip(start, 0, len(self.hours) - 1)]
+        found = (start < len(self.hours)) & (start + 24 > 0) & (first >= 0) & (first < start + 24)
+        frame = self._frame(first[found])
+        frame.insert(0, "day", days[found].astype(object))
+        return frame
+
+    def meta(self) -> dict:
+        return {
+            "epoch": str(self.epoch) if self.epoch is not None else None,
+            "hours": len(self.hours),
+            "rows": self.rows,
+            "last_datetime": self.last_datetime.isoformat() if self.last_datetime else None,
+        }
+
+
+def read_weather_store() -> WeatherStore:
+    with engine.connect() as conn:
+        result = conn.execute(
+            select(Weather.datetime, *[getattr(Weather, c) for c in HOURLY_COLUMNS]).order_by(Weather.datetime)
+        )
+        frame = pd.DataFrame(result.fetchall(), columns=list(result.keys()))
+    return WeatherStore.from_frame(frame)
+
+
+def _weather_totals():
+    with engine.connect() as conn:
+        return conn.execute(select(func.count(), func.max(Weather.datetime))).one()
+
+
+class SharedWeatherStore:
+    """
+    Актуальный WeatherStore: в памяти процесса или в общем для процессов каталоге.
+
+    В каталоге лежат weather-<id>.npy и current.json (какой файл актуален); invalidate()
+    меняет метку invalidated и удаляет current.json. Сборка сверяет метку до чтения БД
+    и перед публикацией — снимок, собранный до commit, не станет актуальным.
+    """
+
+    def __init__(self, directory: Optional[str]):
+        self.directory = directory or None
+        self._store = None
+        self._signature = None
+        self._validated = False
+        self._generation = 0
+        self._build_lock = threading.Lock()
+        self._publish_lock = threading.Lock()
+        self.builds = 0
+        self.invalidations = 0
+        self.last_build_seconds = None
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _pointer_signature(self):
+        try:
+            st = os.stat(self._path("current.json"))
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def peek(self) -> Optional[WeatherStore]:
+        """Снимок без обращения к БД; None — нужна пересборка через get()."""
+        store = self._store
+        if store is None or self.directory is None:
+            return store
+        signature = self._pointer_signature()
+        return store if signature is not None and signature == self._signature else None
+
+    def get(self) -> WeatherStore:
+        store = self.peek()
+        if store is not None:
+            return store
+        with self._build_lock:
+            store = self.peek()
+            if store is None:
+                store = self._build_local() if self.directory is None else self._load_or_build_shared()
+            return store
+
+    def invalidate(self):
+        self.invalidations += 1
+        with self._publish_lock:
+            self._generation += 1
+            self._store = None
+            if self.directory is not None:
+                self._with_file_lock(".publish.lock", self._mark_invalidated)
+
+    # --- память процесса ---
+
+    def _build_local(self) -> WeatherStore:
+        while True:
+            generation = self._generation
+            store = self._timed_build()
+            with self._publish_lock:
+                if generation == self._generation:
+                    self._store = store
+                    return store
+
+    # --- общий каталог ---
+
+    def _with_file_lock(self, name: str, action):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._path(name), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                return action()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _token(self) -> str:
+        try:
+            with open(self._path("invalidated"), encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return ""
+
+    def _mark_invalidated(self):
+        tmp = self._path(f"invalidated.{uuid.uuid4().hex}")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(uuid.uuid4().hex)
+        os.replace(tmp, self._path("invalidated"))
+        try:
+            os.remove(self._path("current.json"))
+        except FileNotFoundError:
+            pass
+
+    def _load_shared(self) -> Optional[WeatherStore]:
+        signature = self._pointer_signature()
+        if signature is None:
+            return None
+        try:
+            with open(self._path("current.json"), encoding="utf-8") as f:
+                meta = json.load(f)
+            # пустой .npy нельзя открыть через mmap
+            hours = np.load(self._path(meta["file"]), mmap_mode="r" if meta["hours"] else None)
+        except (FileNotFoundError, ValueError, KeyError):
+            return None
+        if hours.dtype != STORE_DTYPE:
+            # файл собран прежней версией с другим набором колонок
+            return None
+        last = datetime.fromisoformat(meta["last_datetime"]) if meta["last_datetime"] else None
+        epoch = np.datetime64(meta["epoch"], "h") if meta["epoch"] else None
+        self._signature = signature
+        return WeatherStore(hours, epoch, meta["rows"], last)
+
+    def _load_or_build_shared(self) -> WeatherStore:
+        def load_or_build():
+            store = self._load_shared()
+            # файл мог остаться от прежнего содержимого БД — процесс сверяет его один раз
+            if store is not None and not self._validated:
+                rows, last = _weather_totals()
+                self._validated = rows == store.rows and last == store.last_datetime
+                if not self._validated:
+                    logger.info("Файл погоды %s устарел, пересборка", self.directory)
+                    store = None
+            if store is None:
+                store = self._build_shared()
+                self._validated = True
+            self._store = store
+            return store
+
+        # пока один процесс собирает файл, остальные ждут и берут готовый
+        return self._with_file_lock(".build.lock", load_or_build)
+
+    def _build_shared(self) -> WeatherStore:
+        while True:
+            token = self._token()
+            store = self._timed_build()
+            name = f"weather-{uuid.uuid4().hex[:12]}.npy"
+            np.save(self._path(name), np.asarray(store.hours))
+            published = self._with_file_lock(".publish.lock", lambda: self._publish(token, name, store))
+            if published is not None:
+                return published
+            os.remove(self._path(name))
+
+    def _publish(self, token: str, name: str, store: WeatherStore) -> Optional[WeatherStore]:
+        if self._token() != token:
+            return None
+        tmp = self._path(f"current.{uuid.uuid4().hex}.json")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"file": name, "built_at": datetime.now().isoformat(timespec="seconds"), **store.meta()}, f)
+        os.replace(tmp, self._path("current.json"))
+        # старые файлы можно удалять: открытый mmap остаётся валидным у тех, кто его держит
+        for old in os.listdir(self.directory):
+            if old.startswith("weather-") and old != name:
+                os.remove(self._path(old))
+        return self._load_shared()
+
+    def _timed_build(self) -> WeatherStore:
+        started = time.perf_counter()
+        store = read_weather_store()
+        self.last_build_seconds = round(time.perf_counter() - started, 3)
+        self.builds += 1
+        logger.info("Погода собрана в массив: %d часов, %d строк, %.3f с",
+                    len(store.hours), store.rows, self.last_build_seconds)
+        return store
+
+    def stats(self) -> dict:
+        store = self.peek()
+        return {
+            "enabled": WEATHER_STORE,
+            "mode": "memory" if self.directory is None else "mmap",
+            "directory": self.directory,
+            "loaded": store is not None,
+            **(store.meta() if store is not None else {}),
+            "bytes": int(store.hours.nbytes) if store is not None else 0,
+            "builds": self.builds,
+            "invalidations": self.invalidations,
+            "last_build_seconds": self.last_build_seconds,
+        }
+
+
+def _store_directory() -> Optional[str]:
+    if not WEATHER_STORE_DIR:
+        return None
+    # своя папка на каждую БД: бенчмарки и рабочая база не перетирают друг друга
+    key = hashlib.sha1(DATABASE_URL.encode()).hexdigest()[:12]
+    return os.path.join(WEATHER_STORE_DIR, key)
+
+
+weather_store = SharedWeatherStore(_store_directory())
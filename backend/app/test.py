@@ -7,13 +7,9 @@ import os
 sys.path.insert(0, os.path.abspath('.'))
 
 from app.services.predictor import predict_ignition_risk
-from sqlalchemy.orm import sessionmaker
-from app.database import engine
+from app.database import SessionLocal
 from datetime import datetime
 
-# Создаём сессию
-SessionLocal = sessionmaker(bind=engine)
-
 def test_prediction():
     print("🧪 Тестируем predict_ignition_risk...")
 
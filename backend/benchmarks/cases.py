@@ -0,0 +1,129 @@
+# benchmarks/cases.py
+"""
+Замеры для benchmarks.run. Модуль импортирует приложение, поэтому DATABASE_URL
+и прочие переменные окружения должны быть выставлены до импорта (это делает run.py).
+"""
+import contextlib
+import io
+import os
+import statistics
+import time
+from datetime import timedelta
+
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select
+from sqlmodel import SQLModel
+
+from app.database import SessionLocal, engine
+from app.main import app
+from app.models.db_models import Temperature
+from app.services.features import load_pile_features
+from app.services.predictor import predict_ignition_risk, predict_ignition_risk_batch
+from app.services.weather_store import weather_store
+from init_db import create_tables
+
+# Порядок загрузки: погода и температура нужны дашборду, пожары — возрасту штабелей
+UPLOAD_ORDER = ["weather", "temperature", "fires", "supplies"]
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 2)
+
+
+def _latency(samples: list) -> dict:
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    return {
+        "runs": len(samples),
+        "min_ms": _ms(ordered[0]),
+        "median_ms": _ms(statistics.median(ordered)),
+        "p95_ms": _ms(p95),
+    }
+
+
+def reset_database():
+    """Пустая схема под каждый размер склада (таблицы пересоздаются, как в init_db.py)."""
+    SQLModel.metadata.drop_all(engine)
+    with contextlib.redirect_stdout(io.StringIO()):
+        create_tables()
+    weather_store.invalidate()
+
+
+def client() -> TestClient:
+    return TestClient(app)
+
+
+def bench_upload(client: TestClient, paths: dict) -> dict:
+    """/api/upload-csv по каждому типу файла: строк в секунду на весь путь запроса."""
+    results = {}
+    for kind in UPLOAD_ORDER:
+        rows = inserted = 0
+        seconds = 0.0
+        for path in paths[kind]:
+            with open(path, "rb") as f:
+                started = time.perf_counter()
+                response = client.post("/api/upload-csv", files={"file": (os.path.basename(path), f, "text/csv")})
+                seconds += time.perf_counter() - started
+            response.raise_for_status()
+            stats = response.json()
+            rows += stats["inserted_rows"] + stats["updated_rows"] + stats["skipped_rows"]
+            inserted += stats["inserted_rows"]
+        results[kind] = {
+            "files": len(paths[kind]),
+            "rows": rows,
+            "inserted_rows": inserted,
+            "seconds": round(seconds, 3),
+            "rows_per_sec": round(rows / seconds, 1) if seconds > 0 else None,
+        }
+    return results
+
+
+def bench_predictor(single_limit: int, repeats: int) -> dict:
+    """
+    Признаки всех штабелей (как у дашборда) → predict_ignition_risk по одному штабелю
+    против одного predict_ignition_risk_batch. Одиночный путь меряется на первых
+    single_limit штабелях и пересчитывается в строки/с.
+    """
+    with SessionLocal() as session:
+        last_day = session.execute(select(func.max(Temperature.measurement_date))).scalar().date()
+        features = load_pile_features(session, age_reference=last_day)
+
+    predict_ignition_risk_batch(features.head(1))  # загрузка модели вне замера
+
+    batch_samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        predict_ignition_risk_batch(features)
+        batch_samples.append(time.perf_counter() - started)
+
+    rows = features.head(single_limit).to_dict("records")
+    started = time.perf_counter()
+    for row in rows:
+        predict_ignition_risk(row, None)
+    single_seconds = time.perf_counter() - started
+
+    batch_rps = len(features) / statistics.median(batch_samples)
+    single_rps = len(rows) / single_seconds
+    return {
+        "piles": len(features),
+        "batch": {**_latency(batch_samples), "rows_per_sec": round(batch_rps, 1)},
+        "single": {"rows": len(rows), "seconds": round(single_seconds, 3), "rows_per_sec": round(single_rps, 1)},
+        "batch_speedup": round(batch_rps / single_rps, 1),
+    }
+
+
+def bench_dashboard(client: TestClient, history_end, windows: list, repeats: int) -> dict:
+    """Задержка /api/dashboard-summary-test для окон прогноза сразу после конца истории."""
+    results = {}
+    start = history_end + timedelta(days=1)
+    for days in windows:
+        params = {"start_date": start.isoformat(), "end_date": (start + timedelta(days=days - 1)).isoformat()}
+        client.get("/api/dashboard-summary-test", params=params).raise_for_status()  # прогрев
+        samples = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            response = client.get("/api/dashboard-summary-test", params=params)
+            samples.append(time.perf_counter() - started)
+            response.raise_for_status()
+        results[f"{days}d"] = _latency(samples)
+    return results
@@ -0,0 +1,70 @@
+# benchmarks/compare.py
+"""
+Сравнение двух прогонов benchmarks.run по одинаковым (штабелей, дней истории):
+
+    python -m benchmarks.compare benchmarks/results/old.json benchmarks/results/new.json --threshold 0.15
+
+rows_per_sec — чем больше, тем лучше; *_ms — чем меньше, тем лучше. Код выхода 1,
+если хоть одна метрика ухудшилась больше чем на threshold.
+"""
+import argparse
+import json
+import sys
+
+# Метрики, по которым ищется регрессия; остальные числа в отчёте — справочные
+HIGHER_IS_BETTER = ("rows_per_sec",)
+LOWER_IS_BETTER = ("median_ms", "p95_ms")
+
+
+def flatten(node, prefix: str = "") -> dict:
+    if isinstance(node, dict):
+        flat = {}
+        for key, value in node.items():
+            flat.update(flatten(value, f"{prefix}.{key}" if prefix else key))
+        return flat
+    return {prefix: node} if isinstance(node, (int, float)) else {}
+
+
+def compare(base: dict, new: dict, threshold: float):
+    base_runs = {(r["piles"], r["history_days"]): r for r in base["results"]}
+    regressions = []
+    for run in new["results"]:
+        key = (run["piles"], run["history_days"])
+        if key not in base_runs:
+            continue
+        before = flatten({k: base_runs[key][k] for k in ("upload", "predictor", "dashboard")})
+        after = flatten({k: run[k] for k in ("upload", "predictor", "dashboard")})
+        print(f"\n🏭 {key[0]} штабелей, {key[1]} дней")
+        for metric in sorted(before.keys() & after.keys()):
+            higher = metric.endswith(HIGHER_IS_BETTER)
+            if not (higher or metric.endswith(LOWER_IS_BETTER)) or not before[metric]:
+                continue
+            change = after[metric] / before[metric] - 1
+            worse = -change if higher else change
+            mark = "❌" if worse > threshold else ("✅" if worse < -threshold else "  ")
+            print(f"  {mark} {metric}: {before[metric]} → {after[metric]} ({change:+.1%})")
+            if worse > threshold:
+                regressions.append((key, metric, change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение двух прогонов бенчмарков")
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.1, help="допустимое ухудшение, доля")
+    args = parser.parse_args()
+
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new = json.load(f)
+    print(f"{base['meta']['commit']} ({base['meta']['dialect']}) → {new['meta']['commit']} ({new['meta']['dialect']})")
+
+    regressions = compare(base, new, args.threshold)
+    print(f"\nРегрессий больше {args.threshold:.0%}: {len(regressions)}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
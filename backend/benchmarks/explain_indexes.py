@@ -0,0 +1,81 @@
+# benchmarks/explain_indexes.py
+"""
+Планы горячих запросов до и после индексов из db_models.
+
+Запуск из backend/:  python -m benchmarks.explain_indexes
+Индексы временно удаляются, снимаются планы, затем индексы создаются снова.
+"""
+import time
+
+from sqlalchemy import text
+from sqlmodel import SQLModel
+
+from app.database import engine
+import app.models.db_models  # noqa: F401 — регистрирует таблицы в metadata
+
+# Запросы, которые выполняют /pile-weather, /stacks/{warehouse}, /weather и дашборды
+HOT_QUERIES = {
+    "pile_temperatures": (
+        "SELECT * FROM temperature WHERE warehouse = 4 AND pile_id = '46' "
+        "AND measurement_date >= '2019-11-01' AND measurement_date <= '2019-12-01' "
+        "ORDER BY measurement_date"
+    ),
+    "latest_pile_temperature": (
+        "SELECT * FROM temperature WHERE warehouse = 4 AND pile_id = '46' "
+        "ORDER BY measurement_date DESC LIMIT 1"
+    ),
+    "stacks_by_warehouse": "SELECT DISTINCT pile_id FROM temperature WHERE warehouse = 4",
+    "pile_formation": "SELECT * FROM fireevent WHERE warehouse = 4 AND pile_id = '46' LIMIT 1",
+    "weather_range": (
+        "SELECT weather_date, avg(temp) FROM weather "
+        "WHERE datetime >= '2019-11-01' AND datetime <= '2019-12-01' GROUP BY weather_date"
+    ),
+    "weather_by_day": "SELECT * FROM weather WHERE weather_date = '2019-11-21' LIMIT 1",
+}
+
+
+def explain_prefix():
+    if engine.dialect.name == "postgresql":
+        return "EXPLAIN (ANALYZE, BUFFERS) "
+    return "EXPLAIN QUERY PLAN "
+
+
+def collect_plans(conn):
+    plans = {}
+    for name, sql in HOT_QUERIES.items():
+        started = time.perf_counter()
+        rows = conn.execute(text(explain_prefix() + sql)).fetchall()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        plans[name] = (elapsed_ms, [" | ".join(str(v) for v in row) for row in rows])
+    return plans
+
+
+def print_plans(title, plans):
+    print(f"\n===== {title} =====")
+    for name, (elapsed_ms, lines) in plans.items():
+        print(f"\n--- {name} ({elapsed_ms:.1f} ms)")
+        for line in lines:
+            print(f"    {line}")
+
+
+def main():
+    indexes = [index for table in SQLModel.metadata.sorted_tables for index in table.indexes]
+
+    for index in indexes:
+        index.drop(engine, checkfirst=True)
+    with engine.connect() as conn:
+        before = collect_plans(conn)
+
+    for index in indexes:
+        index.create(engine, checkfirst=True)
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+    with engine.connect() as conn:
+        after = collect_plans(conn)
+
+    print_plans("Без индексов", before)
+    print_plans("С индексами", after)
+
+
+if __name__ == "__main__":
+    main()
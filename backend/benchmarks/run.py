@@ -0,0 +1,130 @@
+# benchmarks/run.py
+"""
+Бенчмарки прогноза, загрузки CSV и дашборда на синтетических складах разного размера.
+
+Запуск из backend/:
+    python -m benchmarks.run --piles 100,1000 --days 90,365
+    python -m benchmarks.run --piles 10000 --days 365 --database-url postgresql://postgres@localhost/coal_bench
+
+Для каждой пары (штабелей, дней истории) схема БД пересоздаётся, поэтому по умолчанию
+используется временная SQLite; рабочую базу в --database-url не указывать.
+Результаты — JSON (по умолчанию benchmarks/results/<дата>-<коммит>.json),
+сравнение двух прогонов: python -m benchmarks.compare старый.json новый.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks.synthetic_yard import generate_yard, write_yard
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def _int_list(value: str) -> list:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def configure_environment(database_url: str):
+    """До импорта приложения: своя БД, без фоновых пересчётов и кэша прогнозов."""
+    os.environ["DATABASE_URL"] = database_url
+    os.environ.pop("ASYNC_DATABASE_URL", None)
+    os.environ["FORECAST_SNAPSHOT_ON_INGEST"] = "0"
+    os.environ["FORECAST_SNAPSHOT_INTERVAL"] = "0"
+    os.environ["PREDICTION_CACHE_SIZE"] = "0"
+    # массив погоды — в памяти процесса: временные базы не оставляют файлов в общем каталоге
+    os.environ["WEATHER_STORE_DIR"] = ""
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки прогноза, загрузки и дашборда")
+    parser.add_argument("--piles", type=_int_list, default=[100, 1000], help="размеры склада через запятую")
+    parser.add_argument("--days", type=_int_list, default=[90, 365], help="длины истории через запятую")
+    parser.add_argument("--every", type=int, default=3, help="замер температуры каждые N дней")
+    parser.add_argument("--windows", type=_int_list, default=[7, 30], help="окна дашборда, дней")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--single-limit", type=int, default=300,
+                        help="на скольких штабелях мерить одиночный predict_ignition_risk")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--database-url", default=None, help="по умолчанию — временная SQLite")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="coal_bench_")
+    database_url = args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    configure_environment(database_url)
+
+    from benchmarks import cases  # noqa: E402 — после настройки окружения
+
+    commit = git_commit()
+    report = {
+        "meta": {
+            "commit": commit,
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "dialect": cases.engine.dialect.name,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "params": {k: v for k, v in vars(args).items() if k not in ("database_url", "output")},
+        },
+        "results": [],
+    }
+
+    try:
+        with cases.client() as client:
+            for piles in args.piles:
+                for days in args.days:
+                    print(f"🏭 {piles} штабелей, {days} дней истории")
+                    started = time.perf_counter()
+                    yard = generate_yard(piles, days, reading_every_days=args.every, seed=args.seed)
+                    paths = write_yard(yard, os.path.join(workdir, f"yard_{piles}_{days}"))
+                    cases.reset_database()
+
+                    upload = cases.bench_upload(client, paths)
+                    predictor = cases.bench_predictor(args.single_limit, args.repeats)
+                    dashboard = cases.bench_dashboard(client, yard["period"][1], args.windows, args.repeats)
+                    report["results"].append({
+                        "piles": piles,
+                        "history_days": days,
+                        "rows": {kind: len(yard[kind]) for kind in cases.UPLOAD_ORDER},
+                        "upload": upload,
+                        "predictor": predictor,
+                        "dashboard": dashboard,
+                    })
+
+                    for kind, stats in upload.items():
+                        print(f"  upload {kind}: {stats['rows']} строк, {stats['rows_per_sec']} строк/с")
+                    print(f"  predict: batch {predictor['batch']['rows_per_sec']} строк/с, "
+                          f"single {predictor['single']['rows_per_sec']} строк/с (×{predictor['batch_speedup']})")
+                    for window, stats in dashboard.items():
+                        print(f"  dashboard {window}: median {stats['median_ms']} мс, p95 {stats['p95_ms']} мс")
+                    print(f"  ⏱ {time.perf_counter() - started:.1f} с")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}-{commit}-{report['meta']['dialect']}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"✅ Результаты: {output}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
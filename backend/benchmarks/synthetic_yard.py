@@ -0,0 +1,172 @@
+# benchmarks/synthetic_yard.py
+"""
+Синтетический угольный склад в формате исходных CSV из app/data:
+temperature.csv, fires.csv, supplies.csv и weather_data_<год>.csv.
+
+Штабель формируется в случайный день истории, греется с индивидуальной скоростью
+(плюс сезонная погода и шум), замеры идут раз в reading_every_days дней попеременно
+в сменах 219/921. Когда температура превышает порог штабеля — возгорание, замеры
+по штабелю прекращаются.
+
+    python -m benchmarks.synthetic_yard --piles 1000 --days 365 --out /tmp/yard
+"""
+import argparse
+import os
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+WAREHOUSES = [3, 4, 6]
+GRADES = ["A1", "A1-КТК", "A1-ГЕН-", "A1-СА-", "A1-КРУ", "B2", "E5"]
+CARGO_NAMES = ["A1", "C3", "E5"]
+SHIFTS = [219, 921]
+WEATHER_CODES = [0, 1, 2, 3, 51, 53, 61, 63, 71]
+DEFAULT_START = date(2020, 1, 1)
+
+
+def _seasonal_temp(days: np.ndarray) -> np.ndarray:
+    """Среднесуточная температура воздуха по дню года: около -5 °C зимой, +25 °C летом."""
+    return 10.0 - 15.0 * np.cos(2 * np.pi * (days - 15) / 365.25)
+
+
+def generate_weather(start: date, history_days: int, rng: np.random.Generator) -> pd.DataFrame:
+    hours = pd.date_range(start, periods=history_days * 24, freq="h")
+    n = len(hours)
+    doy = hours.dayofyear.to_numpy()
+    diurnal = 4.0 * np.sin(2 * np.pi * (hours.hour.to_numpy() - 9) / 24)
+    v_avg = rng.gamma(4.0, 4.0, n).round(1)
+    rainy = rng.random(n) < 0.12
+    return pd.DataFrame({
+        "date": hours.strftime("%Y-%m-%d %H:%M:%S"),
+        "t": (_seasonal_temp(doy) + diurnal + rng.normal(0, 2.5, n)).round(1),
+        "p": rng.normal(1015, 8, n).round(1),
+        "humidity": np.clip(rng.normal(75, 12, n), 27, 100).astype(int),
+        "precipitation": np.where(rainy, rng.exponential(1.2, n), 0.0).round(1),
+        "wind_dir": rng.integers(1, 361, n),
+        "v_avg": v_avg,
+        "v_max": (v_avg * rng.uniform(1.3, 1.8, n)).round(1),
+        "cloudcover": rng.integers(0, 101, n),
+        "visibility": "",
+        "weather_code": rng.choice(WEATHER_CODES, n),
+    })
+
+
+def generate_yard(piles: int = 100, history_days: int = 365, start: date = DEFAULT_START,
+                  reading_every_days: int = 3, seed: int = 0) -> dict:
+    """Сырые таблицы склада: {"temperature", "fires", "supplies", "weather"} → DataFrame с колонками исходных CSV."""
+    rng = np.random.default_rng(seed)
+    end = start + timedelta(days=history_days - 1)
+
+    warehouse = rng.choice(WAREHOUSES, piles)
+    pile_id = np.arange(1, piles + 1)
+    grade = rng.choice(GRADES, piles)
+    # часть штабелей сформирована ещё до начала истории
+    formed_offset = rng.integers(-60, history_days, piles)
+    lifetime = rng.integers(30, 150, piles)
+    heat_rate = rng.uniform(0.15, 1.6, piles)          # °C в сутки
+    ignition_at = rng.uniform(70, 130, piles)          # порог возгорания, °C
+
+    # замеры: день первого замера — max(формирование, начало истории)
+    first = np.maximum(formed_offset, 0)
+    last = np.minimum(formed_offset + lifetime, history_days - 1)
+    counts = np.maximum((last - first) // reading_every_days + 1, 0)
+    owner = np.repeat(np.arange(piles), counts)
+    step = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    day = first[owner] + step * reading_every_days
+    age = day - formed_offset[owner]
+    temp = (
+        12.0
+        + 0.35 * _seasonal_temp(day + pd.Timestamp(start).dayofyear)
+        + heat_rate[owner] * age
+        + rng.normal(0, 3.0, len(day))
+    ).round(1)
+
+    # после первого превышения порога штабель горит — дальнейших замеров нет
+    exceeded = temp > ignition_at[owner]
+    burned_before = pd.Series(exceeded).groupby(owner).cumsum().to_numpy() - exceeded
+    keep = burned_before == 0
+    fire_rows = np.flatnonzero(exceeded & keep)
+
+    dates = pd.Timestamp(start) + pd.to_timedelta(day, unit="D")
+    temperature = pd.DataFrame({
+        "Склад": warehouse[owner],
+        "Штабель": pile_id[owner],
+        "Марка": grade[owner],
+        "Максимальная температура": temp,
+        "Пикет": [f"{w}0{p % 90:02d}-{w}0{p % 90 + 12:02d}" for w, p in zip(warehouse[owner], pile_id[owner])],
+        "Дата акта": dates.strftime("%Y-%m-%d"),
+        "Смена": np.array(SHIFTS)[step % 2],
+    })[keep]
+
+    formed_at = pd.Timestamp(start) + pd.to_timedelta(formed_offset, unit="D")
+    fire_owner = owner[fire_rows]
+    fire_start = dates[fire_rows] + pd.Timedelta(hours=9)
+    fires = pd.DataFrame({
+        "Дата составления": fire_start.strftime("%Y-%m-%d"),
+        "Груз": grade[fire_owner],
+        "Вес по акту, тн": rng.uniform(20, 400, len(fire_rows)).round(1),
+        "Склад": warehouse[fire_owner],
+        "Дата начала": fire_start.strftime("%Y-%m-%d %H:%M:%S"),
+        "Дата оконч.": (fire_start + pd.Timedelta(hours=12)).strftime("%Y-%m-%d %H:%M:%S"),
+        "Нач.форм.штабеля": formed_at[fire_owner].strftime("%Y-%m-%d %H:%M:%S"),
+        "Штабель": pile_id[fire_owner],
+    })
+
+    tonnage = rng.uniform(500, 15000, piles).round(4)
+    supplies = pd.DataFrame({
+        "ВыгрузкаНаСклад": formed_at.strftime("%Y-%m-%d"),
+        "Наим. ЕТСНГ": rng.choice(CARGO_NAMES, piles),
+        "Штабель": pile_id,
+        "ПогрузкаНаСудно": (formed_at + pd.to_timedelta(lifetime, unit="D")).strftime("%Y-%m-%d"),
+        "На склад, тн": tonnage,
+        "На судно, тн": tonnage,
+        "Склад": warehouse,
+    })
+
+    return {
+        "temperature": temperature,
+        "fires": fires,
+        "supplies": supplies,
+        "weather": generate_weather(start, history_days, rng),
+        "period": (start, end),
+    }
+
+
+def write_yard(yard: dict, out_dir: str) -> dict:
+    """CSV под именами, по которым /upload-csv определяет тип файла. Возвращает {тип: [пути]}."""
+    os.makedirs(out_dir, exist_ok=True)
+    paths = {}
+    for kind in ("temperature", "fires", "supplies"):
+        path = os.path.join(out_dir, f"{kind}.csv")
+        yard[kind].to_csv(path, index=False)
+        paths[kind] = [path]
+
+    weather = yard["weather"]
+    paths["weather"] = []
+    for year, part in weather.groupby(weather["date"].str[:4]):
+        path = os.path.join(out_dir, f"weather_data_{year}.csv")
+        part.to_csv(path, index=False)
+        paths["weather"].append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Синтетический склад в формате CSV из app/data")
+    parser.add_argument("--piles", type=int, default=100)
+    parser.add_argument("--days", type=int, default=365, help="длина истории, дней")
+    parser.add_argument("--start", type=date.fromisoformat, default=DEFAULT_START)
+    parser.add_argument("--every", type=int, default=3, help="замер каждые N дней")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", required=True, help="каталог для CSV")
+    args = parser.parse_args()
+
+    yard = generate_yard(args.piles, args.days, args.start, args.every, args.seed)
+    paths = write_yard(yard, args.out)
+    for kind, files in paths.items():
+        print(f"  {kind}: {len(yard[kind])} строк, файлов {len(files)}")
+    print(f"✅ Склад из {args.piles} штабелей за {args.days} дней записан в {args.out}")
+
+
+if __name__ == "__main__":
+    main()
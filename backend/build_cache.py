@@ -0,0 +1,14 @@
+# build_cache.py
+# Конвертация CSV из app/data в Parquet-кэш (пересобираются только изменившиеся файлы):
+#   python build_cache.py [--force]
+import sys
+
+from app.services.parquet_cache import build_cache, PARQUET_CACHE_DIR
+
+
+if __name__ == "__main__":
+    result = build_cache(force="--force" in sys.argv)
+    for source in result["converted"]:
+        print(f"  {source}: сконвертирован")
+    print(f"✅ Parquet-кэш в {PARQUET_CACHE_DIR}: сконвертировано {len(result['converted'])}, "
+          f"без изменений {len(result['fresh'])}, {result['seconds']} с")
@@ -1,15 +1,164 @@
 # init_db.py
+import argparse
+
+from sqlalchemy import delete, func, inspect, select, text
+from sqlmodel import SQLModel
+
 from app.database import engine
-from app.models.db_models import CurrentStockpile, ActualFire, Temperature, FireEvent, Weather, Supply
+from app.models.db_models import CurrentStockpile, ActualFire, Temperature, FireEvent, Weather, Supply, WeatherDaily, ForecastSnapshot, PredictionLog, MetricsCounter
+from app.services.ingest import KEEP_MAX_COLUMNS, natural_key
+from app.services.partitions import create_partitioned_tables, partition_existing_tables
+from app.services.weather_rollup import refresh_weather_daily
+from app.services.weather_store import weather_store
+
+
+def add_weather_date_column():
+    """Добавляет вычисляемую колонку weather_date в уже существующую таблицу weather (PostgreSQL)."""
+    if engine.dialect.name != "postgresql":
+        return
+    with engine.begin() as conn:
+        conn.execute(text(
+            "ALTER TABLE weather ADD COLUMN IF NOT EXISTS weather_date date "
+            "GENERATED ALWAYS AS (date(datetime)) STORED"
+        ))
+
+
+def add_weather_v_max_column():
+    """Добавляет колонку v_max (порывы ветра) в таблицу weather, созданную до её появления."""
+    inspector = inspect(engine)
+    if not inspector.has_table("weather"):
+        return
+    if "v_max" in {c["name"] for c in inspector.get_columns("weather")}:
+        return
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE weather ADD COLUMN v_max FLOAT"))
+    print("  weather: добавлена колонка v_max — порывы заполнятся при повторной загрузке погоды")
+
+
+def _tables_missing_unique_key():
+    """(таблица, естественный ключ) для существующих таблиц, где уникального индекса по ключу ещё нет."""
+    inspector = inspect(engine)
+    for table in SQLModel.metadata.sorted_tables:
+        key = natural_key(table)
+        if key is None or not inspector.has_table(table.name):
+            continue
+        unique_names = {i.name for i in table.indexes if i.unique}
+        if unique_names & {i["name"] for i in inspector.get_indexes(table.name)}:
+            continue
+        yield table, key
+
+
+def deduplicate_natural_keys(apply: bool = False) -> set:
+    """
+    Дубли по естественному ключу, накопленные до появления уникальных индексов
+    (повторные /upload-csv и load_db.py). Печатает, сколько строк будет удалено и
+    примеры ключей; удаляет только при apply=True (python init_db.py --dedupe).
+    Для температуры остаётся максимальный замер. Возвращает таблицы, где дубли остались.
+    """
+    remaining = set()
+    for table, key in _tables_missing_unique_key():
+        key_columns = [table.c[c] for c in key]
+        groups = select(*key_columns, func.count().label("n")).group_by(*key_columns).having(func.count() > 1)
+        with engine.connect() as conn:
+            extra = conn.execute(select(func.sum(groups.subquery().c.n - 1))).scalar() or 0
+            examples = conn.execute(groups.order_by(func.count().desc()).limit(5)).all()
+        if not extra:
+            continue
+        print(f"  {table.name}: дублей по ключу ({', '.join(key)}) — лишних строк {extra}, например:")
+        for *values, n in examples:
+            print(f"    {tuple(values)} × {n}")
+        if not apply:
+            remaining.add(table.name)
+            continue
+
+        keep_max = KEEP_MAX_COLUMNS.get(table.name)
+        order_by = [table.c[keep_max].desc(), table.c.id] if keep_max else [table.c.id]
+        rn = func.row_number().over(partition_by=key_columns, order_by=order_by).label("rn")
+        ranked = select(table.c.id, rn).subquery()
+        duplicates = select(ranked.c.id).where(ranked.c.rn > 1)
+        with engine.begin() as conn:
+            removed = conn.execute(delete(table).where(table.c.id.in_(duplicates))).rowcount
+        print(f"  {table.name}: удалено дублей {removed}")
+    return remaining
+
 
-def create_tables():
+def recreate_outdated_snapshot_table():
+    """Снимки прогноза пересчитываются заново — таблицу старой схемы проще пересоздать."""
+    table = ForecastSnapshot.__table__
+    inspector = inspect(engine)
+    if not inspector.has_table(table.name):
+        return
+    existing = {c["name"] for c in inspector.get_columns(table.name)}
+    if set(table.c.keys()) - existing:
+        table.drop(engine)
+        table.create(engine)
+        print(f"  {table.name}: таблица пересоздана под новую схему")
+
+
+def partition_tables(skip: set = frozenset()):
+    """Переводит на секции по времени weather/temperature, созданные до секционирования (PostgreSQL)."""
+    for name, rows in partition_existing_tables(engine, skip).items():
+        print(f"  {name}: таблица секционирована, перенесено строк {rows}")
+
+
+def create_indexes(skip_unique: set = frozenset()):
+    """
+    create_all не трогает существующие таблицы — индексы для них создаём отдельно.
+    skip_unique — таблицы с дублями: уникальный индекс на них не построится.
+    """
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            if index.unique and table.name in skip_unique:
+                print(f"  {table.name}: уникальный индекс {index.name} не создан — есть дубли, "
+                      f"запустите python init_db.py --dedupe")
+                continue
+            index.create(engine, checkfirst=True)
+
+
+def backfill_weather_daily():
+    """Первичное заполнение WeatherDaily, если погода загружалась до появления таблицы."""
+    with engine.begin() as conn:
+        if conn.execute(select(func.count()).select_from(WeatherDaily.__table__)).scalar():
+            return
+        days = refresh_weather_daily(conn)
+    if days:
+        print(f"  weatherdaily: пересчитано дней {days}")
+
+
+def create_tables(dedupe: bool = False):
+    """Создаёт недостающие таблицы и индексы; dedupe — удалить дубли по естественному ключу."""
+    # на PostgreSQL weather и temperature создаются секционированными, create_all их пропустит
+    for name in create_partitioned_tables(engine):
+        print(f"  {name}: создана секционированная таблица")
     CurrentStockpile.metadata.create_all(engine)
     ActualFire.metadata.create_all(engine)
     Temperature.metadata.create_all(engine)
     FireEvent.metadata.create_all(engine)
     Weather.metadata.create_all(engine)
     Supply.metadata.create_all(engine)  # ← добавь эту строку
-    print("✅ Все таблицы созданы.")
+    WeatherDaily.metadata.create_all(engine)
+    ForecastSnapshot.metadata.create_all(engine)
+    PredictionLog.metadata.create_all(engine)
+    MetricsCounter.metadata.create_all(engine)
+    add_weather_date_column()
+    add_weather_v_max_column()
+    recreate_outdated_snapshot_table()
+    with_duplicates = deduplicate_natural_keys(apply=dedupe)
+    partition_tables(skip=with_duplicates)
+    create_indexes(skip_unique=with_duplicates)
+    backfill_weather_daily()
+    # дедупликация и перенос в секции меняют weather — общий массив погоды пересобирается
+    weather_store.invalidate()
+    print("✅ Все таблицы и индексы созданы.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Создание таблиц и индексов")
+    parser.add_argument("--dedupe", action="store_true",
+                        help="удалить дубли по естественному ключу (без флага они только выводятся)")
+    args = parser.parse_args()
+    create_tables(dedupe=args.dedupe)
+
 
 if __name__ == "__main__":
-    create_tables()
\ No newline at end of file
+    main()
@@ -1,2 +1,41 @@
-from app.services.data_loader import load_csv_to_db
-load_csv_to_db()
\ No newline at end of file
+# load_db.py
+# Загрузка CSV из app/data в БД: векторная очистка, проверка по правилам и одна
+# bulk-запись на набор; наборы грузятся параллельно.
+#   python load_db.py                          — temperature и fires (как раньше)
+#   python load_db.py weather supplies         — любые наборы
+#   python load_db.py --all --rejects rejects  — всё, отбракованные строки в rejects/<набор>_rejects.csv
+# supplies не имеет естественного ключа: повторная загрузка допишет строки ещё раз.
+import argparse
+
+from app.services.data_loader import LOADABLE_DATASETS, load_datasets
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Загрузка CSV в БД")
+    parser.add_argument("datasets", nargs="*", metavar="набор",
+                        help=f"какие наборы грузить: {', '.join(LOADABLE_DATASETS)}")
+    parser.add_argument("--all", action="store_true", help="загрузить все наборы")
+    parser.add_argument("--workers", type=int, default=None, help="сколько наборов грузить одновременно")
+    parser.add_argument("--rejects", metavar="DIR", default=None,
+                        help="каталог для CSV с отбракованными строками и причинами")
+    args = parser.parse_args()
+    unknown = sorted(set(args.datasets) - set(LOADABLE_DATASETS))
+    if unknown:
+        parser.error(f"неизвестные наборы: {', '.join(unknown)}")
+
+    kinds = LOADABLE_DATASETS if args.all else (args.datasets or ["temperature", "fires"])
+    results = load_datasets(kinds, workers=args.workers, rejects_dir=args.rejects)
+
+    for name, stats in results.items():
+        print(f"  {name}: добавлено {stats['inserted_rows']}, обновлено {stats['updated_rows']}, "
+              f"отбраковано {stats['rejected_rows']}, {stats['rows_per_sec']} строк/с, "
+              f"{stats['total_seconds']} с")
+        for rule, count in stats["rejects"].items():
+            print(f"    ⚠️ {rule}: {count}")
+        if stats.get("rejects_file"):
+            print(f"    отбракованные строки: {stats['rejects_file']}")
+    print("✅ Данные загружены в БД")
+
+
+if __name__ == "__main__":
+    main()
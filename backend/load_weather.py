@@ -0,0 +1,35 @@
+# load_weather.py
+# Загрузка архива погоды: файлы разбираются параллельно, каждый год — своя транзакция.
+#   python load_weather.py                                 — все weather_data_*.csv из app/data
+#   python load_weather.py app/data "archive/weather_*.csv" --workers 4 --rejects rejects
+import argparse
+
+from app.services.parquet_cache import DATA_DIR
+from app.services.weather_loader import WEATHER_WORKERS, load_weather_files, weather_files
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Загрузка погоды из нескольких CSV")
+    parser.add_argument("sources", nargs="*", default=[DATA_DIR], metavar="путь",
+                        help="каталоги, glob-шаблоны или файлы (по умолчанию app/data)")
+    parser.add_argument("--workers", type=int, default=WEATHER_WORKERS,
+                        help="сколько файлов разбирать одновременно (по умолчанию — по числу CPU)")
+    parser.add_argument("--rejects", metavar="DIR", default=None,
+                        help="каталог для CSV с отбракованными строками и причинами")
+    args = parser.parse_args()
+
+    files = weather_files(*args.sources)
+    if not files:
+        parser.error("не найдено ни одного файла погоды")
+    print(f"📂 Файлов погоды: {len(files)}")
+    stats = load_weather_files(files, workers=args.workers, rejects_dir=args.rejects)
+
+    for rule, count in stats["rejects"].items():
+        print(f"    ⚠️ {rule}: {count}")
+    print(f"✅ Погода загружена за {stats['years']} г.: добавлено {stats['inserted_rows']}, "
+          f"обновлено {stats['updated_rows']}, дублей на стыках файлов {stats['duplicate_rows']}, "
+          f"отбраковано {stats['rejected_rows']}, {stats['seconds']} с ({stats['rows_per_sec']} строк/с)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+# manage_partitions.py
+# Секции weather/temperature на PostgreSQL:
+#   python manage_partitions.py list
+#   python manage_partitions.py detach weather 2015-01-01          — отсоединить в архивную таблицу weather_y2015
+#   python manage_partitions.py detach temperature 2020-01-01 --drop — отсоединить и удалить
+import argparse
+from datetime import date
+
+from app.database import engine
+from app.services.partitions import PARTITION_KEYS, detach_partition, is_partitioned, list_partitions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Секции таблиц погоды и температуры")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="секции, их границы и примерное число строк")
+    detach = commands.add_parser("detach", help="отсоединить секцию периода")
+    detach.add_argument("table", choices=sorted(PARTITION_KEYS))
+    detach.add_argument("period", type=date.fromisoformat, help="любая дата периода, YYYY-MM-DD")
+    detach.add_argument("--drop", action="store_true", help="удалить отсоединённую секцию")
+    args = parser.parse_args()
+
+    with engine.begin() as conn:
+        if args.command == "list":
+            for table in sorted(PARTITION_KEYS):
+                if not is_partitioned(conn, table):
+                    print(f"{table}: без секций")
+                    continue
+                print(f"{table}:")
+                for part in list_partitions(conn, table):
+                    print(f"  {part['name']}: {part['bounds']}, ~{part['rows']} строк")
+        else:
+            name = detach_partition(conn, args.table, args.period, drop=args.drop)
+            print(f"✅ Секция {name} {'удалена' if args.drop else 'отсоединена (таблица ' + name + ')'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+# run_forecast.py
+# Пересчёт снимка прогноза для дашборда (например, из cron после загрузки данных):
+#   python run_forecast.py [дней]
+import sys
+
+from app.services.forecast_job import run_forecast_snapshot, FORECAST_SNAPSHOT_DAYS
+
+
+def main():
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else FORECAST_SNAPSHOT_DAYS
+    stats = run_forecast_snapshot(days)
+    if stats is None:
+        print("⏳ Пересчёт уже выполняется")
+    elif not stats["rows"]:
+        print("⚠️ Нет данных для прогноза, снимок не создан")
+    else:
+        print(f"✅ Снимок прогноза {stats['generated_at']}: {stats['period']}, "
+              f"штабелей {stats['piles']}, строк {stats['rows']}, {stats['seconds']} с")
+
+
+if __name__ == "__main__":
+    main()
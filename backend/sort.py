@@ -1,18 +1,13 @@
-import pandas as pd
+from app.services.parquet_cache import read_dataset
 
-# Загружаем CSV-файл
-df = pd.read_csv('app/data/temperature.csv')
-
-# Удалим лишние пробелы в названиях колонок (на всякий случай)
-df.columns = df.columns.str.strip()
+# Загружаем temperature.csv из Parquet-кэша (типы уже разобраны, названия колонок без пробелов)
+df = read_dataset('temperature')
 
 # Пример 1: Сортировка по максимальной температуре по убыванию
 df_sorted = df.sort_values(by='Максимальная температура', ascending=False)
 
 # Пример 2: Сортировка по дате и затем по температуре
-# Сначала убедимся, что столбец 'Дата акта' имеет тип datetime
-df['Дата акта'] = pd.to_datetime(df['Дата акта'])
-
+# ('Дата акта' в кэше уже datetime)
 df_sorted = df.sort_values(by=['Дата акта', 'Максимальная температура'], ascending=[True, False])
 
 # Если нужно — сохранить результат в новый CSV
@@ -0,0 +1,37 @@
+# tests/conftest.py
+import os
+import tempfile
+
+# До импорта приложения: своя временная SQLite, без фоновых пересчётов, кэша прогнозов
+# и общих файлов в /tmp (как в benchmarks/run.py)
+_TMP_DIR = tempfile.mkdtemp(prefix="coal_tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TMP_DIR, 'test.db')}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ["FORECAST_SNAPSHOT_ON_INGEST"] = "0"
+os.environ["FORECAST_SNAPSHOT_INTERVAL"] = "0"
+os.environ["PREDICTION_CACHE_SIZE"] = "0"
+os.environ["WEATHER_STORE_DIR"] = ""
+os.environ["PARQUET_CACHE_DIR"] = os.path.join(_TMP_DIR, "parquet")
+os.environ["MODEL_EAGER_LOAD"] = "0"
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import contextlib
+import io
+
+import pytest
+
+
+@pytest.fixture
+def db():
+    """Пустая схема на каждый тест (как init_db.py); возвращает sync-движок."""
+    from sqlmodel import SQLModel
+
+    from app.database import engine
+    from app.services.weather_store import weather_store
+    from init_db import create_tables
+
+    SQLModel.metadata.drop_all(engine)
+    with contextlib.redirect_stdout(io.StringIO()):
+        create_tables()
+    weather_store.invalidate()
+    yield engine
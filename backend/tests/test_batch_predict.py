@@ -0,0 +1,62 @@
+# tests/test_batch_predict.py
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+ROW = {
+    "Склад": 4, "Штабель": 46, "Марка": "A1", "Максимальная_температура": 65.0, "Смена": 219,
+    "t": 20.0, "p": 1013.25, "humidity": 70, "precipitation": 0.0, "wind_dir": 0, "v_avg": 5.0,
+    "v_max": 7.5, "cloudcover": 50, "weather_code": 0, "Наим_ЕТСНГ": "A1", "На_склад_тн": 0.0,
+    "На_судно_тн": 0.0, "Склад_supply": 4, "ДниСНачалаФормирования": 120,
+}
+
+
+@pytest.fixture
+def client(db):
+    with TestClient(app) as client:
+        yield client
+
+
+def _lines(response):
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_bad_rows_are_reported_in_place_and_do_not_fail_the_batch(client):
+    without_t = {k: v for k, v in ROW.items() if k != "t"}
+    rows = [ROW, dict(ROW, Смена="x"), without_t, "oops", dict(ROW, current_date="2025-13-01"), dict(ROW, Штабель=47)]
+    lines = _lines(client.post("/api/predict/batch", json=rows))
+
+    *results, summary = lines
+    assert [r["row"] for r in results] == list(range(len(rows)))
+    assert [r["status"] for r in results] == ["ok", "error", "error", "error", "error", "ok"]
+    for result in results:
+        if result["status"] == "error":
+            assert result["errors"] and all(isinstance(e, str) for e in result["errors"])
+        else:
+            assert "predicted_days_to_fire" in result
+    assert any("Смена" in e for e in results[1]["errors"])
+    assert any("t" in e for e in results[2]["errors"])
+    assert any("current_date" in e for e in results[4]["errors"])
+    assert summary["summary"]["rows"] == len(rows)
+    assert summary["summary"]["scored"] == 2
+    assert summary["summary"]["errors"] == 4
+
+
+def test_batch_result_matches_single_prediction(client):
+    single = client.post("/api/predict", json=ROW).json()
+    first, _ = _lines(client.post("/api/predict/batch", json=[ROW]))
+    assert {k: v for k, v in first.items() if k not in ("row", "status")} == single
+
+
+def test_broken_ndjson_line_is_a_row_error(client):
+    body = json.dumps(ROW, ensure_ascii=False) + "\n{bad json\n"
+    lines = _lines(client.post(
+        "/api/predict/batch", content=body.encode(), headers={"content-type": "application/x-ndjson"}
+    ))
+    assert [line.get("status") for line in lines[:2]] == ["ok", "error"]
+    assert lines[1]["errors"]
@@ -0,0 +1,87 @@
+# tests/test_calendar.py
+from datetime import date, datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+
+from app.main import app
+from app.models.db_models import ForecastSnapshot
+from app.services import forecast_job
+
+
+@pytest.fixture
+def client(db):
+    with TestClient(app) as client:
+        yield client
+
+
+def _snapshot(engine, days):
+    generated_at = datetime(2021, 1, 1, 12)
+    rows = [{
+        "generated_at": generated_at, "warehouse": 4, "pile_id": "46", "forecast_day": day,
+        "predicted_days_to_fire": 1.5, "predicted_ignition_date": datetime(2021, 1, day.day + 1),
+        "predicted_date": date(2021, 1, day.day + 1), "risk_level": "Высокий", "message": "", "model_version": "test",
+    } for day in days]
+    with engine.begin() as conn:
+        conn.execute(insert(ForecastSnapshot.__table__), rows)
+
+
+def test_empty_yard_returns_empty_calendar_and_schedules_snapshot(client, monkeypatch):
+    runs = []
+    monkeypatch.setattr("app.api.routes.run_forecast_snapshot_safe", lambda: runs.append(1))
+
+    response = client.get("/api/calendar", params={"start": "2021-01-01", "end": "2021-01-10"})
+
+    assert response.status_code == 200
+    assert response.json()["generated_at"] is None
+    assert response.json()["high_risk_days"] == []
+    assert runs == [1]
+
+
+def test_empty_yard_snapshot_does_not_fail(client):
+    response = client.get("/api/calendar", params={"start": "2021-01-01", "end": "2021-01-10"})
+
+    assert response.status_code == 200
+    assert forecast_job.run_forecast_snapshot() == {"rows": 0}
+
+
+def test_range_outside_snapshot_window_is_rejected(client, db):
+    # прогноз на 2–5 января, даты возгорания — 3–6 января
+    _snapshot(db, [date(2021, 1, d) for d in range(2, 6)])
+
+    inside = client.get("/api/calendar", params={"start": "2021-01-03", "end": "2021-01-06"})
+    outside = client.get("/api/calendar", params={"start": "2021-01-02", "end": "2021-01-06"})
+
+    assert inside.status_code == 200
+    assert inside.json()["window"] == {"start": "2021-01-03", "end": "2021-01-06"}
+    # дата возгорания после последнего дня прогноза тоже в календаре
+    assert [day["date"] for day in inside.json()["high_risk_days"]][-1] == "2021-01-06"
+    assert inside.json()["total"] == 4
+    assert outside.status_code == 422
+    assert "2021-01-03 — 2021-01-06" in outside.json()["detail"]
+
+
+def test_day_split_across_pages_reports_full_count(client, db):
+    generated_at = datetime(2021, 1, 1, 12)
+    rows = [{
+        "generated_at": generated_at, "warehouse": 4, "pile_id": pile, "forecast_day": date(2021, 1, 2),
+        "predicted_days_to_fire": 1.5, "predicted_ignition_date": datetime(2021, 1, day),
+        "predicted_date": date(2021, 1, day), "risk_level": "Высокий", "message": "", "model_version": "test",
+    } for day, pile in [(3, "1"), (3, "2"), (3, "3"), (4, "1")]]
+    with db.begin() as conn:
+        conn.execute(insert(ForecastSnapshot.__table__), rows)
+    params = {"start": "2021-01-03", "end": "2021-01-04", "limit": 2}
+
+    first = client.get("/api/calendar", params=params).json()
+    second = client.get("/api/calendar", params={**params, "offset": first["next_offset"]}).json()
+
+    assert first["total"] == second["total"] == 4
+    assert first["high_risk_days"] == [{"date": "2021-01-03", "count": 3, "piles": [
+        {"warehouse": 4, "pile_id": p, "predicted_days_to_fire": 1.5, "first_forecast_day": "2021-01-02"}
+        for p in ("1", "2")
+    ]}]
+    assert [(d["date"], d["count"], len(d["piles"])) for d in second["high_risk_days"]] == [
+        ("2021-01-03", 3, 1), ("2021-01-04", 1, 1)
+    ]
+    assert second["next_offset"] is None
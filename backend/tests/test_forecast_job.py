@@ -0,0 +1,77 @@
+# tests/test_forecast_job.py
+import subprocess
+import sys
+
+import pandas as pd
+from sqlalchemy import func, select
+
+from app.models.db_models import ForecastSnapshot, PredictionLog
+from app.services import forecast_job, horizon
+from app.services.ingest import ingest_frame
+
+WEATHER_CSV = [
+    ["date", "t", "p", "humidity", "precipitation", "wind_dir", "v_avg", "v_max", "cloudcover", "visibility", "weather_code"],
+    ["2021-01-01 00:00:00", "11.6", "1016.2", "89", "0.0", "140", "19.4", "24.1", "77", "", "2"],
+    ["2021-01-01 01:00:00", "11.7", "1015.9", "88", "0.0", "149", "19.4", "24.5", "86", "", "3"],
+]
+TEMPERATURE_CSV = [
+    ["Склад", "Штабель", "Марка", "Макс.темп", "Пикет", "Дата", "Смена"],
+    ["4", "46", "A1", "30", "1", "2020-12-30", "1"],
+]
+
+
+def _load(engine, kind, rows):
+    with engine.begin() as conn:
+        ingest_frame(conn, kind, pd.DataFrame(rows))
+
+
+def _count(engine, model):
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(model)).scalar()
+
+
+def test_weather_only_yard_writes_no_snapshot(db):
+    _load(db, "weather", WEATHER_CSV)
+
+    assert forecast_job.run_forecast_snapshot(days=3) == {"rows": 0}
+    assert _count(db, ForecastSnapshot) == 0
+    assert _count(db, PredictionLog) == 0
+
+
+def test_empty_database_writes_no_snapshot(db):
+    assert forecast_job.run_forecast_snapshot(days=3) == {"rows": 0}
+    assert _count(db, ForecastSnapshot) == 0
+
+
+def test_no_predictions_keeps_previous_snapshot(db, monkeypatch):
+    _load(db, "weather", WEATHER_CSV)
+    _load(db, "temperature", TEMPERATURE_CSV)
+
+    def broken(frame):
+        raise RuntimeError("модель недоступна")
+
+    monkeypatch.setattr(horizon, "predict_ignition_risk_batch", broken)
+
+    assert forecast_job.run_forecast_snapshot(days=3) == {"rows": 0}
+    assert _count(db, ForecastSnapshot) == 0
+    # блокировка снята — следующий пересчёт не пропускается
+    assert forecast_job.run_forecast_snapshot(days=3) == {"rows": 0}
+
+
+def test_snapshot_running_in_another_process_is_skipped(db):
+    # другой процесс (второй воркер или run_forecast.py) держит блокировку пересчёта
+    holder = subprocess.Popen([sys.executable, "-c", (
+        "import fcntl, sys\n"
+        "f = open(sys.argv[1], 'a')\n"
+        "fcntl.flock(f, fcntl.LOCK_EX)\n"
+        "print('locked', flush=True)\n"
+        "sys.stdin.read()\n"
+    ), forecast_job._lock_path(db.url)], stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    try:
+        assert holder.stdout.readline().strip() == "locked"
+        assert forecast_job.run_forecast_snapshot(days=3) is None
+    finally:
+        holder.stdin.close()
+        holder.wait(timeout=10)
+
+    assert forecast_job.run_forecast_snapshot(days=3) == {"rows": 0}
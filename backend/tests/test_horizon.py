@@ -0,0 +1,50 @@
+# tests/test_horizon.py
+from datetime import date
+
+import pandas as pd
+
+from app.services import horizon
+
+
+def _features(piles):
+    return pd.DataFrame({
+        "warehouse": [3] * len(piles),
+        "pile_id": piles,
+        "ДниСНачалаФормирования": [10] * len(piles),
+        "t": 5.0, "p": 1000.0, "humidity": 70, "precipitation": 0.0,
+        "wind_dir": 0, "v_avg": 4.0, "v_max": 6.0, "cloudcover": 50, "weather_code": 0,
+    })
+
+
+def _fake_predict(broken_pile):
+    def predict(frame):
+        if (frame["pile_id"] == broken_pile).any():
+            raise ValueError("сломанный штабель")
+        return [{
+            "predicted_ignition_date": f"{d}T00:00:00",
+            "predicted_days_to_fire": 3.0,
+            "risk_level": "high",
+            "message": "",
+            "model_version": "test",
+        } for d in frame["current_date"]]
+    return predict
+
+
+def test_failing_pile_is_skipped_not_the_whole_grid(monkeypatch):
+    monkeypatch.setattr(horizon, "predict_ignition_risk_batch", _fake_predict("2"))
+    days = [date(2021, 1, 1), date(2021, 1, 2)]
+
+    grid = horizon.forecast_horizon(_features(["1", "2", "3"]), days, pd.DataFrame(), date(2020, 12, 31))
+
+    assert sorted(grid["pile_id"].unique()) == ["1", "3"]
+    assert len(grid) == 4
+    assert grid["risk_level"].eq("high").all()
+
+
+def test_all_piles_failing_gives_empty_grid(monkeypatch):
+    monkeypatch.setattr(horizon, "predict_ignition_risk_batch", _fake_predict("1"))
+
+    grid = horizon.forecast_horizon(_features(["1"]), [date(2021, 1, 1)], pd.DataFrame(), date(2020, 12, 31))
+
+    assert grid.empty
+    assert horizon.summarize_horizon(grid, [date(2021, 1, 1)])["high_risk_incidents"] == []
@@ -0,0 +1,73 @@
+# tests/test_ingest.py
+import pandas as pd
+import pytest
+from sqlalchemy import func, select
+
+from app.models.db_models import Temperature
+from app.services import ingest
+
+TEMPERATURE_CSV = [
+    ["Склад", "Штабель", "Марка", "Макс.темп", "Пикет", "Дата", "Смена"],
+    ["4", "46", "A1", "30", "1", "2020-01-01", "1"],
+    ["4", "46", "A1", "35", "2", "2020-01-01", "1"],   # тот же штабель и смена — остаётся максимум
+    ["4", "46", "A1", "31", "1", "2020-01-02", "1"],
+    ["3", "7", "A1", "20", "1", "2020-01-01", "2"],
+]
+
+
+def _ingest(engine, rows, kind="temperature"):
+    with engine.begin() as conn:
+        return ingest.ingest_frame(conn, kind, pd.DataFrame(rows))
+
+
+def _temperatures(engine):
+    with engine.connect() as conn:
+        return sorted(conn.execute(
+            select(Temperature.warehouse, Temperature.pile_id, Temperature.shift, Temperature.max_temp)
+        ).all())
+
+
+def test_repeated_upload_is_idempotent(db):
+    first = _ingest(db, TEMPERATURE_CSV)
+    rows = _temperatures(db)
+    second = _ingest(db, TEMPERATURE_CSV)
+
+    assert (first["inserted_rows"], first["updated_rows"]) == (3, 0)
+    assert (second["inserted_rows"], second["updated_rows"], second["skipped_rows"]) == (0, 0, 4)
+    assert _temperatures(db) == rows
+    assert (4, "46", 1, 35.0) in rows
+
+
+def test_upsert_counts_new_and_changed_rows(db):
+    _ingest(db, TEMPERATURE_CSV)
+    stats = _ingest(db, [
+        TEMPERATURE_CSV[0],
+        ["4", "46", "A1", "40", "3", "2020-01-02", "1"],   # выше прежнего максимума — обновление
+        ["3", "7", "A1", "10", "1", "2020-01-01", "2"],    # ниже — замер не перезаписывается
+        ["3", "7", "A1", "25", "1", "2020-01-03", "2"],    # новый день — вставка
+    ])
+
+    assert (stats["inserted_rows"], stats["updated_rows"], stats["skipped_rows"]) == (1, 1, 1)
+    with db.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(Temperature)).scalar() == 4
+    assert (3, "7", 2, 20.0) in _temperatures(db)
+
+
+def test_upsert_counts_across_chunks(db):
+    frame, _ = ingest.validate_frame("temperature", pd.DataFrame(TEMPERATURE_CSV))
+    batch = ingest.dedupe_batch(Temperature.__table__, frame)
+    key = ingest.natural_key(Temperature.__table__)
+    with db.begin() as conn:
+        first = ingest._upsert_chunks(conn, Temperature.__table__, key, batch, chunk_size=2)
+        second = ingest._upsert_chunks(conn, Temperature.__table__, key, batch, chunk_size=2)
+
+    assert first == (3, 0)
+    assert second == (0, 0)
+
+
+def test_keyed_table_on_unsupported_dialect_raises(db, monkeypatch):
+    frame, _ = ingest.validate_frame("temperature", pd.DataFrame(TEMPERATURE_CSV))
+    with db.begin() as conn:
+        monkeypatch.setattr(conn.dialect, "name", "mysql")
+        with pytest.raises(NotImplementedError):
+            ingest.bulk_upsert(conn, Temperature, frame)
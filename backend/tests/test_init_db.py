@@ -0,0 +1,59 @@
+# tests/test_init_db.py
+import contextlib
+import io
+from datetime import datetime
+
+from sqlalchemy import func, inspect, select, text
+
+import init_db
+from app.models.db_models import Temperature
+
+
+def _legacy_duplicates(engine):
+    """Таблица температуры до уникального индекса: одна и та же смена загружена дважды."""
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX uq_temperature_reading"))
+        for max_temp in (30.0, 35.0, 30.0):
+            conn.execute(Temperature.__table__.insert().values(
+                warehouse=4, pile_id="46", coal_grade="A1", max_temp=max_temp,
+                measurement_date=datetime(2020, 1, 1), shift=1
+            ))
+
+
+def _create_tables(**kwargs) -> str:
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        init_db.create_tables(**kwargs)
+    return out.getvalue()
+
+
+def _temperature_rows(engine):
+    with engine.connect() as conn:
+        return conn.execute(select(Temperature.max_temp)).scalars().all()
+
+
+def _unique_indexes(engine):
+    return {i["name"] for i in inspect(engine).get_indexes("temperature") if i["unique"]}
+
+
+def test_create_tables_only_reports_duplicates(db):
+    _legacy_duplicates(db)
+
+    output = _create_tables()
+
+    assert "лишних строк 2" in output
+    assert "--dedupe" in output
+    assert sorted(_temperature_rows(db)) == [30.0, 30.0, 35.0]
+    assert "uq_temperature_reading" not in _unique_indexes(db)
+
+
+def test_dedupe_flag_keeps_max_and_builds_unique_index(db):
+    _legacy_duplicates(db)
+
+    output = _create_tables(dedupe=True)
+
+    assert "удалено дублей 2" in output
+    assert _temperature_rows(db) == [35.0]
+    assert "uq_temperature_reading" in _unique_indexes(db)
+    with db.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(Temperature)).scalar() == 1
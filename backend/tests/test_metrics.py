@@ -0,0 +1,54 @@
+# tests/test_metrics.py
+from collections import Counter
+from datetime import date
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.models.db_models import ActualFire, MetricsCounter, PredictionLog
+from app.services.metrics import bump_counters, log_predictions, prediction_record, record_actual_fire
+
+
+def _record(issue_day: int, predicted_day: int) -> dict:
+    return prediction_record(4, "46", "A1", date(2021, 1, issue_day),
+                             {"predicted_ignition_date": f"2021-01-{predicted_day:02d}T00:00:00"})
+
+
+def _counter(session, scope="all") -> MetricsCounter:
+    return session.get(MetricsCounter, scope)
+
+
+def test_bump_counters_creates_and_accumulates(db):
+    with Session(db) as session:
+        bump_counters(session, {"all": Counter(predictions=2), "warehouse:4": Counter(fires=1)})
+        bump_counters(session, {"all": Counter(predictions=3, fires=1)})
+        session.commit()
+
+        assert (_counter(session).predictions, _counter(session).fires) == (5, 1)
+        assert (_counter(session, "warehouse:4").predictions, _counter(session, "warehouse:4").fires) == (0, 1)
+
+
+def test_snapshot_predictions_logged_once_per_pile_and_date(db):
+    with Session(db) as session:
+        assert log_predictions(session, [_record(1, 5)], once_per_date=True) == 1
+        # пересчёт снимка днём позже предсказывает ту же дату — в журнал не попадает
+        assert log_predictions(session, [_record(2, 5), _record(2, 6)], once_per_date=True) == 1
+        # /predict пишет каждую дату выдачи
+        assert log_predictions(session, [_record(3, 5)]) == 1
+        session.commit()
+
+        assert session.scalar(select(func.count()).select_from(PredictionLog)) == 3
+        assert _counter(session).predictions == 3
+
+
+def test_repeated_fire_is_counted_once(db):
+    with Session(db) as session:
+        log_predictions(session, [_record(1, 5)])
+        first = record_actual_fire(session, 4, "46", date(2021, 1, 6))
+        second = record_actual_fire(session, 4, "46", date(2021, 1, 6))
+        session.commit()
+
+        assert first["hit"] and not first["duplicate"]
+        assert second["duplicate"]
+        assert session.scalar(select(func.count()).select_from(ActualFire)) == 1
+        assert (_counter(session).fires, _counter(session).fires_hit, _counter(session).predictions_hit) == (1, 1, 1)
@@ -0,0 +1,68 @@
+# tests/test_parquet_cache.py
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+
+from app.services import parquet_cache
+
+FILES = {
+    "temperature.csv": "Склад,Штабель,Марка,Максимальная температура,Пикет,Дата акта,Смена\n"
+                       "4,46,A1,30,1,2020-01-01,1\n3,7,A1,20,1,2020-01-02,2\n",
+    "fires.csv": "Дата составления,Груз,\"Вес по акту, тн\",Склад,Дата начала,Дата оконч.,Нач.форм.штабеля,Штабель\n"
+                 "2020-01-05,A1,10,4,2020-01-04,2020-01-06,2019-12-01,46\n",
+    "supplies.csv": "ВыгрузкаНаСклад,Наим. ЕТСНГ,Штабель,ПогрузкаНаСудно,\"На склад, тн\",\"На судно, тн\",Склад\n"
+                    "2020-01-01,A1,46,2020-01-10,100,50,4\n",
+}
+WEATHER_HEADER = "date,t,p,humidity,precipitation,wind_dir,v_avg,v_max,cloudcover,visibility,weather_code\n"
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    directory = tmp_path / "data"
+    directory.mkdir()
+    for name, content in FILES.items():
+        (directory / name).write_text(content, encoding="utf-8")
+    for year in range(2015, 2022):
+        (directory / f"weather_data_{year}.csv").write_text(
+            WEATHER_HEADER + f"{year}-01-01 00:00:00,1.0,1013,80,0.0,10,5.0,7.5,50,,3\n", encoding="utf-8"
+        )
+    return directory
+
+
+def test_concurrent_reads_keep_every_manifest_entry(data_dir, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    paths = sorted(str(p) for p in data_dir.iterdir()) * 4
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        frames = list(pool.map(lambda p: parquet_cache.read_source(p, cache_dir=cache_dir), paths))
+
+    assert all(len(frame) for frame in frames)
+    with open(os.path.join(cache_dir, parquet_cache.MANIFEST_FILE), encoding="utf-8") as f:
+        manifest = json.load(f)
+    assert set(manifest) == {p.name for p in data_dir.iterdir()}
+    assert not [name for name in os.listdir(cache_dir) if name.endswith(".tmp")]
+
+
+def test_missing_manifest_entry_falls_back_to_csv(data_dir, tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / "cache")
+    path = str(data_dir / "temperature.csv")
+    cached = parquet_cache.read_source(path, cache_dir=cache_dir)
+    # запись пропала между ensure_cached и чтением манифеста (параллельный clear_cache)
+    monkeypatch.setattr(parquet_cache, "load_manifest", lambda cache_dir: {})
+
+    fallback = parquet_cache.read_source(path, cache_dir=cache_dir)
+
+    pd.testing.assert_frame_equal(fallback, cached)
+
+
+def test_corrupted_manifest_is_rebuilt(data_dir, tmp_path):
+    cache_dir = tmp_path / "cache"
+    cache_dir.mkdir()
+    (cache_dir / parquet_cache.MANIFEST_FILE).write_text('{"temperature.csv": ', encoding="utf-8")
+
+    result = parquet_cache.ensure_cached(["temperature"], str(data_dir), str(cache_dir))
+
+    assert result["converted"] == ["temperature.csv"]
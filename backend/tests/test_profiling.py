@@ -0,0 +1,44 @@
+# tests/test_profiling.py
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.services import profiling
+from app.services.profiling import ProfilingMiddleware
+
+
+def _client(**options):
+    app = FastAPI()
+
+    @app.get("/ping")
+    def ping():
+        return {"ok": True}
+
+    app.add_middleware(ProfilingMiddleware, **options)
+    return TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def profile_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    return tmp_path
+
+
+def test_profiling_closed_without_admin_token_or_admin_open(profile_dir):
+    client = _client(admin_token=None, admin_open=False)
+    for response in (client.get("/ping", headers={"X-Profile": "1"}), client.get("/ping?profile=1")):
+        assert response.status_code == 200
+        assert "x-profile-id" not in response.headers
+    assert not list(profile_dir.iterdir())
+
+
+def test_profiling_open_only_with_admin_open():
+    response = _client(admin_token=None, admin_open=True).get("/ping", headers={"X-Profile": "1"})
+    assert "x-profile-id" in response.headers
+
+
+def test_profiling_requires_correct_admin_token():
+    client = _client(admin_token="secret", admin_open=True)
+    assert "x-profile-id" not in client.get("/ping", headers={"X-Profile": "1"}).headers
+    assert "x-profile-id" not in client.get("/ping", headers={"X-Profile": "1", "X-Admin-Token": "wrong"}).headers
+    assert "x-profile-id" in client.get("/ping", headers={"X-Profile": "1", "X-Admin-Token": "secret"}).headers
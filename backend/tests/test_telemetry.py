@@ -0,0 +1,54 @@
+# tests/test_telemetry.py
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from app.services import profiling, telemetry
+
+
+class FakeClock:
+    def __init__(self, *ticks):
+        self.ticks = iter(ticks)
+
+    def perf_counter(self):
+        return next(self.ticks)
+
+
+def test_failed_statement_does_not_skew_next_query_timing(monkeypatch):
+    engine = create_engine("sqlite://")
+    telemetry.instrument_engine(engine, "test")
+    recorded = []
+    monkeypatch.setattr(telemetry, "record_query", lambda seconds, name: recorded.append((seconds, name)))
+    # упавший запрос: 10 → 12, следующий: 100 → 101
+    monkeypatch.setattr(telemetry, "time", FakeClock(10.0, 12.0, 100.0, 101.0))
+
+    with engine.connect() as conn:
+        with pytest.raises(OperationalError):
+            conn.execute(text("SELECT * FROM no_such_table"))
+        assert conn.execute(text("SELECT 1")).scalar() == 1
+
+    assert recorded == [(2.0, "test"), (1.0, "test")]
+
+
+def test_failed_statement_is_profiled_once(monkeypatch):
+    engine = create_engine("sqlite://")
+    profiling.instrument_engine(engine)
+
+    class Profile:
+        queries = []
+
+        def add_query(self, statement, seconds, rows=None):
+            self.queries.append((statement, seconds))
+
+    profile = Profile()
+    monkeypatch.setattr(profiling, "time", FakeClock(10.0, 12.0, 100.0, 101.0))
+    token = profiling._active.set(profile)
+    try:
+        with engine.connect() as conn:
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM no_such_table"))
+            conn.execute(text("SELECT 1"))
+    finally:
+        profiling._active.reset(token)
+
+    assert profile.queries == [("SELECT * FROM no_such_table", 2.0), ("SELECT 1", 1.0)]